@@ -3,22 +3,137 @@
 # Date: 12/08/2017
 # Author: VJ Davey
 # Edited: 08/06/2020 by Shreya Chandrasekharan
+# Edited: 10/16/2026: stream rows through the csv module instead of loading whole files into pandas
+#
+# Rows are read (latin-1), reduced to keep_headers, cleaned of commas and written (UTF-8) one at a time, so memory
+# does not grow with the file size. As with pandas, missing value strings ('NA', 'NULL', 'nan', ...) are written as empty
+# fields and short rows are padded with empty fields. The output is written incrementally to `{file}_EXTRACTED.csv`, or with `-t` fed
+# straight into `COPY {table} FROM STDIN` with no intermediate file. Directories are processed in parallel processes.
+#
+# usage: column_extractor.py [-j jobs] [-t table] file_or_directory [...]
 
-import pandas as pd
-import sys
+import argparse
+import concurrent.futures as cf
+import csv
+import io
+import os
+import psycopg2
 
-csv_file_path=str(sys.argv[1]); 
-print(f'Working with CSV file located at {csv_file_path}')
 keep_headers = ['APPLICATION_ID','ACTIVITY','ADMINISTERING_IC','APPLICATION_TYPE','ARRA_FUNDED','AWARD_NOTICE_DATE','BUDGET_START',
 'BUDGET_END','CFDA_CODE','CORE_PROJECT_NUM','ED_INST_TYPE','FOA_NUMBER','FULL_PROJECT_NUM','SUBPROJECT_ID','FUNDING_ICs','FY','IC_NAME',
 'NIH_SPENDING_CATS','ORG_CITY','ORG_COUNTRY','ORG_DEPT','ORG_DISTRICT','ORG_DUNS','ORG_FIPS','ORG_NAME','ORG_STATE','ORG_ZIPCODE','PHR',
 'PI_IDS','PI_NAMEs','PROGRAM_OFFICER_NAME','PROJECT_START','PROJECT_END','PROJECT_TERMS','PROJECT_TITLE','SERIAL_NUMBER','STUDY_SECTION',
 'STUDY_SECTION_NAME','SUFFIX','SUPPORT_YEAR','TOTAL_COST','TOTAL_COST_SUB_PROJECT']
-df = pd.read_csv(csv_file_path, dtype=object, encoding='latin-1') 
-df = df[keep_headers]
-
-for header in keep_headers:
-    df[header] = df[header].str.replace(',','')
-    df[header] = df[header].str.encode('utf8').str.decode('utf8')
-    
-df.to_csv(csv_file_path[:-4]+'_EXTRACTED.csv', index=False)
+EXTRACTED_SUFFIX = '_EXTRACTED.csv'
+# Strings pandas.read_csv reads as missing values by default
+NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+             'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+# Characters handed to COPY per read
+COPY_BUFFER_SIZE = 1 << 20
+
+
+def extract_rows(csv_file_path):
+    """
+    Stream the header and then the keep_headers columns of every row, with commas removed and missing values emptied
+    """
+    with open(csv_file_path, newline='', encoding='latin-1') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        missing = [name for name in keep_headers if name not in header]
+        if missing:
+            raise KeyError(f'{csv_file_path}: missing columns {missing}')
+        positions = [header.index(name) for name in keep_headers]
+        yield keep_headers
+        for row in reader:
+            # Blank lines are skipped, as by pandas
+            if not row:
+                continue
+            if len(row) < len(header):
+                row += [''] * (len(header) - len(row))
+            yield ['' if row[position] in NA_VALUES else row[position].replace(',', '') for position in positions]
+
+
+class CsvStream:
+    """
+    Read-only file object over CSV formatted rows, for `copy_expert`
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.count = 0
+
+    def read(self, size=COPY_BUFFER_SIZE):
+        if size is None or size < 0:
+            size = COPY_BUFFER_SIZE
+        while self.buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.count += 1
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def extract_file(csv_file_path, table=None):
+    """
+    Write the extract of a CSV file to `{file}_EXTRACTED.csv`, or COPY it into `table` when given.
+
+    Output: (str, int) the extracted file or the table and the number of rows
+    """
+    print(f'Working with CSV file located at {csv_file_path}')
+    rows = extract_rows(csv_file_path)
+    if table:
+        stream = CsvStream(rows)
+        with psycopg2.connect("") as conn:
+            conn.set_client_encoding('UTF8')
+            with conn.cursor() as curs:
+                curs.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv, HEADER)", stream, COPY_BUFFER_SIZE)
+        conn.close()
+        return table, stream.count - 1
+
+    extract_file_path = csv_file_path[:-4] + EXTRACTED_SUFFIX
+    count = -1
+    with open(extract_file_path, 'w', newline='', encoding='utf-8') as extract_file:
+        writer = csv.writer(extract_file, lineterminator='\n')
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return extract_file_path, count
+
+
+def csv_files(paths):
+    """
+    Output: list of CSV files among `paths`: files, or directories of CSV files (except extracts)
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.endswith('.csv') and not name.endswith(EXTRACTED_SUFFIX)))
+        else:
+            files.append(path)
+    return files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract the project columns from RePORTER CSV files')
+    parser.add_argument('paths', nargs='+', help='CSV files or directories of CSV files')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of files processed in parallel, # of CPU cores by default')
+    parser.add_argument('-t', '--table', help='COPY the extracted rows straight into this table instead of writing '
+                                              '_EXTRACTED.csv files. Connection parameters come from PG* variables.')
+    args = parser.parse_args()
+
+    files = csv_files(args.paths)
+    if len(files) == 1:
+        results = [extract_file(files[0], args.table)]
+    else:
+        with cf.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(extract_file, files, [args.table] * len(files)))
+    for target, count in results:
+        print(f'{count} rows extracted to {target}')
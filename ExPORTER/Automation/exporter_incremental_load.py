@@ -0,0 +1,271 @@
+# exporter_incremental_load.py
+# this program loads only the new, changed and deleted rows of ExPORTER CSV files
+# Date: 10/16/2026
+#
+# NIH re-delivers mostly unchanged fiscal-year files. Every file is fingerprinted (SHA-256) and skipped when it was
+# already loaded. For a changed file, rows are diffed by primary key against a persisted snapshot of key -> row hash
+# per file (i.e. per fiscal year / week), kept in a sqlite file. Only new and changed rows and the keys of deleted rows
+# are COPYed into session staging tables and merged into the ExPORTER tables in one transaction per file:
+#   * new and changed rows: INSERT ... ON CONFLICT DO UPDATE
+#   * deleted rows: DELETE, unless the key is still delivered by another file
+# The snapshot is only updated after the merge is committed.
+#
+# usage: exporter_incremental_load.py [-s snapshot_file] [-f] csv_file [...]
+
+import argparse
+import collections
+import csv
+import hashlib
+import os
+import sqlite3
+import time
+import psycopg2
+import column_extractor
+
+ExporterTable = collections.namedtuple('ExporterTable', ['prefix', 'table', 'columns', 'key'])
+
+# File name prefixes and their target tables. Columns are in CSV (and table) order.
+EXPORTER_TABLES = [
+    ExporterTable('RePORTER_PRJ_C_', 'exporter_projects', [header.lower() for header in column_extractor.keep_headers],
+                  ['application_id']),
+    ExporterTable('RePORTER_PRJABS_C_', 'exporter_project_abstracts', ['application_id', 'abstract_text'],
+                  ['application_id']),
+    ExporterTable('RePORTER_PUBLNK_C_', 'exporter_publink', ['pmid', 'project_number', 'admin_ic'],
+                  ['pmid', 'project_number'])
+]
+SQLITE_MAX_VARIABLES = 500
+FIELD_SEPARATOR = '\x1f'
+
+
+def exporter_table(csv_file_path):
+    """
+    Output: the ExporterTable of a CSV file, or None for files without a table
+    """
+    name = os.path.basename(csv_file_path)
+    for table in EXPORTER_TABLES:
+        if name.startswith(table.prefix):
+            return table
+    return None
+
+
+def file_fingerprint(csv_file_path):
+    digest = hashlib.sha256()
+    with open(csv_file_path, 'rb') as csv_file:
+        for block in iter(lambda: csv_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_rows(csv_file_path, table):
+    """
+    Stream the rows of a CSV file as lists of table column values
+    """
+    if table.table == 'exporter_projects':
+        rows = column_extractor.extract_rows(csv_file_path)
+        next(rows)
+        yield from rows
+        return
+    if table.table == 'exporter_publink':
+        # Link files only have PMID and PROJECT_NUMBER: the administering IC is part of the core project number
+        # (activity code, IC, serial number, e.g. R01CA123456)
+        with open(csv_file_path, newline='', encoding='latin-1') as csv_file:
+            reader = csv.reader(csv_file)
+            header = [column.strip().upper() for column in next(reader)]
+            pmid, project_number = header.index('PMID'), header.index('PROJECT_NUMBER')
+            for row in reader:
+                if row:
+                    yield [row[pmid], row[project_number], row[project_number][3:5]]
+        return
+    with open(csv_file_path, newline='', encoding='latin-1') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader)
+        for row in reader:
+            if row:
+                yield (row + [''] * len(table.columns))[:len(table.columns)]
+
+
+class Snapshot:
+    """
+    sqlite snapshot of the loaded files and of the key -> row hash of every row per file
+    """
+
+    def __init__(self, snapshot_file):
+        self.conn = sqlite3.connect(snapshot_file)
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS loaded_files (
+                  file_name TEXT PRIMARY KEY,
+                  fingerprint TEXT NOT NULL,
+                  loaded_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS row_hashes (
+                  table_name TEXT NOT NULL,
+                  file_name TEXT NOT NULL,
+                  row_key TEXT NOT NULL,
+                  row_hash BLOB NOT NULL,
+                  PRIMARY KEY (table_name, file_name, row_key)
+                );
+                CREATE INDEX IF NOT EXISTS row_hashes_key_i ON row_hashes(table_name, row_key);''')
+
+    def close(self):
+        self.conn.close()
+
+    def fingerprint(self, file_name):
+        row = self.conn.execute('SELECT fingerprint FROM loaded_files WHERE file_name = ?', (file_name,)).fetchone()
+        return row[0] if row else None
+
+    def row_hashes(self, table_name, file_name):
+        return dict(self.conn.execute('SELECT row_key, row_hash FROM row_hashes WHERE table_name = ? AND file_name = ?',
+                                      (table_name, file_name)))
+
+    def delivered_elsewhere(self, table_name, file_name, keys):
+        """
+        Output: (set) the keys among `keys` which are in the snapshot of other files
+        """
+        delivered = set()
+        keys = list(keys)
+        for offset in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[offset:offset + SQLITE_MAX_VARIABLES]
+            delivered.update(row_key for row_key, in self.conn.execute(
+                'SELECT row_key FROM row_hashes WHERE table_name = ? AND file_name <> ? AND row_key IN ({})'.format(
+                    ','.join('?' * len(chunk))), [table_name, file_name] + chunk))
+        return delivered
+
+    def save(self, table_name, file_name, fingerprint, row_hashes):
+        with self.conn:
+            self.conn.execute('DELETE FROM row_hashes WHERE table_name = ? AND file_name = ?', (table_name, file_name))
+            self.conn.executemany('INSERT INTO row_hashes VALUES (?, ?, ?, ?)',
+                                  ((table_name, file_name, row_key, row_hash) for row_key, row_hash in
+                                   row_hashes.items()))
+            self.conn.execute('INSERT OR REPLACE INTO loaded_files VALUES (?, ?, ?)',
+                              (file_name, fingerprint, time.time()))
+
+
+class ChangedRows:
+    """
+    Stream the new and changed rows of a file, with their file ordinal, while collecting the hash of every row.
+    A repeated key is always passed on, so that the last delivered row wins in the merge.
+    """
+
+    def __init__(self, rows, table, old_hashes):
+        self.rows = rows
+        self.key_positions = [table.columns.index(column) for column in table.key]
+        self.old_hashes = old_hashes
+        self.new_hashes = {}
+        self.new = self.changed = 0
+
+    def __iter__(self):
+        for ordinal, row in enumerate(self.rows):
+            row_key = FIELD_SEPARATOR.join(row[position] for position in self.key_positions)
+            row_hash = hashlib.blake2b(FIELD_SEPARATOR.join(row).encode('utf-8'), digest_size=16).digest()
+            repeated = row_key in self.new_hashes
+            self.new_hashes[row_key] = row_hash
+            old_hash = self.old_hashes.get(row_key)
+            if old_hash is None:
+                if not repeated:
+                    self.new += 1
+            elif old_hash != row_hash or repeated:
+                if not repeated:
+                    self.changed += 1
+            else:
+                continue
+            yield row + [str(ordinal)]
+
+
+def stage_changes(curs, table, changed_rows, deleted_keys):
+    """
+    COPY changed rows into `stg_{table}` and then the keys returned by `deleted_keys()` into `stg_{table}_deleted`,
+    session staging tables
+    """
+    columns = ', '.join(table.columns)
+    key = ', '.join(table.key)
+    curs.execute(f'''
+        CREATE TEMP TABLE IF NOT EXISTS stg_{table.table} (LIKE {table.table}, file_ordinal BIGINT);
+        CREATE TEMP TABLE IF NOT EXISTS stg_{table.table}_deleted AS SELECT {key} FROM {table.table} WITH NO DATA;
+        TRUNCATE stg_{table.table}, stg_{table.table}_deleted;''')
+    curs.copy_expert(f'COPY stg_{table.table} ({columns}, file_ordinal) FROM STDIN WITH (FORMAT csv)',
+                     column_extractor.CsvStream(changed_rows), column_extractor.COPY_BUFFER_SIZE)
+    # Deleted keys are only known once all rows are read
+    curs.copy_expert(f'COPY stg_{table.table}_deleted ({key}) FROM STDIN WITH (FORMAT csv)',
+                     column_extractor.CsvStream(row_key.split(FIELD_SEPARATOR) for row_key in deleted_keys()),
+                     column_extractor.COPY_BUFFER_SIZE)
+
+
+def merge_staged(curs, table):
+    """
+    Merge the staged rows into the table, the last delivered row per key winning, and delete the staged keys
+
+    Output: (int, int) numbers of upserted and deleted rows
+    """
+    columns = ', '.join(table.columns)
+    key = ', '.join(table.key)
+    updates = ', '.join(f'{column} = excluded.{column}' for column in table.columns if column not in table.key)
+    curs.execute(f'''
+        INSERT INTO {table.table} ({columns})
+        SELECT DISTINCT ON ({key}) {columns}
+          FROM stg_{table.table}
+         ORDER BY {key}, file_ordinal DESC
+            ON CONFLICT ({key}) DO {f'UPDATE SET {updates}' if updates else 'NOTHING'}''')
+    upserted = curs.rowcount
+    curs.execute(f'''
+        DELETE FROM {table.table} t
+         USING stg_{table.table}_deleted d
+         WHERE {' AND '.join(f't.{column} = d.{column}' for column in table.key)}''')
+    return upserted, curs.rowcount
+
+
+def load_file(conn, snapshot, csv_file_path, force=False):
+    """
+    Load the new, changed and deleted rows of a CSV file, unless the file is unchanged
+
+    Output: (bool) whether the file was loaded
+    """
+    table = exporter_table(csv_file_path)
+    file_name = os.path.basename(csv_file_path)
+    if table is None:
+        print(f'{file_name}: no ExPORTER table for this file, skipped')
+        return False
+    fingerprint = file_fingerprint(csv_file_path)
+    if not force and snapshot.fingerprint(file_name) == fingerprint:
+        print(f'{file_name}: unchanged since the last load, skipped')
+        return False
+
+    start_time = time.time()
+    old_hashes = snapshot.row_hashes(table.table, file_name)
+    changed_rows = ChangedRows(read_rows(csv_file_path, table), table, old_hashes)
+    deleted_keys = []
+
+    def find_deleted_keys():
+        missing = old_hashes.keys() - changed_rows.new_hashes.keys()
+        deleted_keys.extend(missing - snapshot.delivered_elsewhere(table.table, file_name, missing))
+        return deleted_keys
+
+    with conn:
+        with conn.cursor() as curs:
+            stage_changes(curs, table, changed_rows, find_deleted_keys)
+            upserted, removed = merge_staged(curs, table)
+    snapshot.save(table.table, file_name, fingerprint, changed_rows.new_hashes)
+    print(f'{file_name} -> {table.table}: {len(changed_rows.new_hashes)} rows, {changed_rows.new} new, '
+          f'{changed_rows.changed} changed ({upserted} upserted), {len(deleted_keys)} deleted ({removed} removed) '
+          f'in {time.time() - start_time:.1f} s')
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load the new, changed and deleted rows of ExPORTER CSV files')
+    parser.add_argument('csv_files', nargs='+', help='project (PRJ), abstract (PRJABS) and publication link (PUBLNK) '
+                                                     'CSV files')
+    parser.add_argument('-s', '--snapshot', default='exporter_snapshot.sqlite',
+                        help='snapshot file of loaded files and row hashes, exporter_snapshot.sqlite by default')
+    parser.add_argument('-f', '--force', action='store_true', help='diff files even when they are unchanged')
+    args = parser.parse_args()
+
+    snapshot = Snapshot(args.snapshot)
+    postgres_conn = psycopg2.connect("")
+    postgres_conn.set_client_encoding('UTF8')
+    try:
+        loaded = sum(load_file(postgres_conn, snapshot, csv_file_path, args.force) for csv_file_path in args.csv_files)
+    finally:
+        postgres_conn.close()
+        snapshot.close()
+    print(f'{loaded} of {len(args.csv_files)} file(s) loaded')
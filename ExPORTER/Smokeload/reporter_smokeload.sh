@@ -24,9 +24,7 @@ for file in $(ls $work_dir*.csv);do
 done; rm $work_dir*.csv
 #unzip proj_files, convert, and push into database
 cd $work_dir; for file in $(ls $proj_files/*.zip); do unzip $file; done
-for file in $(ls $work_dir*.csv);do
-  echo 'Working on file' $file
-  python $cur_dir/column_extractor.py $file; file_extract=$(echo $file | sed s/.csv/_EXTRACTED.csv/g)
-  psql ernie -c "copy exporter_projects from '$file_extract' delimiter ',' CSV HEADER;" ; wait ;
-done; rm $work_dir*.csv
+# extract the project columns of all files in parallel and stream them straight into the table
+PGDATABASE=ernie python $cur_dir/column_extractor.py -t exporter_projects $work_dir
+rm $work_dir*.csv
 echo 'FINISHED'; date
@@ -0,0 +1,83 @@
+import argparse
+import random
+import re
+import time
+import zlib
+import collections
+import http.server
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+"""
+    Local stand-in for the Fingerprint Engine, for testing fingerprinting pipelines without the Elsevier service.
+    Any POST to /TacoService.svc/{workflow} with a title/abstract document is answered with a TACO-like TextAnalysis
+    that FingerprintEngineClient can parse. Concepts are the most frequent words of the document: the concept id is a
+    hash of the word, AFreq its count and Rank its count relative to the most frequent word, so results are repeatable.
+    Latency and a rate of transient (503) failures can be simulated.
+
+    Usage: python FakeFingerprintEngine.py [-p port] [-l latency_seconds] [-f failure_rate]
+    then point the client at http://localhost:{port}/TacoService.svc/
+"""
+WORD_PATTERN = re.compile(r'[a-z]{4,}')
+MAX_CONCEPTS = 20
+
+
+def fingerprint_xml(title, abstract):
+    words = collections.Counter(WORD_PATTERN.findall('{} {}'.format(title or '', abstract or '').lower()))
+    top = words.most_common(MAX_CONCEPTS)
+    annotations = ''.join('''
+    <Annotation i:type="ConceptAnnotation"><ConceptID>{}</ConceptID><Rank>{:.4f}</Rank><Name>{}</Name><AFreq>{}</AFreq></Annotation>'''
+                          .format(zlib.crc32(word.encode('utf-8')) % 1000000, count / top[0][1], escape(word), count)
+                          for word, count in top)
+    return '''<TextAnalysis xmlns="http://www.collexis.com/annotations/" xmlns:i="http://www.w3.org/2001/XMLSchema-instance">
+  <Annotations>{}
+  </Annotations>
+</TextAnalysis>'''.format(annotations).encode('utf-8')
+
+
+class FakeFingerprintEngineHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    failure_rate = 0.0
+    requests = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        FakeFingerprintEngineHandler.requests += 1
+        time.sleep(self.latency)
+        if not self.path.startswith('/TacoService.svc/'):
+            return self.reply(404, b'')
+        if random.random() < self.failure_rate:
+            return self.reply(503, b'Service Unavailable')
+        try:
+            doc = ET.fromstring(body)
+        except ET.ParseError:
+            return self.reply(400, b'Invalid document')
+        self.reply(200, fingerprint_xml(doc.findtext('title'), doc.findtext('abstract')))
+
+    def reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local fake Fingerprint Engine for tests')
+    parser.add_argument('-p','--port',help='port to listen on',type=int,default=8085)
+    parser.add_argument('-l','--latency',help='seconds to wait before answering a request',type=float,default=0.0)
+    parser.add_argument('-f','--failure_rate',help='fraction of requests answered with 503 Service Unavailable',type=float,default=0.0)
+    args = parser.parse_args()
+
+    FakeFingerprintEngineHandler.latency = args.latency
+    FakeFingerprintEngineHandler.failure_rate = args.failure_rate
+    server = http.server.ThreadingHTTPServer(('localhost', args.port), FakeFingerprintEngineHandler)
+    print("Fake Fingerprint Engine listening on http://localhost:{}/TacoService.svc/".format(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("{} requests served".format(FakeFingerprintEngineHandler.requests))
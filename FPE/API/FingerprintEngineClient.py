@@ -9,12 +9,14 @@ import xml.etree.ElementTree as ET
 class FingerprintEngineClient:
 
     # constructor method
-    def __init__(self, url, username=None, password=None):
+    # timeout: seconds to wait for the engine, None to wait indefinitely
+    def __init__(self, url, username=None, password=None, timeout=None):
         if (url.endswith('/')):
             url = url[0:len(url)-1]
         if (url.lower().endswith('/tacoservice.svc')):
             url = url[0:len(url)-len('/tacoservice.svc')]
         self.url = url
+        self.timeout = timeout
         self.headers = {}
         if (username != None):
             authString = (username + ":" + password).encode('ascii')
@@ -23,14 +25,14 @@ class FingerprintEngineClient:
     # index a document with plain text only
     def plaintextindex(self, workflow, text):
         req = urllib.request.Request(url=self.url + '/TacoService.svc/' + workflow, data=bytes(text, 'utf-8'), headers=self.headers)
-        f = urllib.request.urlopen(req)
+        f = urllib.request.urlopen(req, timeout=self.timeout)
         return f.read()
 
     # address a work flow, sending a document represented as byte array
     # can be both Xml or Plain text
     def plainindex(self, workflow, data):
         req = urllib.request.Request(url=self.url + '/TacoService.svc/' + workflow, data=data, headers=self.headers)
-        f = urllib.request.urlopen(req)
+        f = urllib.request.urlopen(req, timeout=self.timeout)
         return f.read()
 
     # index a document with title and abstract
@@ -43,7 +45,7 @@ class FingerprintEngineClient:
         reqstring=ET.tostring(doc, encoding='utf-8')
         # print(reqstring) # print request string, debugging only
         req = urllib.request.Request(url=self.url + '/TacoService.svc/' + workflow, data=reqstring, headers=self.headers)
-        f = urllib.request.urlopen(req)
+        f = urllib.request.urlopen(req, timeout=self.timeout)
         return TextAnalysis(f.read())
 
     # index a document with a variable number of sections
@@ -57,7 +59,7 @@ class FingerprintEngineClient:
         reqstring=ET.tostring(doc, encoding='utf-8')
         # print(reqstring) # print request string, debugging only
         req = urllib.request.Request(url=self.url + '/TacoService.svc/' + workflow, data=reqstring, headers=self.headers)
-        f = urllib.request.urlopen(req)
+        f = urllib.request.urlopen(req, timeout=self.timeout)
         return TextAnalysis(f.read())
 
 """
@@ -1,59 +1,136 @@
-import fileinput
+import csv
+import io
+import time
+import random
+import http.client
+import urllib.error
+import concurrent.futures as cf
 import FingerprintEngineClient as efe
 import argparse
 import psycopg2
 from psycopg2 import sql
 import psycopg2.extras
 
-def fingerprint_postgres_query(input_sql,non_title_abstract_cols,dsn,min_concepts=3,save_table=None,save_file=None,workflow='MeSHXmlConceptsOnly'):
-    # Establish Postgres connections for I/O data
-    input_postgres_conn=psycopg2.connect(" ".join("{}={}".format(k,postgres_dsn[k]) for k in postgres_dsn))
-    input_cur=input_postgres_conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+# HTTP responses worth retrying: rate limiting and unavailable/overloaded service
+TRANSIENT_HTTP_CODES = {429, 500, 502, 503, 504}
+
+
+# Fingerprint a document, retrying transient failures (timeouts, dropped connections, 429/5xx responses) with exponential backoff
+def index_with_retry(client,workflow,title,abstract,retries=5,backoff=1.0):
+    attempt = 0
+    while True:
+        try:
+            return client.index(workflow, title, abstract).toFingerprint()
+        except urllib.error.HTTPError as e:
+            if e.code not in TRANSIENT_HTTP_CODES or attempt >= retries:
+                raise
+        except (http.client.HTTPException, OSError):
+            if attempt >= retries:
+                raise
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        attempt += 1
+
+
+# Bulk load rows into a table with COPY
+def copy_rows(cur,table,columns,rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(sql.SQL('''COPY {} ({}) FROM STDIN WITH (FORMAT csv)''').format(
+                        sql.Identifier(table), sql.SQL(',').join(sql.Identifier(i) for i in columns)), buffer)
+
+
+def fingerprint_postgres_query(client,input_sql,non_title_abstract_cols,dsn,min_concepts=3,save_table=None,save_file=None,workflow='MeSHXmlConceptsOnly',
+                               jobs=8,retries=5,batch_size=10000,resume=False):
+    # Establish Postgres connections for I/O data. Input rows are streamed through a server-side cursor
+    conn_string=" ".join("{}={}".format(k,dsn[k]) for k in dsn if dsn[k])
+    input_postgres_conn=psycopg2.connect(conn_string)
+    input_cur=input_postgres_conn.cursor(name='fingerprint_input',cursor_factory=psycopg2.extras.DictCursor)
+    input_cur.itersize=1000
     input_cur.execute(input_sql)
-    output_postgres_conn=psycopg2.connect(" ".join("{}={}".format(k,postgres_dsn[k]) for k in postgres_dsn))
-    output_postgres_conn.autocommit=True
+    output_postgres_conn=psycopg2.connect(conn_string)
     output_cur=output_postgres_conn.cursor()
-    output_cur.execute('''CREATE TEMP TABLE temp_applications_fingerprint (
+
+    # Fingerprints are written to the save table as they come in, and every processed document (the combination of its
+    # group identifiers) is recorded in a checkpoint table in the same transaction. A resumed run skips the checkpointed
+    # documents. Without a save table, results are kept in session temp tables as before and cannot be resumed.
+    group_cols=[group_id.lower() for group_id in non_title_abstract_cols]
+    concept_cols=group_cols+['concept_id','concept_name','concept_rank','concept_afreq']
+    fingerprint_table=save_table if save_table else 'temp_applications_fingerprint'
+    checkpoint_table=save_table+'_checkpoint' if save_table else 'temp_applications_checkpoint'
+    table_kind=sql.SQL('TABLE' if save_table else 'TEMP TABLE')
+    group_col_defs=sql.SQL(',').join(sql.SQL('{} TEXT').format(sql.Identifier(group_id)) for group_id in group_cols)
+    if not resume:
+        for table in (fingerprint_table,checkpoint_table):
+            output_cur.execute(sql.SQL('''DROP TABLE IF EXISTS {}''').format(sql.Identifier(table)))
+    output_cur.execute(sql.SQL('''CREATE {} IF NOT EXISTS {} (
                                             {},
                                             concept_id INT,
                                             concept_name TEXT,
                                             concept_rank DECIMAL,
                                             concept_afreq INT
-                        ) '''.format(','.join('{} TEXT'.format(group_id) for group_id in non_title_abstract_cols)))
+                        ) ''').format(table_kind,sql.Identifier(fingerprint_table),group_col_defs))
     print(output_cur.statusmessage)
+    output_cur.execute(sql.SQL('''CREATE {} IF NOT EXISTS {} ({}, concepts INT)''').format(
+                                            table_kind,sql.Identifier(checkpoint_table),group_col_defs))
+    output_cur.execute(sql.SQL('''SELECT {} FROM {}''').format(sql.SQL(',').join(sql.Identifier(i) for i in group_cols),
+                                                             sql.Identifier(checkpoint_table)))
+    processed={tuple(record) for record in output_cur.fetchall()}
+    output_postgres_conn.commit()
+    if processed: print("Resuming: {} documents already processed".format(len(processed)))
 
-    for idx,input_row in enumerate(input_cur.fetchall()):
+    concept_rows=[]; checkpoint_rows=[]; pending={}
+    fingerprinted=failed=0; start_time=time.time()
+
+    def flush():
+        nonlocal concept_rows, checkpoint_rows
+        if not checkpoint_rows: return
+        copy_rows(output_cur,fingerprint_table,concept_cols,concept_rows)
+        copy_rows(output_cur,checkpoint_table,group_cols+['concepts'],checkpoint_rows)
+        output_postgres_conn.commit()
+        print("Saved {} concepts of {} documents ({:.1f} documents/s)".format(len(concept_rows),len(checkpoint_rows),
+                                                                             fingerprinted/(time.time()-start_time)))
+        concept_rows=[]; checkpoint_rows=[]
+
+    def collect(future):
+        nonlocal fingerprinted, failed
+        idx, doc_id, title = pending.pop(future)
         try:
-            group_ids={group_id.lower():input_row[group_id.lower()] for group_id in non_title_abstract_cols}
-            title, abstract = input_row['title'],input_row['abstract']
-            # TODO: define doc_id as a combo of N cols
-            print("Document #{}: {}".format(idx+1, title))
-            if abstract:
-                fp = client.index(workflow, title, abstract).toFingerprint()
-                if len(fp) >= min_concepts:
-                    doc_len = len(title.split() + abstract.split())
-                    for concept in fp:
-                        command= sql.SQL('''INSERT INTO temp_applications_fingerprint({},concept_id,concept_name,concept_rank,concept_afreq)
-                                            VALUES ({},{},{},{},{})''').format(
-                                            sql.SQL(',').join(sql.Identifier(i) for i in non_title_abstract_cols),
-                                            sql.SQL(',').join(sql.Literal(group_ids[i]) for i in non_title_abstract_cols),
-                                            sql.Literal(concept.conceptid),sql.Literal(concept.name),
-                                            sql.Literal(concept.rank),sql.Literal(concept.afreq))
-                        output_cur.execute(command)
-                        #print(output_cur.statusmessage)
-                else:  print("Document {} - {}: *** Insufficient concepts created on fingerprint ({})".format(idx+1, title, len(fp)))
-            else:  print("Document #{} : *** No abstract attached".format(idx+1))
+            fp = future.result()
         except ValueError:
             print("Document #{}: *** Invalid Input Line".format(idx+1))
+            return
+        except (http.client.HTTPException, OSError) as e:
+            # Not checkpointed, so a resumed run tries the document again
+            failed += 1
+            print("Document #{}: *** Fingerprint Engine request failed: {}".format(idx+1, e))
+            return
+        fingerprinted += 1
+        if len(fp) >= min_concepts:
+            concept_rows.extend(doc_id+(concept.conceptid,concept.name,concept.rank,concept.afreq) for concept in fp)
+        else:  print("Document {} - {}: *** Insufficient concepts created on fingerprint ({})".format(idx+1, title, len(fp)))
+        checkpoint_rows.append(doc_id+(len(fp),))
 
-    if save_table:
-        print("Saving temp table data to table {}".format(save_table))
-        command=sql.SQL('''DROP TABLE IF EXISTS {}''').format(sql.Identifier(save_table))
-        output_cur.execute(command)
-        print(output_cur.statusmessage)
-        command=sql.SQL('''CREATE TABLE {} AS SELECT * FROM temp_applications_fingerprint''').format(sql.Identifier(save_table))
-        output_cur.execute(command)
-        print(output_cur.statusmessage)
+    # At most 2 requests per worker are queued, so documents are read from the input cursor as they can be fingerprinted
+    with cf.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for idx,input_row in enumerate(input_cur):
+            doc_id=tuple(None if input_row[group_id] is None else str(input_row[group_id]) for group_id in group_cols)
+            if doc_id in processed: continue
+            title, abstract = input_row['title'],input_row['abstract']
+            if abstract:
+                print("Document #{}: {}".format(idx+1, title))
+                pending[executor.submit(index_with_retry,client,workflow,title,abstract,retries)]=(idx,doc_id,title)
+            else:  print("Document #{} : *** No abstract attached".format(idx+1))
+            if len(pending) >= 2*jobs:
+                done,_=cf.wait(pending,return_when=cf.FIRST_COMPLETED)
+                for future in done: collect(future)
+                if len(concept_rows) >= batch_size: flush()
+        for future in cf.as_completed(list(pending)): collect(future)
+    flush()
+    input_postgres_conn.close()
+    print("Fingerprinted {} documents in {:.1f} s, {} failed".format(fingerprinted,time.time()-start_time,failed))
+    if save_table: print("Fingerprints saved to table {}".format(save_table))
+    output_postgres_conn.close()
 
 
 # Determine if we are working with a PostgreSQL connection or an input file
@@ -63,20 +140,31 @@ if __name__ == '__main__':
         1) Process a file containing a list of (n* application ids,titles,abstracts) as input
             NOTE: Include a header, otherwise it will be assumed that the last two columns refer to title and abstract. Less than 3 columns will cause an error.
         2) Develop an N-concept fingerprint based on the provided text
+     Documents are fingerprinted by several concurrent FPE requests, and their concepts are saved in batches.
+     An interrupted run can be continued with --resume: documents already saved to the save table are skipped.
+     For tests, run ../API/FakeFingerprintEngine.py and point --fingerprint_engine_url at it.
     ''', formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument('-mc','--min_concepts',help='minimum concepts for fingerprint analysis',default=3,type=int)
     parser.add_argument('-fu','--fingerprint_engine_username',help='Fingerprint Engine Username',required=True,type=str)
     parser.add_argument('-fp','--fingerprint_engine_password',help='Fingerprint Engine Password',required=True,type=str)
+    parser.add_argument('-url','--fingerprint_engine_url',help='Fingerprint Engine service URL',
+                        default='https://fingerprintengine.scivalcontent.com/Taco7900/TacoService.svc/')
     parser.add_argument('-d','--postgres_dbname',help='the database to query in the local PostgreSQL server via peer authentication',default=None)
     parser.add_argument('-sql','--input_sql',help='the sql query to run to generate input data to the FPE',default=None)
     parser.add_argument('-n','--non_title_abstract_cols',help='columns to retain as group identifiers when fingerprinting',required=True,nargs='+')
     parser.add_argument('-st','--save_table',help='the sql table to save results as',default=None)
     parser.add_argument('-w','--workflow',help='the workflow the FingerPrint Engine should use',default='MeSHXmlConceptsOnly')
+    parser.add_argument('-j','--jobs',help='number of concurrent Fingerprint Engine requests',default=8,type=int)
+    parser.add_argument('-r','--retries',help='retries of a request after a transient failure, with exponential backoff',default=5,type=int)
+    parser.add_argument('-t','--timeout',help='seconds to wait for a Fingerprint Engine response',default=60,type=float)
+    parser.add_argument('-b','--batch_size',help='number of concepts buffered before they are saved',default=10000,type=int)
+    parser.add_argument('-rs','--resume',help='keep the save table and skip the documents already fingerprinted into it',action='store_true')
     args = parser.parse_args()
 
     MinConcepts = args.min_concepts
-    client = efe.FingerprintEngineClient('https://fingerprintengine.scivalcontent.com/Taco7900/TacoService.svc/',
-                                        args.fingerprint_engine_username,args.fingerprint_engine_password)
+    client = efe.FingerprintEngineClient(args.fingerprint_engine_url,
+                                        args.fingerprint_engine_username,args.fingerprint_engine_password,timeout=args.timeout)
     if args.postgres_dbname:
         postgres_dsn={'dbname':args.postgres_dbname}
-        fingerprint_postgres_query(args.input_sql,args.non_title_abstract_cols,postgres_dsn,args.min_concepts,save_table=args.save_table,workflow=args.workflow)
+        fingerprint_postgres_query(client,args.input_sql,args.non_title_abstract_cols,postgres_dsn,args.min_concepts,save_table=args.save_table,workflow=args.workflow,
+                                   jobs=args.jobs,retries=args.retries,batch_size=args.batch_size,resume=args.resume)
@@ -0,0 +1,176 @@
+import os
+import numpy as np
+import scipy.sparse as sp
+from psycopg2 import sql
+
+FETCH_SIZE = 100000
+
+
+# Load a fingerprint table as a document x concept matrix of concept ranks and one of concept frequencies (same sparsity).
+# Rows are sorted by identifier and columns by concept id. Of a concept repeated in a fingerprint, the last row is kept.
+def load_fingerprints(conn, table, ident_col):
+    chunks = []
+    with conn.cursor(name='fingerprints') as cur:
+        cur.execute(sql.SQL('''SELECT {}, concept_id, coalesce(concept_rank, 0), coalesce(concept_afreq, 0)
+                               FROM {}
+                               ORDER BY {}, concept_id''').format(sql.Identifier(ident_col), sql.Identifier(table),
+                                                                  sql.Identifier(ident_col)))
+        while True:
+            records = cur.fetchmany(FETCH_SIZE)
+            if not records:
+                break
+            idents, concepts, ranks, afreqs = zip(*records)
+            chunks.append((np.array(idents), np.array(concepts, dtype=np.int64), np.array(ranks, dtype=np.float64),
+                           np.array(afreqs, dtype=np.float64)))
+    conn.rollback()
+    if not chunks:
+        empty = sp.csr_matrix((0, 0))
+        return np.array([]), np.array([], dtype=np.int64), empty, empty
+    idents, concepts, ranks, afreqs = (np.concatenate(column) for column in zip(*chunks))
+    new_doc = np.ones(len(idents), dtype=bool)
+    new_doc[1:] = idents[1:] != idents[:-1]
+    doc_rows = np.cumsum(new_doc) - 1
+    keep = np.ones(len(idents), dtype=bool)
+    keep[:-1] = (doc_rows[1:] != doc_rows[:-1]) | (concepts[1:] != concepts[:-1])
+    concept_ids, columns = np.unique(concepts[keep], return_inverse=True)
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(doc_rows[keep], minlength=new_doc.sum()))))
+    shape = (len(indptr) - 1, len(concept_ids))
+    return (idents[new_doc], concept_ids, sp.csr_matrix((ranks[keep], columns, indptr), shape=shape),
+            sp.csr_matrix((afreqs[keep], columns, indptr), shape=shape))
+
+
+# Cheap summary of a fingerprint table, used to tell whether a cached matrix is stale
+def table_signature(conn, table):
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL('''SELECT count(*), coalesce(sum(concept_id), 0), coalesce(sum(concept_rank), 0),
+                                      coalesce(sum(concept_afreq), 0)
+                               FROM {}''').format(sql.Identifier(table)))
+        signature = ','.join(str(value) for value in cur.fetchone())
+    conn.rollback()
+    return signature
+
+
+# Values of column j of a CSC matrix at the given sorted rows (zero where the column has no entry)
+def column_values(matrix, j, rows):
+    start, end = matrix.indptr[j], matrix.indptr[j + 1]
+    values = np.zeros(len(rows))
+    values[np.searchsorted(rows, matrix.indices[start:end])] = matrix.data[start:end]
+    return values
+
+
+# Cosine scores given dot products and squared norms. As with the Decimal vectors, a zero vector scores 0
+def cosine(dot, query_norm, doc_squared_norms):
+    norms = query_norm * np.sqrt(doc_squared_norms)
+    return np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+
+
+# Min-max normalization of the scores of one query. The maximum is at least 0. A spread within rounding error of the
+# scores' magnitude counts as none, so that equal scores summed in a different order do not normalize to noise
+def normalize(scores):
+    low = scores.min()
+    spread = max(scores.max(), 0.0) - low
+    if spread <= np.finfo(scores.dtype).eps * max(abs(low), 1.0):
+        return np.zeros_like(scores)
+    return (scores - low) / spread
+
+
+class MatchEngine(object):
+    def __init__(self, doc_ids, concept_ids, ranks, afreqs, k=2.0, b=0.75):
+        """ Precompute the scoring terms of an index of fingerprints, see load_fingerprints """
+        self.doc_ids = doc_ids
+        self.concept_ids = concept_ids
+        self.ranks = ranks.tocsr()
+        self.afreqs = afreqs.tocsr()
+        self.presence = sp.csr_matrix((np.ones(self.ranks.nnz), self.ranks.indices, self.ranks.indptr),
+                                      shape=self.ranks.shape)
+        self.squared_ranks = sp.csr_matrix((self.ranks.data ** 2, self.ranks.indices, self.ranks.indptr),
+                                           shape=self.ranks.shape)
+        # IDF from the number of documents and the document frequency of every concept
+        num_documents = self.ranks.shape[0]
+        document_frequency = np.bincount(self.ranks.indices, minlength=self.ranks.shape[1])
+        self.idf = np.log10((num_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+        # NOTE: Doc lengths here correspond to length of what is indexed (number of concepts of the fingerprint)
+        self.doc_lengths = np.diff(self.ranks.indptr)
+        average_doc_length = self.doc_lengths.mean() if num_documents else 0.0
+        # The BM25 term of a (document, concept) entry does not depend on the query, so a query's BM25 score is a sum
+        # of precomputed terms. Based on https://en.wikipedia.org/wiki/Okapi_BM25
+        entry_idf = self.idf[self.ranks.indices]
+        entry_length_norm = np.repeat(k * (1 - b + b * self.doc_lengths / average_doc_length), self.doc_lengths)
+        self.bm25 = sp.csr_matrix((entry_idf * self.afreqs.data * (k + 1) / (entry_idf + entry_length_norm),
+                                   self.ranks.indices, self.ranks.indptr), shape=self.ranks.shape)
+
+    def save(self, cache_file, signature=''):
+        """ Save the fingerprint matrices to an .npz cache file """
+        np.savez(cache_file, doc_ids=self.doc_ids, concept_ids=self.concept_ids, ranks=self.ranks.data,
+                 afreqs=self.afreqs.data, indices=self.ranks.indices, indptr=self.ranks.indptr,
+                 shape=np.array(self.ranks.shape), signature=np.array(signature))
+
+    @classmethod
+    def load(cls, cache_file):
+        """ Returns the engine and table signature saved in an .npz cache file """
+        with np.load(cache_file) as cache:
+            shape = tuple(cache['shape'])
+            ranks = sp.csr_matrix((cache['ranks'], cache['indices'], cache['indptr']), shape=shape)
+            afreqs = sp.csr_matrix((cache['afreqs'], cache['indices'], cache['indptr']), shape=shape)
+            return cls(cache['doc_ids'], cache['concept_ids'], ranks, afreqs), str(cache['signature'])
+
+    @classmethod
+    def cached(cls, conn, table, ident_col, cache_file, rebuild=False):
+        """ Returns the engine of a fingerprint table, from the cache file unless the table changed since it was saved """
+        signature = table_signature(conn, table)
+        if not rebuild and os.path.exists(cache_file):
+            engine, cached_signature = cls.load(cache_file)
+            if cached_signature == signature:
+                return engine
+        engine = cls(*load_fingerprints(conn, table, ident_col))
+        engine.save(cache_file, signature)
+        return engine
+
+    def query_matrices(self, query_concept_ids, query_ranks):
+        """ Map a batch of query fingerprints (query x query concept ranks) onto the index concepts """
+        positions = np.minimum(np.searchsorted(self.concept_ids, query_concept_ids), max(len(self.concept_ids) - 1, 0))
+        found = np.flatnonzero(self.concept_ids[positions] == query_concept_ids) if len(self.concept_ids) else \
+            np.array([], dtype=np.int64)
+        mapping = sp.csr_matrix((np.ones(len(found)), (found, positions[found])),
+                                shape=(len(query_concept_ids), len(self.concept_ids)))
+        query_presence = sp.csr_matrix((np.ones(query_ranks.nnz), query_ranks.indices, query_ranks.indptr),
+                                       shape=query_ranks.shape)
+        return (query_ranks @ mapping).T.tocsc(), (query_presence @ mapping).T.tocsc()
+
+    def score(self, query_concept_ids, query_ranks, top_k=10, idf_bias=0.5):
+        """
+        Score a batch of query fingerprints against every document sharing at least one concept with the query.
+        Returns per query the top_k (document position, unweighted cosine, weighted cosine, BM25, final score) arrays,
+        normalized over the query's results and sorted by BM25
+        """
+        query_ranks = sp.csr_matrix(query_ranks)
+        ranks, presence = self.query_matrices(query_concept_ids, query_ranks)
+        idf_squared = sp.diags(self.idf ** 2)
+        weighted_ranks, weighted_presence = idf_squared @ ranks, idf_squared @ presence
+        # Cosines are taken over the query's concepts only: the query vector holds all of its concepts (also those
+        # absent from the index), the document vector the ranks of those concepts
+        query_norms = np.sqrt(np.asarray(query_ranks.multiply(query_ranks).sum(axis=1)).ravel())
+        weighted_query_norms = np.sqrt(np.asarray(weighted_ranks.multiply(ranks).sum(axis=0)).ravel())
+        products = [(self.presence @ presence), (self.ranks @ ranks), (self.squared_ranks @ presence),
+                    (self.ranks @ weighted_ranks), (self.squared_ranks @ weighted_presence), (self.bm25 @ presence)]
+        products = [product.tocsc() for product in products]
+        for product in products:
+            product.sort_indices()
+        candidates = products[0]
+
+        results = []
+        for j in range(query_ranks.shape[0]):
+            docs = candidates.indices[candidates.indptr[j]:candidates.indptr[j + 1]]
+            if len(docs) == 0:
+                results.append((docs, np.array([]), np.array([]), np.array([]), np.array([])))
+                continue
+            dot, squared, weighted_dot, weighted_squared, bm25 = (column_values(product, j, docs)
+                                                                  for product in products[1:])
+            unweighted_cosine = normalize(cosine(dot, query_norms[j], squared))
+            weighted_cosine = normalize(cosine(weighted_dot, weighted_query_norms[j], weighted_squared))
+            bm25 = normalize(bm25)
+            top = np.argpartition(-bm25, top_k - 1)[:top_k] if len(docs) > top_k else np.arange(len(docs))
+            top = top[np.lexsort((top, -bm25[top]))]
+            final = weighted_cosine[top] * (1 - idf_bias) + bm25[top] * idf_bias
+            results.append((docs[top], unweighted_cosine[top], weighted_cosine[top], bm25[top], final))
+        return results
@@ -7,73 +7,173 @@ Author: Avi, Lingtian "Lindsay" Wan, Samet Keserci
 Create Date: 02/10/2016
 Modified: 05/20/2016, Lindsay Wan, added documentation
 Revised:8/1/2016, Samet Keserci, revised whole code for the change in AHRQ website.
+Revised: 10/16/2026, ported to Python 3: concurrent fetches, an HTTP cache and lxml extraction
+
+Guideline summary pages are fetched by a bounded pool of threads. Pages are kept in an on-disk sqlite cache keyed by URL
+together with their ETag / Last-Modified validators: a cached page is re-requested conditionally and not re-downloaded
+when the server answers 304 Not Modified. PMIDs are extracted from the "Bibliographic Source(s)" panel with lxml.
+
+The UID -> PMID mapping is written to `uid_to_pmid.csv`, which cg_update_tables.sql COPYs into cg_uid_pmid_mapping.
+
+Usage: cg_pmidextractor.py [-i uid_link_file] [-o mapping_file] [-c cache_file] [-j jobs] [-r retries]
+
+To test against saved guideline pages, serve their directory locally (e.g. `python -m http.server 8000`) and list
+`http://localhost:8000/{page}` URLs ending with the UIDs in the uid_link_file.
 '''
 
-from bs4 import BeautifulSoup as bs
-import re
-import lxml
-import urllib2 # -- for Python 2.7 use only. For 3.4 use urllib.request
+import argparse
+import concurrent.futures as cf
 import csv
-import pandas as pd
-from datetime import datetime
-import time
 import random
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from datetime import datetime
+import lxml.etree
+import lxml.html
+
+USER_AGENT = 'NIH_pmidextractor'
+UID_PATTERN = re.compile(r'(\d+)\s*$')
+PMID_PATTERN = re.compile(r'list_uids=(\d+)')
+
+
+class PageCache:
+    """
+    sqlite cache of fetched pages with their HTTP validators, safe to use from several threads
+    """
+
+    def __init__(self, cache_file):
+        self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB NOT NULL, fetched_at REAL NOT NULL)''')
 
-startTime = datetime.now()
-count = 0
-data = pd.read_csv('ngc_uid_link.csv', header=None)
-uid_link = data[0]
-hyper_link = []
-ttnum = len(uid_link)
-csv_open = open('uid_to_pmid.csv', 'w')
-csv_write = csv.writer(csv_open)
-exception_count = 0
-for urls in uid_link:
-    count += 1
-
-    try:
-        req = urllib2.Request(url=urls, headers={'User-Agent':'NIH_pmidextractor'})
-        resp = urllib2.urlopen(req)
-    except:
-        exception_count +=1
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT etag, last_modified, body FROM pages WHERE url = ?', (url,)).fetchone()
+        return (row[0], row[1], zlib.decompress(row[2])) if row else None
+
+    def put(self, url, etag, last_modified, body):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                              (url, etag, last_modified, zlib.compress(body), time.time()))
+
+    def close(self):
+        self.conn.close()
+
+
+def fetch(url, cache, retries=1):
+    """
+    Fetch a page, conditionally when it is cached.
+
+    Output: (bytes, bool) the page and whether it came from the cache
+    """
+    cached = cache.get(url)
+    headers = {'User-Agent': USER_AGENT}
+    if cached:
+        etag, last_modified, body = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    attempt = 0
+    while True:
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url=url, headers=headers)) as resp:
+                body = resp.read()
+                cache.put(url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'), body)
+                return body, False
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached:
+                return cached[2], True
+            error = e
+        except (urllib.error.URLError, OSError) as e:
+            error = e
+        attempt += 1
+        if attempt > retries:
+            raise error
         print("!!! Exception thrown at following url : ")
-        print(urls)
+        print(url)
         # wait a couple of seconds and retry
-        time.sleep(random.randint(5,10))
-        req = urllib2.Request(url=urls, headers={'User-Agent':'NIH_pmidextractor'})
-        resp = urllib2.urlopen(req)
-
-
-    info = resp.read()
-    soup = bs(info, 'lxml')
-    uid = int(urls[44:])
-    print ("Processing " + str(count) + "/" + str(ttnum) + ": UID: " + \
-           str(uid))
-
-    div_list = soup.find_all('div', attrs={'class':'accordion-panel is-active'})
-    if div_list is not None:
-        for div in div_list:
-            h3 = div.find('h3');
-            if h3.text == 'Bibliographic Source(s)':
-                td = div.find('td')
-                if td is not None:
-                    link = td.find('a')
-                    if link is not None:
-                        if 'PubMed' in link:
-                            hyper_link = re.findall(r'href=(.*)"', str(link))
-                            hyper_link = str(hyper_link)
-                            if 'list_uids' in hyper_link:
-                                index = hyper_link.index('list_uids') + 10
-                                index2 = hyper_link.index(' ')
-                                pmid = hyper_link[index:index2-1]
-                                csv_write.writerow((uid, pmid))
-                                print ("Mapped: UID: " + str(uid) + " to PMID: " \
-                                       + str(pmid))
-                                break
-
-
-csv_open.close()
-print("Total time: " + str(datetime.now() - startTime))
-print("Total number of exception:")
-print(exception_count)
-print("exited from pmidextractor_py. Next updating the tables")
+        time.sleep(random.randint(5, 10))
+
+
+def extract_pmid(page):
+    """
+    Output: (str) the PubMed ID linked from the "Bibliographic Source(s)" panel of a guideline page, or None
+    """
+    document = lxml.html.fromstring(page)
+    for div in document.xpath('//div[@class="accordion-panel is-active"]'):
+        h3 = div.xpath('(.//h3)[1]')
+        if not h3 or h3[0].text_content() != 'Bibliographic Source(s)':
+            continue
+        link = div.xpath('(.//td)[1]/descendant::a[1]')
+        if not link or 'PubMed' not in link[0].xpath('text()'):
+            continue
+        href = urllib.parse.unquote(link[0].get('href', ''))
+        match = PMID_PATTERN.search(href)
+        if match:
+            return match.group(1)
+    return None
+
+
+def map_uid(url, cache, retries):
+    """
+    Output: (int, str, bool) the UID, its PMID or None and whether the page came from the cache
+    """
+    page, cached = fetch(url, cache, retries)
+    return int(UID_PATTERN.search(url).group(1)), extract_pmid(page), cached
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Map Clinical Guideline UIDs to PMIDs')
+    parser.add_argument('-i', '--uid_links', default='ngc_uid_link.csv', help='file of guideline summary URLs')
+    parser.add_argument('-o', '--output', default='uid_to_pmid.csv', help='UID -> PMID mapping CSV')
+    parser.add_argument('-c', '--cache', default='cg_page_cache.sqlite', help='HTTP page cache file')
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='number of concurrent fetches, 8 by default')
+    parser.add_argument('-r', '--retries', type=int, default=1, help='retries of a failed fetch, 1 by default')
+    args = parser.parse_args()
+
+    startTime = datetime.now()
+    with open(args.uid_links, newline='') as uid_link_file:
+        uid_link = [row[0].strip() for row in csv.reader(uid_link_file) if row and row[0].strip()]
+    ttnum = len(uid_link)
+    cache = PageCache(args.cache)
+    mapping = {}
+    exception_count = cached_count = count = 0
+    with cf.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(map_uid, urls, cache, args.retries): urls for urls in uid_link}
+        for future in cf.as_completed(futures):
+            count += 1
+            try:
+                uid, pmid, cached = future.result()
+            except (urllib.error.URLError, OSError) as e:
+                exception_count += 1
+                print("!!! Failed to fetch {}: {}".format(futures[future], e))
+                continue
+            except lxml.etree.LxmlError as e:
+                # e.g. a ParserError on an empty page
+                exception_count += 1
+                print("!!! Failed to parse {}: {}".format(futures[future], e))
+                continue
+            cached_count += cached
+            print("Processing {}/{}: UID: {}{}".format(count, ttnum, uid, " (not modified)" if cached else ""))
+            if pmid:
+                mapping[futures[future]] = (uid, pmid)
+                print("Mapped: UID: {} to PMID: {}".format(uid, pmid))
+    cache.close()
+
+    # Keep the order of the input
+    with open(args.output, 'w', newline='') as csv_open:
+        csv.writer(csv_open).writerows(mapping[urls] for urls in uid_link if urls in mapping)
+    print("Total time: " + str(datetime.now() - startTime))
+    print("Pages not modified since the last run: {}".format(cached_count))
+    print("Total number of exception:")
+    print(exception_count)
+    print("exited from pmidextractor_py. Next updating the tables")
@@ -94,7 +94,7 @@ paste ngc_uid.csv ngc_uid_title.txt > ngc_combined.txt
 
 # Use Python to grab PMID from UID.
 echo ***Grabbing PMIDs from uids...
-/anaconda2/bin/python -u ${absolute_script_dir}/cg_pmidextractor.py
+/anaconda3/bin/python -u ${absolute_script_dir}/cg_pmidextractor.py
 
 # Use SQL to update CG tables.
 echo ***Updating tables...
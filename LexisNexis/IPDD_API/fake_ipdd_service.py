@@ -0,0 +1,271 @@
+"""
+Local fake IPDD SOAP service for testing retrieve_api_data.py without LexisNexis credentials or network access.
+
+It serves a minimal WSDL with the IPDD operations used by IPDDClient and answers them from memory:
+    * LogOn/LogOff issue and revoke a security token
+    * RetrieveBatchInfo reports `--documents` documents for every dataset
+    * RequestBatchSized splits them into batches of up to `batchSize` documents
+    * RetrieveBatchStatus reports a batch `Queued` and `Running` before it is `Finished`
+    * RetrieveBatch returns the batch ZIP from a position, at most `--chunk_size` bytes per call
+
+Usage:
+    fake_ipdd_service.py [-p port] [-n documents] [-c chunk_size]
+    retrieve_api_data.py -U user -W password -R http://localhost:{port}/IPDD?wsdl -D US EP
+"""
+
+import argparse
+import base64
+import io
+import itertools
+import threading
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+SERVICE_NS = 'http://fake.ipdd.local/service'
+TYPES_NS = 'http://fake.ipdd.local/types'
+SOAP_ENV_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+# (operation, request parameters, response result type)
+OPERATIONS = [
+    ('LogOn', [('username', 'xs:string'), ('password', 'xs:string')], 't:LogOnResult'),
+    ('LogOff', [('securityToken', 'xs:string')], 'xs:boolean'),
+    ('RetrieveBatchInfo', [('request', 't:UpdateRequest')], 't:BatchInfo'),
+    ('RequestBatchSized', [('request', 't:UpdateRequest'), ('batchSize', 'xs:int')], 't:BatchList'),
+    ('RetrieveBatchStatus', [('securityToken', 'xs:string'), ('batchId', 'xs:string')], 't:BatchStatus'),
+    ('RetrieveBatch', [('securityToken', 'xs:string'), ('batchId', 'xs:string'), ('position', 'xs:long')],
+     'xs:base64Binary'),
+    ('RequestHistory', [('request', 't:HistoryRequest')], 't:BatchList')]
+
+REQUEST_FIELDS = ['SecurityToken', 'DataSet', 'DataType', 'ListFormat', 'KindGroup']
+TYPES_SCHEMA = '''
+    <xs:schema targetNamespace="{types_ns}" elementFormDefault="qualified"
+               xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:t="{types_ns}">
+      <xs:complexType name="UpdateRequest"><xs:sequence>{request_fields}</xs:sequence></xs:complexType>
+      <xs:complexType name="HistoryRequest"><xs:sequence>{request_fields}
+        <xs:element name="RequestDateFrom" type="xs:string" minOccurs="0"/>
+        <xs:element name="RequestDateTo" type="xs:string" minOccurs="0"/>
+        <xs:element name="Status" type="xs:string" minOccurs="0"/>
+      </xs:sequence></xs:complexType>
+      <xs:complexType name="LogOnResult"><xs:sequence>
+        <xs:element name="Expiration" type="xs:dateTime"/><xs:element name="SecurityToken" type="xs:string"/>
+      </xs:sequence></xs:complexType>
+      <xs:complexType name="BatchInfo"><xs:sequence>
+        <xs:element name="Count" type="xs:int"/><xs:element name="DataSet" type="xs:string"/>
+      </xs:sequence></xs:complexType>
+      <xs:complexType name="Batch"><xs:sequence>
+        <xs:element name="BatchId" type="xs:string"/><xs:element name="Count" type="xs:int"/>
+      </xs:sequence></xs:complexType>
+      <xs:complexType name="BatchList"><xs:sequence>
+        <xs:element name="Count" type="xs:int"/>
+        <xs:element name="Batch" type="t:Batch" minOccurs="0" maxOccurs="unbounded"/>
+      </xs:sequence></xs:complexType>
+      <xs:complexType name="BatchStatus"><xs:sequence>
+        <xs:element name="BatchId" type="xs:string"/><xs:element name="Status" type="xs:string"/>
+      </xs:sequence></xs:complexType>
+    </xs:schema>'''.format(types_ns=TYPES_NS, request_fields=''.join(
+    '<xs:element name="{}" type="xs:string" minOccurs="0"/>'.format(field) for field in REQUEST_FIELDS))
+
+
+def wsdl(location):
+    """
+    Document/literal wrapped WSDL of the fake service. The types schema comes second, so that zeep maps its
+    namespace to `ns1` as with the IPDD service (see IPDDClient.type_factory).
+    """
+    elements = ''.join('''
+      <xs:element name="{0}"><xs:complexType><xs:sequence>{1}</xs:sequence></xs:complexType></xs:element>
+      <xs:element name="{0}Response"><xs:complexType><xs:sequence>
+        <xs:element name="{0}Result" type="{2}" minOccurs="0"/>
+      </xs:sequence></xs:complexType></xs:element>'''.format(
+        operation, ''.join('<xs:element name="{}" type="{}"/>'.format(name, param_type) for name, param_type in params),
+        result_type) for operation, params, result_type in OPERATIONS)
+    messages = ''.join('''
+  <wsdl:message name="{0}Input"><wsdl:part name="parameters" element="s:{0}"/></wsdl:message>
+  <wsdl:message name="{0}Output"><wsdl:part name="parameters" element="s:{0}Response"/></wsdl:message>'''.format(
+        operation) for operation, params, result_type in OPERATIONS)
+    port_operations = ''.join('''
+    <wsdl:operation name="{0}">
+      <wsdl:input message="s:{0}Input"/><wsdl:output message="s:{0}Output"/>
+    </wsdl:operation>'''.format(operation) for operation, params, result_type in OPERATIONS)
+    binding_operations = ''.join('''
+    <wsdl:operation name="{0}">
+      <soap:operation soapAction="{1}/{0}" style="document"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>'''.format(operation, SERVICE_NS) for operation, params, result_type in OPERATIONS)
+    return '''<?xml version="1.0" encoding="utf-8"?>
+<wsdl:definitions targetNamespace="{service_ns}" xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+                  xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" xmlns:xs="http://www.w3.org/2001/XMLSchema"
+                  xmlns:s="{service_ns}" xmlns:t="{types_ns}">
+  <wsdl:types>
+    <xs:schema targetNamespace="{service_ns}" elementFormDefault="qualified">
+      <xs:import namespace="{types_ns}"/>{elements}
+    </xs:schema>{types_schema}
+  </wsdl:types>{messages}
+  <wsdl:portType name="IPDDPort">{port_operations}
+  </wsdl:portType>
+  <wsdl:binding name="IPDDBinding" type="s:IPDDPort">
+    <soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>{binding_operations}
+  </wsdl:binding>
+  <wsdl:service name="IPDD">
+    <wsdl:port name="IPDDPort" binding="s:IPDDBinding"><soap:address location="{location}"/></wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>'''.format(service_ns=SERVICE_NS, types_ns=TYPES_NS, elements=elements, types_schema=TYPES_SCHEMA,
+                              messages=messages, port_operations=port_operations,
+                              binding_operations=binding_operations, location=location)
+
+
+class FakeIPDD:
+    """
+    In-memory IPDD state shared by all request handler threads
+    """
+
+    STATUS_SEQUENCE = ['Queued', 'Running', 'Finished']
+
+    def __init__(self, documents, chunk_size):
+        self.documents = documents
+        self.chunk_size = chunk_size
+        self.tokens = set()
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.batch_numbers = itertools.count(1)
+
+    def check_token(self, token):
+        if token not in self.tokens:
+            raise ValueError('Invalid security token')
+
+    def log_on(self, username, password):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens.add(token)
+        return '<t:Expiration>2099-01-01T00:00:00</t:Expiration><t:SecurityToken>{}</t:SecurityToken>'.format(token)
+
+    def log_off(self, token):
+        with self.lock:
+            self.tokens.discard(token)
+        return 'true'
+
+    def retrieve_batch_info(self, request):
+        self.check_token(request['SecurityToken'])
+        return '<t:Count>{}</t:Count><t:DataSet>{}</t:DataSet>'.format(self.documents, request['DataSet'])
+
+    def request_batch_sized(self, request, batch_size):
+        self.check_token(request['SecurityToken'])
+        batches = []
+        for offset in range(0, self.documents, batch_size):
+            count = min(batch_size, self.documents - offset)
+            with self.lock:
+                batch_id = '{}-{}'.format(request['DataSet'], next(self.batch_numbers))
+                self.batches[batch_id] = {'polls': 0, 'zip': self.batch_zip(request['DataSet'], offset, count)}
+            batches.append('<t:Batch><t:BatchId>{}</t:BatchId><t:Count>{}</t:Count></t:Batch>'.format(batch_id, count))
+        return '<t:Count>{}</t:Count>{}'.format(len(batches), ''.join(batches))
+
+    @staticmethod
+    def batch_zip(dataset, offset, count):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for number in range(offset, offset + count):
+                archive.writestr('{}{:08d}.xml'.format(dataset, number),
+                                 '<lexisnexis-patent-document><publication-reference>{}{:08d}'
+                                 '</publication-reference></lexisnexis-patent-document>'.format(dataset, number))
+        return buffer.getvalue()
+
+    def retrieve_batch_status(self, token, batch_id):
+        self.check_token(token)
+        with self.lock:
+            batch = self.batches[batch_id]
+            status = self.STATUS_SEQUENCE[min(batch['polls'], len(self.STATUS_SEQUENCE) - 1)]
+            batch['polls'] += 1
+        return '<t:BatchId>{}</t:BatchId><t:Status>{}</t:Status>'.format(batch_id, status)
+
+    def retrieve_batch(self, token, batch_id, position):
+        self.check_token(token)
+        chunk = self.batches[batch_id]['zip'][position:position + self.chunk_size]
+        return base64.b64encode(chunk).decode('ascii')
+
+    def request_history(self, request):
+        self.check_token(request['SecurityToken'])
+        return '<t:Count>{}</t:Count>{}'.format(len(self.batches), ''.join(
+            '<t:Batch><t:BatchId>{}</t:BatchId><t:Count>0</t:Count></t:Batch>'.format(batch_id)
+            for batch_id in sorted(self.batches)))
+
+
+class FakeIPDDHandler(BaseHTTPRequestHandler):
+    ipdd = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, body):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.respond(200, wsdl('http://{}:{}{}'.format(*self.server.server_address, self.path.split('?')[0])))
+
+    def do_POST(self):
+        envelope = ElementTree.fromstring(self.rfile.read(int(self.headers['Content-Length'])))
+        operation_element = envelope.find('{%s}Body' % SOAP_ENV_NS)[0]
+        operation = operation_element.tag.split('}')[1]
+        params = {}
+        for child in operation_element:
+            name = child.tag.split('}')[1]
+            params[name] = {field.tag.split('}')[1]: field.text for field in child} if len(child) else child.text
+        try:
+            result = self.dispatch(operation, params)
+        except (KeyError, ValueError) as e:
+            self.respond(500, '''<soap:Envelope xmlns:soap="{}"><soap:Body><soap:Fault><faultcode>soap:Client</faultcode>
+<faultstring>{}</faultstring></soap:Fault></soap:Body></soap:Envelope>'''.format(SOAP_ENV_NS, escape(repr(e))))
+            return
+        self.respond(200, '''<soap:Envelope xmlns:soap="{}" xmlns:s="{}" xmlns:t="{}"><soap:Body><s:{op}Response>
+<s:{op}Result>{}</s:{op}Result></s:{op}Response></soap:Body></soap:Envelope>'''.format(
+            SOAP_ENV_NS, SERVICE_NS, TYPES_NS, result, op=operation))
+
+    def dispatch(self, operation, params):
+        if operation == 'LogOn':
+            return self.ipdd.log_on(params['username'], params['password'])
+        if operation == 'LogOff':
+            return self.ipdd.log_off(params['securityToken'])
+        if operation == 'RetrieveBatchInfo':
+            return self.ipdd.retrieve_batch_info(params['request'])
+        if operation == 'RequestBatchSized':
+            return self.ipdd.request_batch_sized(params['request'], int(params['batchSize']))
+        if operation == 'RetrieveBatchStatus':
+            return self.ipdd.retrieve_batch_status(params['securityToken'], params['batchId'])
+        if operation == 'RetrieveBatch':
+            return self.ipdd.retrieve_batch(params['securityToken'], params['batchId'], int(params['position']))
+        if operation == 'RequestHistory':
+            return self.ipdd.request_history(params['request'])
+        raise KeyError(operation)
+
+
+def serve(port=0, documents=100, chunk_size=64 * 1024):
+    """
+    Start the fake service in a background thread.
+
+    Output: (ThreadingHTTPServer) the server: its WSDL is at `http://localhost:{server.server_port}/IPDD?wsdl`
+    """
+    handler = type('Handler', (FakeIPDDHandler,), {'ipdd': FakeIPDD(documents, chunk_size)})
+    server = ThreadingHTTPServer(('localhost', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local fake IPDD SOAP service')
+    parser.add_argument('-p', '--port', type=int, default=8765, help='port to listen on, 8765 by default')
+    parser.add_argument('-n', '--documents', type=int, default=100, help='documents per dataset, 100 by default')
+    parser.add_argument('-c', '--chunk_size', type=int, default=64 * 1024,
+                        help='max bytes returned per RetrieveBatch call, 64 KiB by default')
+    args = parser.parse_args()
+    fake_server = serve(args.port, args.documents, args.chunk_size)
+    print('Fake IPDD service WSDL: http://localhost:{}/IPDD?wsdl'.format(fake_server.server_port))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake_server.shutdown()
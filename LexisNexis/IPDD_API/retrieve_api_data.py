@@ -1,129 +1,204 @@
 from zeep import Client
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
+import requests
 import zipfile
 import argparse
+import os
+import shutil
+import concurrent.futures as cf
 from time import sleep
 from datetime import datetime, timedelta
 
-# IPDD returns security token and expiration info
-def log_on(ipdd_service_reference,username,password):
-    client = Client(ipdd_service_reference)
-    result = client.service.LogOn(username,password)
-    expiration = result['Expiration']
-    security_token = result['SecurityToken']
-    return expiration,security_token
-
-# Close IPDD session
-def log_off(ipdd_service_reference,security_token):
-    client = Client(ipdd_service_reference)
-    return client.service.LogOff(security_token)
-
-# per page 96 of TRG, DataSet is the Authority code or custom type used to identify the dataset (e.g. US or EP)
-# Per page 96 of TRG, DataType can be one of ('Xml','Pdf','Clip','Images')
-# Per page 96 of TRG, KindGroup can be one of ('All','Application','Grant','Other')
-def create_update_request(ipdd_service_reference,security_token,dataset,datatype='Xml',list_format=None,kind_group=None):
-    client = Client(ipdd_service_reference)
-    request_factory = client.type_factory('ns1')
-    return request_factory.UpdateRequest(SecurityToken=security_token,DataSet=dataset,DataType=datatype,
-                                          ListFormat=list_format,KindGroup=kind_group)
-
-# This function is used to request a history list in XML format of all the previously requested batches
-def create_history_request(ipdd_service_reference,security_token,dataset,datatype='Xml',list_format=None,kind_group=None,
-                            request_date_from=(datetime.today() - timedelta(days=7)).strftime("%Y-%m-%d"), request_date_to=(datetime.today()).strftime("%Y-%m-%d"),
-                            status='All'):
-    client = Client(ipdd_service_reference)
-    request_factory = client.type_factory('ns1')
-    return request_factory.HistoryRequest(SecurityToken=security_token,DataSet=dataset,DataType=datatype,
-                                          ListFormat=list_format,KindGroup=kind_group,
-                                          RequestDateFrom=request_date_from,RequestDateTo=request_date_to,
-                                          Status=status)
-
-# Request past history
-def request_history(ipdd_service_reference,history_request_variable):
-    client = Client(ipdd_service_reference)
-    return client.service.RequestHistory(history_request_variable)
-
-# IPDD returns the number of documents in a batch based on entitlement (or access denied)
-def retrieve_batch_info(ipdd_service_reference,request_variable):
-    client = Client(ipdd_service_reference)
-    return client.service.RetrieveBatchInfo(request_variable)
-
-# IPDD returns a batchList
-# batch_size must be between 20K and 50K
-def request_batch_sized(ipdd_service_reference,request_variable,batch_size=20000):
-    client = Client(ipdd_service_reference)
-    return client.service.RequestBatchSized(request_variable,batch_size)
-
-# IPDD returns information on batch including Queued, Running, Finished, Failed, Retrieved
-def retrieve_batch_status(ipdd_service_reference,security_token,batch_id):
-    client = Client(ipdd_service_reference)
-    return client.service.RetrieveBatchStatus(security_token,batch_id)
-
-# IPDD returns stream containing the data in a single Zip file
-def retrieve_batch(ipdd_service_reference,security_token,batch_id,position):
-    client = Client(ipdd_service_reference)
-    return client.service.RetrieveBatch(security_token,batch_id,position)
+
+class IPDDClient:
+    """
+    One IPDD SOAP client per run: the WSDL is fetched and parsed once (and cached on disk across runs) and all calls
+    share one HTTP session. Service calls are safe to make from several threads.
+    """
+
+    def __init__(self, ipdd_service_reference, wsdl_cache='~/.ipdd_wsdl_cache.db', wsdl_cache_timeout=7 * 24 * 3600,
+                 operation_timeout=300):
+        cache = SqliteCache(path=os.path.expanduser(wsdl_cache), timeout=wsdl_cache_timeout) if wsdl_cache else None
+        self.session = requests.Session()
+        transport = Transport(session=self.session, cache=cache, operation_timeout=operation_timeout)
+        self.client = Client(ipdd_service_reference, transport=transport)
+        self.service = self.client.service
+        self.request_factory = self.client.type_factory('ns1')
+
+    # IPDD returns security token and expiration info
+    def log_on(self, username, password):
+        result = self.service.LogOn(username, password)
+        return result['Expiration'], result['SecurityToken']
+
+    # Close IPDD session
+    def log_off(self, security_token):
+        return self.service.LogOff(security_token)
+
+    # per page 96 of TRG, DataSet is the Authority code or custom type used to identify the dataset (e.g. US or EP)
+    # Per page 96 of TRG, DataType can be one of ('Xml','Pdf','Clip','Images')
+    # Per page 96 of TRG, KindGroup can be one of ('All','Application','Grant','Other')
+    def create_update_request(self, security_token, dataset, datatype='Xml', list_format=None, kind_group=None):
+        return self.request_factory.UpdateRequest(SecurityToken=security_token, DataSet=dataset, DataType=datatype,
+                                                  ListFormat=list_format, KindGroup=kind_group)
+
+    # This function is used to request a history list in XML format of all the previously requested batches
+    def create_history_request(self, security_token, dataset, datatype='Xml', list_format=None, kind_group=None,
+                               request_date_from=None, request_date_to=None, status='All'):
+        return self.request_factory.HistoryRequest(
+            SecurityToken=security_token, DataSet=dataset, DataType=datatype, ListFormat=list_format,
+            KindGroup=kind_group,
+            RequestDateFrom=request_date_from or (datetime.today() - timedelta(days=7)).strftime("%Y-%m-%d"),
+            RequestDateTo=request_date_to or datetime.today().strftime("%Y-%m-%d"), Status=status)
+
+    # Request past history
+    def request_history(self, history_request_variable):
+        return self.service.RequestHistory(history_request_variable)
+
+    # IPDD returns the number of documents in a batch based on entitlement (or access denied)
+    def retrieve_batch_info(self, request_variable):
+        return self.service.RetrieveBatchInfo(request_variable)
+
+    # IPDD returns a batchList
+    # batch_size must be between 20K and 50K
+    def request_batch_sized(self, request_variable, batch_size=20000):
+        return self.service.RequestBatchSized(request_variable, batch_size)
+
+    # IPDD returns information on batch including Queued, Running, Finished, Failed, Retrieved
+    def retrieve_batch_status(self, security_token, batch_id):
+        return self.service.RetrieveBatchStatus(security_token, batch_id)
+
+    # IPDD returns the data of a batch Zip file from a position
+    def retrieve_batch(self, security_token, batch_id, position):
+        return self.service.RetrieveBatch(security_token, batch_id, position)
+
+    def wait_for_batch(self, security_token, batch_id, initial_delay=1.0, max_delay=300.0):
+        """
+        Poll the batch status with exponential backoff until it is no longer Queued/Running.
+
+        Output: (str) the final status: Finished or Failed
+        """
+        delay = initial_delay
+        status = self.retrieve_batch_status(security_token, batch_id)['Status']
+        while status not in ("Finished", "Failed", "Retrieved"):
+            print("Batch {} is still generating ({}), next check in {:g} s...".format(batch_id, status, delay))
+            sleep(delay)
+            delay = min(delay * 2, max_delay)
+            status = self.retrieve_batch_status(security_token, batch_id)['Status']
+        return status
+
+    def download_batch(self, security_token, batch_id, download_dir, max_retries=10):
+        """
+        Stream a batch Zip to `{download_dir}/{batch_id}.zip`: every RetrieveBatch chunk is appended to a `.part` file
+        as it arrives, and a failed call is retried from the current file size.
+
+        Output: (str) path of the Zip file
+        """
+        zip_path = os.path.join(download_dir, '{}.zip'.format(batch_id))
+        part_path = zip_path + '.part'
+        retry_count = 0
+        with open(part_path, 'ab') as part_file:
+            position = part_file.tell()
+            while True:
+                try:
+                    data = self.retrieve_batch(security_token, batch_id, position)
+                except (requests.RequestException, OSError) as e:
+                    retry_count += 1
+                    if retry_count > max_retries:
+                        raise
+                    print("IOError while downloading {}: {}. Will retry at position {}".format(batch_id, e, position))
+                    sleep(min(2 ** retry_count, 300))
+                    continue
+                if not data:
+                    break
+                part_file.write(data)
+                position += len(data)
+        os.replace(part_path, zip_path)
+        return zip_path
+
+    @staticmethod
+    def unpack(zip_path, target_dir):
+        """
+        Extract a batch Zip member by member, streaming every member to disk
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                target_path = os.path.join(target_dir, os.path.basename(member.filename))
+                with archive.open(member) as source, open(target_path, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+        return target_dir
+
+    def process_batch(self, security_token, batch_id, download_dir, unpack=True, initial_delay=1.0):
+        """
+        Wait for a batch, download it and unpack it into `{download_dir}/{batch_id}/`
+
+        Output: (str) path of the downloaded Zip, or None if the batch failed
+        """
+        print("Monitoring batch {}".format(batch_id))
+        if self.wait_for_batch(security_token, batch_id, initial_delay) == "Failed":
+            print("Batch {} has failed during creation".format(batch_id))
+            return None
+        print("Batch {} has completed, downloading...".format(batch_id))
+        zip_path = self.download_batch(security_token, batch_id, download_dir)
+        if unpack:
+            self.unpack(zip_path, os.path.join(download_dir, batch_id))
+        print("Batch {} is downloaded to {}".format(batch_id, zip_path))
+        return zip_path
+
 
 if __name__ == "__main__" :
     # Read in available arguments
     parser = argparse.ArgumentParser(description='''
      This script interfaces with the IPDD API, collects data and passes it to the XMLTABLE parser.
+     Batches of all datasets are requested up front, then monitored, downloaded and unpacked concurrently.
     ''', formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument('-U','--ipdd_username',help='IPDD API username',type=str,required=True)
     parser.add_argument('-W','--ipdd_password',help='IPDD API password',type=str,required=True)
     parser.add_argument('-R','--ipdd_service_reference',help='IPDD service reference address',type=str,required=True)
     parser.add_argument('-b','--batch_size',help='Desired batch size on API retrievals',type=int,default=20000)
-    parser.add_argument('-s','--sleep_time',help='Amount of ms to sleep in between batch info calls',type=int,default=3000)
+    parser.add_argument('-s','--sleep_time',help='Initial seconds to sleep in between batch status calls, doubled on every call',type=float,default=3)
     parser.add_argument('-D','--datasets', type=str, nargs='+',help='Space delimited list of target datasets to collect patent data for')
     parser.add_argument('-d','--download_dir',help='Target directory to download zip data into',type=str,default='API_downloads')
+    parser.add_argument('-j','--jobs',help='Number of batches to monitor and download concurrently',type=int,default=4)
+    parser.add_argument('-c','--wsdl_cache',help='WSDL cache file, empty to disable',type=str,default='~/.ipdd_wsdl_cache.db')
+    parser.add_argument('-n','--no_unpack',help='Keep the batch Zip files packed',action='store_true')
     print('Reading arguments')
     args = parser.parse_args()
     print('Finished reading arguments')
     datatype='Xml'
+    os.makedirs(args.download_dir, exist_ok=True)
+    ipdd = IPDDClient(args.ipdd_service_reference, wsdl_cache=args.wsdl_cache)
     # Log on
     print("Logging on...")
-    expiration,security_token = log_on(args.ipdd_service_reference,args.ipdd_username,args.ipdd_password)
-    # For each type of dataset we are interested in...
-    for dataset in args.datasets:
-        # Check if new/updated publications are available. If so:
-        print ("Collecting data for {} patents with datatype format {}".format(dataset,datatype))
-        # Create updateRequestVariable
-        updateRequestVariable = create_update_request(args.ipdd_service_reference,security_token,dataset)
-
-        if retrieve_batch_info(args.ipdd_service_reference,updateRequestVariable)['Count'] > 0:
-            print("Update data available for download...")
-            # Request the publications
-            batch_list = request_batch_sized(args.ipdd_service_reference,updateRequestVariable,batch_size=args.batch_size)
-            # While loop on batch list
-            while len(batch_list.Batch) > 0:
-                # Wait for batch to complete
-                cur_batch_id = batch_list.Batch.pop(0)['BatchId']
-                print("Monitoring batch {}".format(cur_batch_id))
-                cur_batch_status = retrieve_batch_status(args.ipdd_service_reference,security_token,cur_batch_id)['Status']
-                while cur_batch_status != "Finished":
-                    if cur_batch_status == "Failed":
-                        print("Batch {} has failed during creation".format(cur_batch_id))
-                        break
-                    print("Batch {} is still generating...".format(cur_batch_id))
-                    sleep(args.sleep_time)
-                    cur_batch_status = retrieve_batch_status(args.ipdd_service_reference,security_token,cur_batch_id)['Status']
-
-                # Notify batch completion
-                print("Batch {} has completed and is available at the FTP location".format(cur_batch_id))
-                '''# Download the data in a try catch block inside of a while loop and write the stream to a zip file
-                retry=True;retry_count=0;position=0
-                while retry_count < 1000 and retry:
-                    cur_position=0
-                    try:
-                        # Retrieve the batch and write to file - NOTE: edit to do this in a while loop with a buffer
-                        data_stream = retrieve_batch(ipdd_service_reference,security_token,cur_batch_id,position)
-                        with open('{}/{}.zip'.format(args.download_dir,cur_batch_id)) as tmp_zip:
-                            tmp_zip.write(data_stream)
-                        data_stream.close()
-                        retry=False
-                    except:
-                        position+=cur_position
-                        print("IOError while downloading {}. Will retry at position {}".format(cur_batch_id,position))
-                        retry_count+=1'''
-    # Logoff
-    print("Logging off...")
-    log_off(args.ipdd_service_reference,security_token)
+    expiration,security_token = ipdd.log_on(args.ipdd_username,args.ipdd_password)
+    failed_batches = []
+    try:
+        with cf.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = {}
+            # For each type of dataset we are interested in...
+            for dataset in args.datasets:
+                # Check if new/updated publications are available. If so:
+                print ("Collecting data for {} patents with datatype format {}".format(dataset,datatype))
+                # Create updateRequestVariable
+                updateRequestVariable = ipdd.create_update_request(security_token,dataset,datatype)
+
+                if ipdd.retrieve_batch_info(updateRequestVariable)['Count'] > 0:
+                    print("Update data available for download...")
+                    # Request the publications and process the batches concurrently
+                    batch_list = ipdd.request_batch_sized(updateRequestVariable,batch_size=args.batch_size)
+                    for batch in batch_list.Batch:
+                        futures[executor.submit(ipdd.process_batch,security_token,batch['BatchId'],args.download_dir,
+                                                not args.no_unpack,args.sleep_time)] = batch['BatchId']
+            for future in cf.as_completed(futures):
+                if future.result() is None:
+                    failed_batches.append(futures[future])
+    finally:
+        # Logoff
+        print("Logging off...")
+        ipdd.log_off(security_token)
+    if failed_batches:
+        print("Failed batches: {}".format(', '.join(failed_batches)))
+        exit(1)
@@ -16,18 +16,17 @@ SYNOPSIS
 
 DESCRIPTION
 
-   Extract all ZIP files from the `{work_dir}/API_downloads/` (`./API_downloads/` by default) into the `{tmp_dir}/`.
-   Process extracted ZIPs one-by-one.
-   Produce an error log in `{tmp_dir}/errors.log`.
+   Process all ZIP files from the `{work_dir}/API_downloads/` (`./API_downloads/` by default) one-by-one via
+   `process_ln_zips.py`: XMLs are read straight from the ZIPs and parsed in batches over parallel connections.
+   Produce an error log in `{failed_files_dir}/{ZIP_name}/error.log`.
 
    The following options are available:
 
     -w work_dir         directory where IPDD data is stored
     -s subset_SP        parse a subset of data via the specified subset parsing Stored Procedure (SP)
-    -t tmp_dir          defaults to `{work_dir}/tmp` or `{work_dir}/tmp-{SP_name}` for subsets
-                        WARNING: be aware that `{tmp_dir}` is removed before processing and on success.
+    -t tmp_dir          ignored: ZIPs are no longer extracted
     -p processed_log    record file for successfully completed data ZIPs, defaults to `{work_dir}/processed.log`
-    -e max_errors       stop when the error number reaches this threshold, 101 by default
+    -e max_errors       stop when the error number reaches this threshold, do not stop by default
     -f failed_files_dir set directory where failed files should be stored, defaults to `{work_dir}/failed/`
     -v                  verbose output: print processed XML files
     -v -v               extra-verbose output: print all lines (`set -x`)
@@ -42,12 +41,9 @@ fi
 set -e
 set -o pipefail
 
-readonly STOP_FILE=".stop"
 # Get a script directory, same as by $(dirname $0)
 readonly SCRIPT_DIR=${0%/*}
 declare -rx ABSOLUTE_SCRIPT_DIR=$(cd "${SCRIPT_DIR}" && pwd)
-declare -rx ERROR_LOG=error.log
-declare -rx PARALLEL_LOG=parallel.log
 PROCESSED_LOG="processed.log"
 FAILED_FILES_DIR="failed"
 
@@ -57,8 +53,6 @@ while (( $# > 0 )); do
     -e)
       shift
       declare -ri MAX_ERRORS=$1
-      (( MAX_ERRORS > 0 )) && readonly PARALLEL_HALT_OPTION="--halt soon,fail=${MAX_ERRORS}"
-      readonly STOP_ON_THE_FIRST_ERROR=true
       ;;
     -f)
       shift
@@ -97,147 +91,21 @@ while (( $# > 0 )); do
 done
 
 cd ${WORK_DIR}
-if [[ ! ${tmp} ]]; then
-  if [[ ${SUBSET_SP} ]]; then
-    tmp="tmp-${SUBSET_SP}"
-  else
-    tmp="tmp"
-  fi
-fi
 
 echo -e "\n## Running under ${USER}@${HOSTNAME} in ${PWD} ##"
 
-if ! which parallel >/dev/null; then
-  echo "Please install GNU Parallel"
-  exit 1
-fi
-
-mkdir -p "${FAILED_FILES_DIR}"
-parse_xml() {
-  local xml="$1"
-  [[ $2 ]] && local subset_option="-v subset_sp=$2"
-  [[ ${VERBOSE} == "true" ]] && echo "Processing $xml ..."
-  #Identify whether it's US file or EP file
-  if [[ ${xml} == *"US"* ]]; then
-    file_identification="-v file_name=US"
-  else
-    file_identification="-v file_name=EP"
-  fi
-
-  if psql -q -f ${ABSOLUTE_SCRIPT_DIR}/Postgres/parser.sql -v "xml_file=$PWD/$xml" ${subset_option} ${file_identification} 2>>"${ERROR_LOG}"; then
-    [[ ${VERBOSE} == "true" ]] && echo "$xml: SUCCESSFULLY PARSED."
-    return 0
-  else
-    local full_xml_path=$(realpath ${xml})
-    local full_error_log_path=$(realpath ${ERROR_LOG})
-    cd ${tmp}
-    [[ ! -d "${failed_files_dir}" ]] && mkdir -p "${failed_files_dir}"
-    mv -f $full_xml_path "${failed_files_dir}/"
-    cp $full_error_log_path "${failed_files_dir}/"
-    [[ ${VERBOSE} == "true" ]] && echo "$xml: FAILED DURING PARSING."
-    return 1
-  fi
-}
-export -f parse_xml
-
-check_errors() {
-  # Errors occurred? Does the error log have a size greater than zero?
-  if [[ -s "${ERROR_LOG}" ]]; then
-    if [[ ${VERBOSE} == "true" ]]; then
-      cat <<HEREDOC
-Error(s) occurred during processing of ${PWD}.
-=====
-HEREDOC
-      cat "${ERROR_LOG}"
-      echo "====="
-    fi
-    cd ..
-    chmod -R g+w "${FAILED_FILES_DIR}"
-    exit 1
-  fi
-}
-
-declare -i num_zips=$(find . -name "*.zip" -type f | wc -l)
-declare -i failed_xml_counter=0 failed_xml_counter_total=0 processed_xml_counter=0 processed_xml_counter_total=0
-declare -i process_start_time i=0 start_time stop_time delta delta_s delta_m della_h elapsed=0 est_total eta
-process_start_time=$(date '+%s')
-
-for zip in API_downloads/*.zip; do
-  start_time=$(date '+%s')
-  if grep -q "^${zip}$" "${PROCESSED_LOG}"; then
-    echo "Skipping file ${zip} ( zip file #$((++i)) out of ${num_zips} ). It is already marked as completed."
-  else
-    echo -e "\nProcessing ${zip} ( zip file #$((++i)) out of ${num_zips} )..."
-
-    # Unzip data into relative tmp directory
-    unzip -u -q ${zip} -d ${tmp}
-
-    # Process XML files using GNU parallel
-    export failed_files_dir="$(realpath "${FAILED_FILES_DIR}")/$(basename ${zip%.zip})"
-    cd ${tmp}
-    rm -f "${ERROR_LOG}"
-    if ! find -name '*.xml' | parallel ${PARALLEL_HALT_OPTION} --joblog ${PARALLEL_LOG} --line-buffer \
-        --tagstring '|job#{#} s#{%}|' parse_xml "{}" ${SUBSET_SP}; then
-      [[ ${STOP_ON_THE_FIRST_ERROR} == "true" ]] && check_errors # Exits here if errors occurred
-    fi
-    while read -r line; do
-      if echo $line | grep -q "1"; then
-        ((++failed_xml_counter))
-      else
-        ((++processed_xml_counter))
-      fi
-    done < <(awk 'NR>1{print $7}' "${PARALLEL_LOG}")
-    rm -rf "${PARALLEL_LOG}"
-    cd - >/dev/null
-    rm -rf ${tmp}
-
-    # Status report
-    echo "SUMMARY FOR ${zip}:"
-    echo "SUCCESSFULLY PARSED ${processed_xml_counter} XML FILES"
-    if ((failed_xml_counter == 0)); then
-      echo "ALL IS WELL"
-    else
-      echo "FAILED PARSING ${failed_xml_counter} XML FILES"
-    fi
-    ((failed_xml_counter_total += failed_xml_counter)) || :
-    failed_xml_counter=0
-    ((processed_xml_counter_total += processed_xml_counter)) || :
-    processed_xml_counter=0
-    # Add if condition to only add zip to processed log when zero errors occured
-    echo "${zip}" >> "${PROCESSED_LOG}"
-
-    if [[ -f "${STOP_FILE}" ]]; then
-      echo -e "\nFound the stop signal file. Gracefully stopping..."
-      break
-    fi
-
-    stop_time=$(date '+%s')
-    ((delta = stop_time - start_time + 1)) || :
-    ((delta_s = delta % 60)) || :
-    ((delta_m = (delta / 60) % 60)) || :
-    ((della_h = delta / 3600)) || :
-    printf "$(TZ=America/New_York date) :  Done with ${zip} file in %dh:%02dm:%02ds\n" ${della_h} \
-           ${delta_m} ${delta_s}
-    if (( i < num_zips )); then
-      ((elapsed = elapsed + delta))
-      ((est_total = num_zips * elapsed / i)) || :
-      ((eta = process_start_time + est_total))
-      echo "ETA for job completion: $(TZ=America/New_York date --date=@${eta})"
-    fi
-  fi
-done
-
-echo -e "\nUPDATE SUMMARY:"
-echo "SUCCESSFULLY PARSED ${processed_xml_counter_total} XML FILES"
-if ((failed_xml_counter_total == 0)); then
-  echo "ALL IS WELL"
-else
-  echo "FAILED PARSING ${failed_xml_counter_total} XML FILES"
+# XML members are streamed from the ZIPs and parsed in batches over persistent connections by process_ln_zips.py
+[[ ${VERBOSE} == "true" ]] && readonly VERBOSE_OPTION="-v"
+[[ ${SUBSET_SP} ]] && readonly SUBSET_OPTION="-s ${SUBSET_SP}"
+set +e
+/anaconda3/bin/python "${ABSOLUTE_SCRIPT_DIR}/process_ln_zips.py" -w "${PWD}" -p "${PROCESSED_LOG}" \
+    -e ${MAX_ERRORS:-0} -f "${FAILED_FILES_DIR}" ${SUBSET_OPTION} ${VERBOSE_OPTION}
+declare -i result_code=$?
+set -e
+if ((result_code > 0)); then
+  [[ -d "${FAILED_FILES_DIR}" ]] && chmod -R g+w "${FAILED_FILES_DIR}"
+  exit ${result_code}
 fi
-
-
-cd "${FAILED_FILES_DIR}"
-check_errors # Exits here if errors occurred
 cd
 
 
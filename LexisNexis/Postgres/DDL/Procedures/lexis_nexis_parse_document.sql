@@ -0,0 +1,40 @@
+\set ON_ERROR_STOP on
+\set ECHO all
+
+-- DataGrip: start execution from here
+SET TIMEZONE = 'US/Eastern';
+
+-- Parse one LexisNexis patent XML: all parsing SPs, or only the parent records and the specified subset SP.
+-- file_name is 'US' or 'EP' and selects the agents SP. None of the parsing SPs COMMIT, so a caller can parse a batch
+-- of documents in one transaction.
+CREATE OR REPLACE PROCEDURE lexis_nexis_parse_document(input_xml XML, file_name TEXT, subset_sp TEXT DEFAULT '')
+  LANGUAGE plpgsql AS $block$
+BEGIN
+  IF coalesce(subset_sp, '') = '' THEN -- Execute all parsing SPs
+    CALL lexis_nexis_parse_patents(input_xml);
+    CALL lexis_nexis_parse_patent_titles(input_xml);
+    CALL lexis_nexis_parse_legal_data(input_xml);
+    CALL lexis_nexis_parse_abstracts(input_xml);
+    CALL lexis_nexis_parse_nonpatent_citations(input_xml);
+    CALL lexis_nexis_parse_examiners(input_xml);
+    CALL lexis_nexis_parse_inventors(input_xml);
+    CALL lexis_nexis_applicants_data(input_xml);
+    CALL lexis_nexis_parse_patent_priority_claims(input_xml);
+    CALL lexis_nexis_parse_related_documents(input_xml);
+    CALL lexis_nexis_patent_citations_data(input_xml);
+    CALL lexis_nexis_patent_application_reference_data(input_xml);
+    CALL lexis_nexis_parse_patent_families(input_xml);
+    CALL lexis_nexis_parse_patents_family_link(input_xml);
+  ELSE -- Execute only the selected SP
+  -- Make sure that parent records are present
+    CALL lexis_nexis_parse_patents(input_xml);
+
+    EXECUTE format('CALL %I($1)', subset_sp) USING input_xml;
+  END IF;
+
+  IF file_name = 'US' THEN
+    CALL lexis_nexis_parse_us_agents(input_xml);
+  ELSE
+    CALL lexis_nexis_parse_ep_agents(input_xml);
+  END IF;
+END; $block$;
@@ -10,6 +10,7 @@ SET search_path = :schema;
 
 \include_relative Procedures/lexis_nexis_applicants_data.sql
 \include_relative Procedures/lexis_nexis_parse_abstracts.sql
+\include_relative Procedures/lexis_nexis_parse_document.sql
 \include_relative Procedures/lexis_nexis_parse_ep_agents.sql
 \include_relative Procedures/lexis_nexis_parse_examiners.sql
 \include_relative Procedures/lexis_nexis_parse_inventors.sql
@@ -22,33 +22,9 @@ DO $block$
     SELECT xmlparse(DOCUMENT pg_read_file(current_setting('script.xml_file')))
       INTO lexis_nexis_doc_xml;
 
-    IF current_setting('script.subset_sp')='' THEN -- Execute all parsing SPs
-      CALL lexis_nexis_parse_patents(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_patent_titles(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_legal_data(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_abstracts(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_nonpatent_citations(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_examiners(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_inventors(lexis_nexis_doc_xml);
-      CALL lexis_nexis_applicants_data(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_patent_priority_claims(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_related_documents(lexis_nexis_doc_xml); 
-      CALL lexis_nexis_patent_citations_data(lexis_nexis_doc_xml);
-      CALL lexis_nexis_patent_application_reference_data(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_patent_families(lexis_nexis_doc_xml);
-      CALL lexis_nexis_parse_patents_family_link(lexis_nexis_doc_xml);
-
-    ELSE -- Execute only the selected SP
-      -- Make sure that parent records are present
-      CALL lexis_nexis_parse_patents(lexis_nexis_doc_xml);
-      EXECUTE format('CALL %I($1)',current_setting('script.subset_sp')) using lexis_nexis_doc_xml;
-    END IF;
-
-    IF current_setting('script.file_name')='US' THEN
-      CALL lexis_nexis_parse_us_agents(lexis_nexis_doc_xml);
-    ELSE
-      CALL lexis_nexis_parse_ep_agents(lexis_nexis_doc_xml);
-    END IF;
+    -- See DDL/Procedures/lexis_nexis_parse_document.sql
+    CALL lexis_nexis_parse_document(lexis_nexis_doc_xml, current_setting('script.file_name'),
+                                    current_setting('script.subset_sp'));
 
   EXCEPTION
     WHEN OTHERS THEN --
@@ -0,0 +1,280 @@
+"""
+Title: LexisNexis ZIP Processor
+Date: 10/16/2026
+
+Load zipped LexisNexis patent XMLs downloaded via the IPDD API: the Python counterpart of the per-file psql loop of
+LexisNexis_update.sh. XML members are streamed straight from each ZIP without extracting it. Documents are parsed by
+`lexis_nexis_parse_document` (see Postgres/DDL/Procedures) over a pool of persistent connections, a batch of documents
+per worker task and per transaction, instead of one psql process, connection and `pg_read_file` per document.
+Every document runs under its own savepoint: a failed document is rolled back alone and moved to the reject directory.
+
+Usage: process_ln_zips.py [-w work_dir] [-p processed_log] [-s subset_SP] [-e max_errors] [-f failed_files_dir]
+                          [-n parallel_jobs] [-b batch_size] [-v] [-v] [ZIP ...]
+
+    ZIP                 ZIP files relative to `{work_dir}` to process in this order, `API_downloads/*.zip` by default
+    -w work_dir         directory where IPDD data is stored, `.` by default
+    -p processed_log    record file for successfully completed data ZIPs, `processed.log` by default
+                        skip already processed ZIPs
+    -s subset_SP        parse a subset of data via the specified subset parsing Stored Procedure (SP)
+    -e max_errors       stop when the error number reaches this threshold, 101 by default. 0 = do not stop.
+    -f failed_files_dir write failed XML files and the error log to `{failed_files_dir}/{ZIP_name}/`,
+                        `failed` by default
+    -n parallel_jobs    number of parallel workers and persistent connections, # of CPU cores by default
+    -b batch_size       number of documents per worker task and transaction, 100 by default
+    -v                  verbose output: print processed XML files
+    -v -v               extra-verbose output: print per document timings as well
+
+A US or EP patent is identified by its XML file name, as in LexisNexis_update.sh.
+To stop process gracefully after the current ZIP is processed, create a `{work_dir}/.stop` signal file.
+Connection parameters come from the PGHOST/PGDATABASE/PGUSER environment variables.
+
+Exit status: 0 on success, 1 if an error occurred, 255 when the maximum number of errors is reached / on a fatal failure.
+"""
+
+import argparse
+import codecs
+import concurrent.futures as cf
+import datetime
+import glob
+import os
+import sys
+import threading
+import time
+import zipfile
+import psycopg2
+import psycopg2.pool
+
+FATAL_FAILURE_CODE = 255
+STOP_FILE = ".stop"
+ERROR_LOG = "error.log"
+
+
+def file_name_type(member):
+    """
+    Output: (str) 'US' for US patent XMLs, 'EP' otherwise
+    """
+    return 'US' if 'US' in os.path.basename(member) else 'EP'
+
+
+class LexisNexisLoader:
+    """
+    Parse the XML members of LexisNexis ZIPs over a pool of persistent connections.
+    The parsing SPs do not COMMIT, so every batch is one transaction with a savepoint per document.
+    """
+
+    def __init__(self, jobs, batch_size, subset_sp, verbosity):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(jobs, jobs, "")
+        self.executor = cf.ThreadPoolExecutor(max_workers=jobs)
+        self.batch_size = batch_size
+        self.subset_sp = subset_sp or ''
+        self.verbosity = verbosity
+        self.halt = threading.Event()
+        self.lock = threading.Lock()
+        self.max_errors = 0
+        self.failures = 0
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.closeall()
+
+    def parse_batch(self, archive, members, failed_dir):
+        """
+        Parse a batch of documents in one transaction over one pooled connection.
+        If the connection is lost, the failing document is rejected and the rest of the batch is redone on a new one.
+
+        Output: (successes, failures) counts. Batches stop early once the error threshold is reached.
+        """
+        start_time = time.time()
+        failures = 0
+        pending = list(members)
+        conn = self.pool.getconn()
+        try:
+            while pending:
+                parsed = []
+                lost_at = None
+                for position, member in enumerate(pending):
+                    if self.halt.is_set():
+                        break
+                    if self.verbosity:
+                        print("Processing {} ...".format(member))
+                    document_start_time = time.time()
+                    xml = archive.read(member)
+                    # A BOM is present in some shared files and breaks the Postgres XML parser
+                    if xml.startswith(codecs.BOM_UTF8):
+                        xml = xml[len(codecs.BOM_UTF8):]
+                    try:
+                        with conn.cursor() as curs:
+                            curs.execute("SAVEPOINT document")
+                            curs.execute("CALL lexis_nexis_parse_document(xmlparse(DOCUMENT convert_from(%s, 'UTF8')), "
+                                         "%s, %s)", (psycopg2.Binary(xml), file_name_type(member), self.subset_sp))
+                            curs.execute("RELEASE SAVEPOINT document")
+                    except psycopg2.Error as e:
+                        failures += 1
+                        self.record_failure(member, xml, e, failed_dir)
+                        if conn.closed:
+                            lost_at = position
+                            break
+                        with conn.cursor() as curs:
+                            curs.execute("ROLLBACK TO SAVEPOINT document")
+                        continue
+                    parsed.append(member)
+                    if self.verbosity:
+                        print("{}: SUCCESSFULLY PARSED.".format(member))
+                    if self.verbosity > 1:
+                        print("{}: {:.3f} s".format(member, time.time() - document_start_time))
+                if lost_at is None:
+                    conn.commit()
+                    break
+                # Documents parsed so far were rolled back with the lost transaction
+                print("Connection lost at {}: retrying the rest of the batch".format(pending[lost_at]))
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+                pending = parsed + pending[lost_at + 1:]
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=conn.closed)
+
+        successes = len(parsed)
+        delta = time.time() - start_time
+        print("Batch {} .. {}: {} parsed, {} failed in {:.1f} s ({:.1f} docs/s)".format(
+            os.path.basename(members[0]), os.path.basename(members[-1]), successes, failures, delta,
+            (successes + failures) / max(delta, 1e-9)))
+        return successes, failures
+
+    def record_failure(self, member, xml, error, failed_dir):
+        """
+        Write the failed XML and its error into `failed_dir` and halt once the error threshold is reached.
+        """
+        print("{}: FAILED DURING PARSING.".format(member))
+        with self.lock:
+            # Let running documents finish, but do not start new ones: `parallel --halt soon,fail=max_errors`
+            self.failures += 1
+            if 0 < self.max_errors <= self.failures:
+                self.halt.set()
+            os.makedirs(failed_dir, exist_ok=True)
+            with open(os.path.join(failed_dir, os.path.basename(member)), 'wb') as failed_xml:
+                failed_xml.write(xml)
+            with open(os.path.join(failed_dir, ERROR_LOG), 'a') as error_log:
+                error_log.write("Processing of {} FAILED\n{}\n".format(member, error))
+
+    def load_zip(self, zip_path, failed_dir, max_errors, prior_failures):
+        """
+        Parse all XML members of a ZIP.
+
+        Output: (processed, failures) counts for the ZIP
+        """
+        processed = failures = 0
+        self.halt.clear()
+        self.max_errors = max_errors
+        self.failures = prior_failures
+        with zipfile.ZipFile(zip_path) as archive:
+            members = [info.filename for info in archive.infolist() if not info.is_dir() and info.filename.endswith('.xml')]
+            futures = [self.executor.submit(self.parse_batch, archive, members[offset:offset + self.batch_size],
+                                            failed_dir) for offset in range(0, len(members), self.batch_size)]
+            for future in cf.as_completed(futures):
+                successes, batch_failures = future.result()
+                processed += successes + batch_failures
+                failures += batch_failures
+        return processed, failures
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='''
+     Load zipped LexisNexis XMLs downloaded via the IPDD API into the LexisNexis tables.
+    ''', formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument('zips', nargs='*', help='ZIP files relative to work_dir, `API_downloads/*.zip` by default')
+    arg_parser.add_argument('-w', dest='work_dir', default='.', help='directory where IPDD data is stored')
+    arg_parser.add_argument('-p', dest='processed_log', default='processed.log',
+                            help='record file for successfully completed data ZIPs')
+    arg_parser.add_argument('-s', dest='subset_sp', help='parse a subset of data via the specified subset parsing SP')
+    arg_parser.add_argument('-e', dest='max_errors', type=int, default=101,
+                            help='stop when the error number reaches this threshold, 101 by default')
+    arg_parser.add_argument('-f', dest='failed_files_dir', default='failed',
+                            help='write failed XML files to `{failed_files_dir}/{ZIP_name}/`')
+    arg_parser.add_argument('-n', dest='jobs', type=int, default=os.cpu_count(),
+                            help='number of parallel workers and connections, # of CPU cores by default')
+    arg_parser.add_argument('-b', dest='batch_size', type=int, default=100,
+                            help='number of documents per worker task and transaction, 100 by default')
+    arg_parser.add_argument('-v', dest='verbosity', action='count', default=0, help='verbose output')
+    args = arg_parser.parse_args()
+
+    os.chdir(args.work_dir)
+    work_dir = os.getcwd()
+    print("\n## Running {} under {}@{} in {} ##".format(' '.join(sys.argv), os.environ.get('USER'), os.uname()[1],
+                                                       work_dir))
+    zips = args.zips or sorted(glob.glob(os.path.join('API_downloads', '*.zip')))
+
+    already_processed_zips = set()
+    if os.path.exists(args.processed_log):
+        with open(args.processed_log) as processed_log:
+            already_processed_zips = {line.rstrip('\n') for line in processed_log}
+
+    total_failures = total_processed_xmls = elapsed = 0
+    process_start_time = time.time()
+    loader = LexisNexisLoader(args.jobs, args.batch_size, args.subset_sp, args.verbosity)
+    try:
+        for i, zip_path in enumerate(zips, start=1):
+            start_time = time.time()
+            if zip_path in already_processed_zips:
+                print("Skipping file {} ( zip file #{} out of {} ). It is already marked as completed.".format(
+                    zip_path, i, len(zips)))
+                continue
+
+            print("\nProcessing {} ( zip file #{} out of {} )...".format(zip_path, i, len(zips)))
+            if not zipfile.is_zipfile(zip_path):
+                print("Corrupted ZIP: {}".format(os.path.abspath(zip_path)))
+                sys.exit(FATAL_FAILURE_CODE)
+            zip_name = os.path.basename(zip_path)
+            failed_dir = os.path.join(args.failed_files_dir, zip_name[:-len('.zip')])
+
+            processed_xmls, failures = loader.load_zip(zip_path, failed_dir, args.max_errors, total_failures)
+            total_processed_xmls += processed_xmls - failures
+            total_failures += failures
+            print("SUMMARY FOR {}:".format(zip_path))
+            print("SUCCESSFULLY PARSED {} XML FILES".format(processed_xmls - failures))
+            if failures == 0:
+                print("ALL IS WELL")
+            else:
+                print("FAILED PARSING {} XML FILES".format(failures))
+
+            if args.max_errors > 0 and total_failures >= args.max_errors:
+                print("Error(s) occurred during processing of {}.\n=====".format(work_dir))
+                with open(os.path.join(failed_dir, ERROR_LOG)) as error_log:
+                    for line, text in zip(range(100), error_log):
+                        print(text, end='')
+                print("[skipped ?]\n=====")
+                sys.exit(FATAL_FAILURE_CODE)
+
+            if failures == 0:
+                with open(args.processed_log, 'a') as processed_log:
+                    processed_log.write(zip_path + '\n')
+
+            if os.path.exists(STOP_FILE):
+                print("\nFound the stop signal file. Gracefully stopping...")
+                break
+
+            delta = time.time() - start_time
+            print("{}: Done with {} file in {} at {:.1f} docs/s".format(
+                datetime.datetime.now(), zip_path, datetime.timedelta(seconds=int(delta)),
+                processed_xmls / max(delta, 1e-9)))
+            if i < len(zips):
+                elapsed += delta
+                eta = process_start_time + len(zips) * elapsed / i
+                print("ETA for job completion: {}".format(datetime.datetime.fromtimestamp(eta)))
+    finally:
+        loader.close()
+
+    print("\nUPDATE SUMMARY:")
+    print("SUCCESSFULLY PARSED {} XML FILES".format(total_processed_xmls))
+    if total_failures == 0:
+        print("ALL IS WELL")
+    else:
+        print("FAILED PARSING {} XML FILES".format(total_failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
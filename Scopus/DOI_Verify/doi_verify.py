@@ -1,7 +1,7 @@
 #!/usr/bin/python3
 
 import pandas as pd
-import os
+from scp_zip_index import ScpZipIndex
 
 """
 The following script is to be used after extracting example scp IDs 
@@ -15,15 +15,14 @@ pubmed_id_list = doi_examples.pub_id.tolist()
 scp_list = doi_examples.pub_scp.tolist()
 year_list = doi_examples.pub_year.tolist()
 
-scp_list_padded = [str(i).zfill(10) for i in scp_list] # ---> Scopus scps are zero padded to be 10 characters long
+# Directly find the corresponding files from the baseline dataset via the scp -> ZIP member index,
+# unzip them, and store them into home directory. The index is only updated for new or changed ZIPs.
 
-
-# Directly find the corresponding files from the baseline dataset,
-# unzip them, and store them into home directory
-
-for i in range(len(doi_examples)):
-    text = "find-in-zips.sh -u /home/shreya/doi_examples_tmp /erniedev_data5/Scopus/" + str(year_list[i]) + "/*.zip '2-s2.0-" + scp_list_padded[i] + ".xml'"
-    os.system(text)
+scp_index = ScpZipIndex('/home/shreya/tmp_doi/scp_zip_index.sqlite')
+scp_index.update(['/erniedev_data5/Scopus/' + str(year) for year in sorted(set(year_list))])
+not_found = scp_index.extract(scp_list, '/home/shreya/doi_examples_tmp')
+scp_index.close()
+print(len(not_found), "scps are not found in the ZIPs")
 
 
 
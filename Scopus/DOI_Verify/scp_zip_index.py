@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+"""
+Persistent index of Scopus publication XMLs in ZIPs: scp -> (ZIP path, member name).
+
+The index is a sqlite file. ZIP central directories are read in parallel processes the first time, and afterwards
+only for new or changed (size/mtime) ZIPs, so an index over the whole archive tree is kept current incrementally.
+Lookups and extraction take thousands of scps at once and open every ZIP only once.
+
+Usage:
+    scp_zip_index.py [-i index_file] [-n jobs] update {zip_or_directory} [...]
+    scp_zip_index.py [-i index_file] lookup {scp} [...]
+    scp_zip_index.py [-i index_file] extract {output_directory} {scp} [...]
+"""
+
+import argparse
+import concurrent.futures as cf
+import os
+import re
+import shutil
+import sqlite3
+import zipfile
+
+# Scopus publication XMLs are named `2-s2.0-{zero padded scp}.xml`
+MEMBER_PATTERN = re.compile(r'2-s2\.0-(\d+)\.xml$')
+SQLITE_MAX_VARIABLES = 500
+
+
+def read_zip_members(zip_path):
+    """
+    Output: list of (scp, member name) of the publication XMLs in a ZIP's central directory
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        return [(int(match.group(1)), name) for name in archive.namelist()
+                for match in [MEMBER_PATTERN.search(name)] if match]
+
+
+class ScpZipIndex:
+    def __init__(self, index_file):
+        self.conn = sqlite3.connect(index_file)
+        with self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS zips (
+                  zip_path TEXT PRIMARY KEY,
+                  size INTEGER NOT NULL,
+                  mtime REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS members (
+                  scp INTEGER NOT NULL,
+                  zip_path TEXT NOT NULL REFERENCES zips,
+                  member TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS members_scp_i ON members(scp);
+                CREATE INDEX IF NOT EXISTS members_zip_path_i ON members(zip_path);''')
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, paths, jobs=None):
+        """
+        Index new and changed ZIPs among `paths` (ZIP files or directories searched recursively).
+
+        Output: (int) number of (re)indexed ZIPs
+        """
+        zip_paths = []
+        for path in paths:
+            if os.path.isdir(path):
+                zip_paths.extend(os.path.join(dir_path, name) for dir_path, dir_names, file_names in os.walk(path)
+                                 for name in file_names if name.endswith('.zip'))
+            else:
+                zip_paths.append(path)
+        indexed = {zip_path: (size, mtime) for zip_path, size, mtime in self.conn.execute('SELECT * FROM zips')}
+        pending = {}
+        for zip_path in zip_paths:
+            zip_path = os.path.abspath(zip_path)
+            stat = os.stat(zip_path)
+            if indexed.get(zip_path) != (stat.st_size, stat.st_mtime):
+                pending[zip_path] = (stat.st_size, stat.st_mtime)
+
+        with cf.ProcessPoolExecutor(max_workers=jobs) as executor:
+            for zip_path, members in zip(pending, executor.map(read_zip_members, pending)):
+                with self.conn:
+                    self.conn.execute('DELETE FROM members WHERE zip_path = ?', (zip_path,))
+                    self.conn.execute('INSERT OR REPLACE INTO zips VALUES (?, ?, ?)', (zip_path, *pending[zip_path]))
+                    self.conn.executemany('INSERT INTO members VALUES (?, ?, ?)',
+                                          ((scp, zip_path, member) for scp, member in members))
+        return len(pending)
+
+    def lookup(self, scps):
+        """
+        Output: (dict) scp -> list of (ZIP path, member name), for the indexed scps only
+        """
+        locations = {}
+        scps = list({int(scp) for scp in scps})
+        for offset in range(0, len(scps), SQLITE_MAX_VARIABLES):
+            chunk = scps[offset:offset + SQLITE_MAX_VARIABLES]
+            for scp, zip_path, member in self.conn.execute(
+                    'SELECT scp, zip_path, member FROM members WHERE scp IN ({}) ORDER BY zip_path'.format(
+                        ','.join('?' * len(chunk))), chunk):
+                locations.setdefault(scp, []).append((zip_path, member))
+        return locations
+
+    def extract(self, scps, output_dir):
+        """
+        Extract the XMLs of `scps` flatly (with no paths) into `output_dir`, as `find-in-zips.sh -u` does.
+
+        Output: (set) scps which are not in the index
+        """
+        locations = self.lookup(scps)
+        members_by_zip = {}
+        for scp, scp_locations in locations.items():
+            for zip_path, member in scp_locations:
+                members_by_zip.setdefault(zip_path, []).append(member)
+        os.makedirs(output_dir, exist_ok=True)
+        for zip_path, members in members_by_zip.items():
+            with zipfile.ZipFile(zip_path) as archive:
+                for member in members:
+                    with archive.open(member) as source, \
+                            open(os.path.join(output_dir, os.path.basename(member)), 'wb') as target:
+                        shutil.copyfileobj(source, target)
+        return {int(scp) for scp in scps} - set(locations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index Scopus publication XMLs in ZIPs by scp')
+    parser.add_argument('-i', dest='index_file', default='scp_zip_index.sqlite', help='index file')
+    parser.add_argument('-n', dest='jobs', type=int, help='number of parallel ZIP readers, # of CPU cores by default')
+    commands = parser.add_subparsers(dest='command')
+    update_parser = commands.add_parser('update', help='index new and changed ZIPs')
+    update_parser.add_argument('paths', nargs='+', help='ZIP files or directories')
+    lookup_parser = commands.add_parser('lookup', help='print ZIP locations of scps')
+    lookup_parser.add_argument('scps', nargs='+', type=int)
+    extract_parser = commands.add_parser('extract', help='extract XMLs of scps')
+    extract_parser.add_argument('output_dir')
+    extract_parser.add_argument('scps', nargs='+', type=int)
+    args = parser.parse_args()
+
+    index = ScpZipIndex(args.index_file)
+    if args.command == 'update':
+        print('Indexed {} ZIP(s)'.format(index.update(args.paths, args.jobs)))
+    elif args.command == 'lookup':
+        for scp, locations in sorted(index.lookup(args.scps).items()):
+            for zip_path, member in locations:
+                print('{}\t{}\t{}'.format(scp, zip_path, member))
+    elif args.command == 'extract':
+        for scp in sorted(index.extract(args.scps, args.output_dir)):
+            print('Not found: {}'.format(scp))
+    else:
+        parser.print_help()
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
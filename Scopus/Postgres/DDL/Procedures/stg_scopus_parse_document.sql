@@ -0,0 +1,29 @@
+\set ON_ERROR_STOP on
+\set ECHO all
+
+-- DataGrip: start execution from here
+SET TIMEZONE = 'US/Eastern';
+
+-- Stage one Scopus publication XML: all parsing SPs, or only the parent records and the specified subset SP.
+-- Must be CALLed outside of a transaction block: parsing SPs COMMIT.
+CREATE OR REPLACE PROCEDURE stg_scopus_parse_document(scopus_doc_xml XML, pub_zip VARCHAR(100), subset_sp TEXT DEFAULT '')
+  LANGUAGE plpgsql AS $block$
+BEGIN
+  IF coalesce(subset_sp, '') = '' THEN -- Execute all parsing SPs
+    CALL stg_scopus_parse_publication_and_group(scopus_doc_xml, pub_zip);
+    CALL stg_scopus_parse_source_and_conferences(scopus_doc_xml);
+    CALL stg_scopus_parse_pub_details_subjects_and_classes(scopus_doc_xml);
+    CALL stg_scopus_parse_authors_and_affiliations(scopus_doc_xml);
+    CALL stg_scopus_parse_chemical_groups(scopus_doc_xml);
+    CALL stg_scopus_parse_abstracts_and_titles(scopus_doc_xml);
+    CALL stg_scopus_parse_keywords(scopus_doc_xml);
+    CALL stg_scopus_parse_publication_identifiers(scopus_doc_xml);
+    CALL stg_scopus_parse_grants(scopus_doc_xml);
+    CALL stg_scopus_parse_references(scopus_doc_xml);
+  ELSE -- Execute only the selected SP
+  -- Make sure that parent records are present
+    CALL stg_scopus_parse_publication_and_group(scopus_doc_xml, pub_zip);
+
+    EXECUTE format('CALL %I($1)', subset_sp) USING scopus_doc_xml;
+  END IF;
+END; $block$;
@@ -16,4 +16,5 @@ SET search_path = :schema;
 \include_relative Procedures/stg_scopus_parse_publication_and_group.sql
 \include_relative Procedures/stg_scopus_parse_publication_identifiers.sql
 \include_relative Procedures/stg_scopus_parse_references.sql
-\include_relative Procedures/stg_scopus_parse_sources_and_conferences.sql
\ No newline at end of file
+\include_relative Procedures/stg_scopus_parse_sources_and_conferences.sql
+\include_relative Procedures/stg_scopus_parse_document.sql
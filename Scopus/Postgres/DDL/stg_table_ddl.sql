@@ -231,3 +231,16 @@ CREATE TABLE IF NOT EXISTS stg_scopus_grant_acknowledgments (
   grant_text TEXT
 
 );
+
+-- Merged parts of staged data: 'shared' and 'scp % {chunks} = {chunk_no}' publication chunks, and the 'staged' part:
+-- the publication ZIP the staged data comes from. It is kept by truncate_staged_data.sql and cleared after a merge.
+CREATE TABLE IF NOT EXISTS stg_scopus_merge_state (
+  part TEXT,
+  merged_at TIMESTAMP DEFAULT clock_timestamp() NOT NULL,
+  pub_zip TEXT,
+  failures INT,
+  CONSTRAINT stg_scopus_merge_state_pk PRIMARY KEY (part) USING INDEX TABLESPACE index_tbs
+);
+
+ALTER TABLE stg_scopus_merge_state ADD COLUMN IF NOT EXISTS pub_zip TEXT;
+ALTER TABLE stg_scopus_merge_state ADD COLUMN IF NOT EXISTS failures INT;
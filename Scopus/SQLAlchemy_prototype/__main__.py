@@ -12,6 +12,19 @@ import zipfile
 import shutil
 import test_parser as parser
 
+def zip_publications(zip_path, workdir, s_parser):
+    #extract one ZIP into its own directory under workdir and yield its parsed publications
+    new_dir=os.path.join(workdir,os.path.basename(zip_path).replace('.zip',''))
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(new_dir)
+    try:
+        for subdir, dirs, files in os.walk(new_dir):
+            for file in files:
+                if file.find('2-s2')==0:
+                    yield s_parser.parse(os.path.join(subdir,file),[],[],[])
+    finally:
+        shutil.rmtree(new_dir)
+
 def main():
     in_arr = sys.argv
 
@@ -26,43 +39,31 @@ def main():
         raise NameError('error: No working path provided')
     else:
         work = in_arr[in_arr.index('-work') + 1]
+
+    if '-chunk' not in in_arr:
+        chunk_size = 1000
+    else:
+        chunk_size = int(in_arr[in_arr.index('-chunk') + 1])
     
     rootdir = source
     workdir = work
-    
-    pub_authors=[]
-    pub_references=[]
-    pub_addresses=[]
-    pubs=[]
-    authors=[]
-    addresses=[]
-    references=[]
+
+    s_parser=parser.Parser(chunk_size)
+    s_parser.create_schema()
     for subdir, dirs, files in os.walk(rootdir):
         for file in files:
             if file.endswith('zip'):
                 print('processing '+ file)
-                zip_ref = zipfile.ZipFile(os.path.join(rootdir,file), 'r')
-                zip_ref.extractall(os.path.join(workdir,file.replace('.zip','')))
-                new_dir=os.path.join(workdir,file.replace('.zip',''))
-                zip_ref.close()
-                for subdir1, dirs1, files1 in os.walk(workdir):
-                    for file in files1:              
-                        if file.find('2-s2')==0:
-                            s_parser=parser.Parser()
-                            pub=s_parser.parse(os.path.join(subdir1,file),pub_authors,pub_references,pub_addresses)
-                            pubs.append(pub[0].__dict__)
-                            authors.extend(pub[1])
-                            references.extend(pub[2])
-                            addresses.extend(pub[3])
-                            pub_authors=[]
-                            pub_references=[]
-                            pub_addresses=[]
-                shutil.rmtree(new_dir)
-                s_parser.upsert(pubs,authors,addresses,references)
                 pubs=[]
                 authors=[]
                 addresses=[]
-                references=[]      
+                references=[]
+                for pub in zip_publications(os.path.join(subdir,file),workdir,s_parser):
+                    pubs.append(pub[0].__dict__)
+                    authors.extend(pub[1])
+                    references.extend(pub[2])
+                    addresses.extend(pub[3])
+                s_parser.upsert(pubs,authors,addresses,references)
     
 if __name__ == "__main__":
     main()
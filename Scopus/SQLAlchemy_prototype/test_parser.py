@@ -157,40 +157,35 @@ class Parser:
         return(pub,pub_authors,pub_references,pub_addresses)
 
 
-    def upsert(self,pubs,authors,addresses,references):
-        #generate database schema
+    def __init__(self, chunk_size=1000):
+        self.chunk_size=chunk_size
+
+    @staticmethod
+    def create_schema():
+        #generate database schema, once per run
         Base.metadata.create_all(engine)
 
+    def upsert(self,pubs,authors,addresses,references):
         #create a new session
         session = Session()
         #session.execute("SET search_path TO public")
         #session.execute("TRUNCATE TABLE scopus_documents")
 
-        #Load data into database and close the session
-        try:
-            insert_stmt1=insert(scopus_documents).values(pubs)
-            do_nothing_stmt1  = insert_stmt1.on_conflict_do_nothing(index_elements=['scopus_id'])
-            session.execute(do_nothing_stmt1)
-            session.commit()
-            
-            insert_stmt2=insert(scopus_authors).values(authors)
-            do_nothing_stmt2  = insert_stmt2.on_conflict_do_nothing(index_elements=['scopus_id','author_id'])
-            session.execute(do_nothing_stmt2)
-            session.commit()
-            
-            insert_stmt3=insert(scopus_addresses).values(addresses)
-            do_nothing_stmt3  = insert_stmt3.on_conflict_do_nothing(index_elements=['scopus_id','afid'])
-            session.execute(do_nothing_stmt3)
-            session.commit()
-            
-            insert_stmt4=insert(scopus_references).values(references)
-            do_nothing_stmt4  = insert_stmt4.on_conflict_do_nothing(index_elements=['scopus_id','ref_id'])
-            session.execute(do_nothing_stmt4)
-            session.commit()
-        
-        except Exception as e:
-            session.rollback()
-            print(str(e))
-
-
-        
+        #Load data into database in chunks of executemany() rows, a bad row only rolls back its own chunk
+        failed_chunks=0
+        for table,rows,index_elements in [(scopus_documents,pubs,['scopus_id']),
+                                          (scopus_authors,authors,['scopus_id','author_id']),
+                                          (scopus_addresses,addresses,['scopus_id','afid']),
+                                          (scopus_references,references,['scopus_id','ref_id'])]:
+            do_nothing_stmt=insert(table).on_conflict_do_nothing(index_elements=index_elements)
+            for offset in range(0,len(rows),self.chunk_size):
+                try:
+                    session.execute(do_nothing_stmt,rows[offset:offset+self.chunk_size])
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    failed_chunks+=1
+                    print('%s rows %d-%d failed: %s' % (table.__tablename__,offset,
+                                                       min(offset+self.chunk_size,len(rows))-1,str(e)))
+        session.close()
+        return failed_chunks
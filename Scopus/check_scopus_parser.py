@@ -0,0 +1,122 @@
+"""
+Title: Scopus Client-Side Parser Check
+Date: 10/16/2026
+
+Check that scopus_parser.py stages the same rows as the `stg_scopus_parse_*` procedures (see Postgres/DDL/Procedures).
+Every sample publication XML is staged once by `stg_scopus_parse_document` and once by ScopusParser, and the staged rows
+of both paths are compared table by table, as multisets. Generated `ernie_source_id`s differ between the paths, so they
+are compared as their (source_id, issn_main, isbn_main) source key.
+
+The staging tables are truncated before each path: run the check against a scratch database, never during a load.
+
+Usage: check_scopus_parser.py [-m max_diff_rows] xml_or_pub_zip [...]
+
+    xml_or_pub_zip  sample publication XML files, or publication ZIPs whose XML members are all checked
+    -m              number of differing rows printed per table, 10 by default
+
+Connection parameters come from the PGHOST/PGDATABASE/PGUSER environment variables.
+
+Exit status: 0 when both paths staged the same rows for every document, 1 otherwise.
+"""
+
+import argparse
+import collections
+import os
+import sys
+import zipfile
+import psycopg2
+import process_pub_zips
+import scopus_parser
+
+SOURCE_KEYS = """(
+    SELECT ernie_source_id, source_id, issn_main, isbn_main FROM stg_scopus_sources
+     UNION
+    SELECT ernie_source_id, source_id, issn_main, isbn_main FROM scopus_sources
+  )"""
+
+
+def sample_documents(paths):
+    """
+    Output: (name, pub_zip, xml) per sample document
+    """
+    for path in paths:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    if member.endswith('.xml'):
+                        yield member, os.path.basename(path), archive.read(member)
+        else:
+            with open(path, 'rb') as xml_file:
+                yield path, '', xml_file.read()
+
+
+def staged_rows(curs):
+    """
+    Output: (dict) staging table -> Counter of its rows, values as text and `ernie_source_id` as the source key
+    """
+    staged = {}
+    for table, columns in [*scopus_parser.STG_COLUMNS.items(), ('stg_scopus_sources', scopus_parser.SOURCE_COLUMNS)]:
+        values = ["concat_ws(' | ', sk.source_id, sk.issn_main, sk.isbn_main)" if column == 'ernie_source_id' else
+                  't.{}::TEXT'.format(column) for column in columns]
+        join = ' LEFT JOIN {} sk ON sk.ernie_source_id = t.ernie_source_id'.format(SOURCE_KEYS) \
+            if 'ernie_source_id' in columns else ''
+        curs.execute('SELECT {} FROM {} t{};'.format(', '.join(values), table, join))
+        staged[table] = collections.Counter(curs.fetchall())
+    return staged
+
+
+def check_document(procedure_conn, parser_conn, parser, pub_zip, xml):
+    """
+    Stage a document by both paths.
+
+    Output: (dict) table -> (rows only staged by the procedures, rows only staged by the parser), for differing tables
+    """
+    process_pub_zips.run_psql('truncate_staged_data.sql')
+    with procedure_conn.cursor() as curs:
+        curs.execute("CALL stg_scopus_parse_document(xmlparse(DOCUMENT convert_from(%s, 'UTF8')), %s, '')",
+                     (psycopg2.Binary(xml), pub_zip))
+        procedure_rows = staged_rows(curs)
+
+    process_pub_zips.run_psql('truncate_staged_data.sql')
+    scopus_parser.stage_documents(parser_conn, [parser.parse(xml, pub_zip)])
+    with procedure_conn.cursor() as curs:
+        parser_rows = staged_rows(curs)
+
+    return {table: (procedure_rows[table] - parser_rows[table], parser_rows[table] - procedure_rows[table])
+            for table in procedure_rows if procedure_rows[table] != parser_rows[table]}
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Compare the rows staged by the Scopus parsing procedures and by scopus_parser.py')
+    arg_parser.add_argument('samples', nargs='+', help='sample publication XML files or publication ZIPs')
+    arg_parser.add_argument('-m', '--max_diff_rows', type=int, default=10,
+                            help='number of differing rows printed per table, 10 by default')
+    args = arg_parser.parse_args()
+
+    # The parsing SPs COMMIT, so they are CALLed outside of a transaction block
+    procedure_conn = psycopg2.connect("")
+    procedure_conn.autocommit = True
+    parser_conn = psycopg2.connect("")
+    parser = scopus_parser.ScopusParser()
+    documents = mismatches = 0
+    try:
+        for name, pub_zip, xml in sample_documents(args.samples):
+            documents += 1
+            differences = check_document(procedure_conn, parser_conn, parser, pub_zip, xml)
+            if not differences:
+                print("{}: OK".format(name))
+                continue
+            mismatches += 1
+            print("{}: DIFFERENT in {}".format(name, ', '.join(differences)))
+            for table, (procedure_only, parser_only) in differences.items():
+                for marker, rows in [('-', procedure_only), ('+', parser_only)]:
+                    for row in list(rows.elements())[:args.max_diff_rows]:
+                        print("  {} {} {}".format(marker, table, row))
+    finally:
+        process_pub_zips.run_psql('truncate_staged_data.sql')
+        procedure_conn.close()
+        parser_conn.close()
+    print("{} of {} documents staged the same rows by both paths (-: procedures only, +: parser only)".format(
+        documents - mismatches, documents))
+    sys.exit(1 if mismatches else 0)
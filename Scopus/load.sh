@@ -145,7 +145,7 @@ for data_dir in "${SORTED_ARGS[@]}"; do
     echo -e "\n## Directory #$((++i)) out of ${directories} ##"
     echo "Processing ${data_dir} directory ..."
     # shellcheck disable=SC2086
-    "${ABSOLUTE_SCRIPT_DIR}/process_pub_zips.sh" ${MAX_ERRORS_OPTION} \
+    /anaconda3/bin/python "${ABSOLUTE_SCRIPT_DIR}/process_pub_zips.py" ${MAX_ERRORS_OPTION} \
       ${PARALLEL_JOBSLOTS_OPTION} ${SUBSET_OPTION} ${VERBOSE_OPTION} -f "${FAILED_FILES_DIR}" "${data_dir}"
     declare -i result_code=$?
     if ((result_code > 0)); then
@@ -201,7 +201,7 @@ for data_dir in "${SORTED_ARGS[@]}"; do
       echo "Processing ${UPDATE_DIR} directory"
       set +e
       # shellcheck disable=SC2086
-      "${ABSOLUTE_SCRIPT_DIR}/process_pub_zips.sh" -l "${processed_log}" ${REPROCESS_OPTION} ${MAX_ERRORS_OPTION} \
+      /anaconda3/bin/python "${ABSOLUTE_SCRIPT_DIR}/process_pub_zips.py" -l "${processed_log}" ${REPROCESS_OPTION} ${MAX_ERRORS_OPTION} \
         ${PARALLEL_JOBSLOTS_OPTION} ${SUBSET_OPTION} ${VERBOSE_OPTION} -f "${FAILED_FILES_DIR}" "${UPDATE_DIR}"
       declare -i result_code=$?
       set -e
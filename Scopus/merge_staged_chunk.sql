@@ -0,0 +1,212 @@
+\set ON_ERROR_STOP on
+\set ECHO all
+
+\if :{?schema}
+SET search_path = :schema;
+\endif
+
+-- DataGrip: start execution from here
+SET TIMEZONE = 'US/Eastern';
+
+-- Merge staged publication records of one chunk: publications with `scp % :chunks = :chunk_no`.
+-- Staged shared records (merge_staged_shared_data.sql) must be merged first.
+-- The chunk is merged in one transaction and recorded in stg_scopus_merge_state.
+BEGIN;
+
+-- region publications
+DELETE
+  FROM scopus_publications scp USING stg_scopus_publications stg
+ WHERE scp.scp = stg.scp AND stg.scp % :chunks = :chunk_no;
+
+INSERT INTO scopus_publications(scp, sgr, correspondence_person_indexed_name, correspondence_orgs,
+                                correspondence_city,
+                                correspondence_country, correspondence_e_address, pub_type, citation_type,
+                                citation_language, process_stage, state, date_sort, ernie_source_id)
+
+SELECT
+  stg_scopus_publications.scp, max(sgr) AS sgr,
+  max(correspondence_person_indexed_name) AS correspondence_person_indexed_name,
+  max(correspondence_orgs) AS correspondence_orgs, max(correspondence_city) AS correspondence_city,
+  max(correspondence_country) AS correspondence_country, max(correspondence_e_address) AS correspondence_e_address,
+  max(pub_type) AS pub_type, max(citation_type) AS citation_type,
+  max(regexp_replace(citation_language, '([a-z])([A-Z])', '\1,\2', 'g')) AS citation_language,
+  max(process_stage) AS process_stage, max(state) AS state, max(date_sort) AS date_sort, ernie_source_id
+  FROM stg_scopus_publications
+ WHERE scp % :chunks = :chunk_no
+ GROUP BY scp, ernie_source_id
+    ON CONFLICT (scp) DO UPDATE SET --
+      sgr = excluded.sgr,
+      correspondence_person_indexed_name = excluded.correspondence_person_indexed_name,
+      correspondence_orgs = excluded.correspondence_orgs,
+      correspondence_city = excluded.correspondence_city,
+      correspondence_country = excluded.correspondence_country,
+      correspondence_e_address = excluded.correspondence_e_address,
+      pub_type= excluded.pub_type,
+      citation_type = excluded.citation_type,
+      citation_language = excluded.citation_language,
+      ernie_source_id = excluded.ernie_source_id;
+-- endregion
+
+-- region pub details, subjects and classes
+INSERT INTO scopus_source_publication_details(scp, issue, volume, first_page, last_page, publication_year,
+                                              publication_date, indexed_terms, conf_code, conf_name)
+
+SELECT
+  scp, issue, volume, first_page, last_page, publication_year, publication_date, indexed_terms, conf_code, conf_name
+  FROM stg_scopus_source_publication_details
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp) DO UPDATE SET --
+      issue = excluded.issue,
+      volume = excluded.volume,
+      first_page = excluded.first_page,
+      last_page = excluded.last_page,
+      publication_year = excluded.publication_year,
+      publication_date = excluded.publication_date,
+      indexed_terms = excluded.indexed_terms,
+      conf_code = excluded.conf_code,
+      conf_name = excluded.conf_name;
+
+INSERT INTO scopus_subjects
+  (scp, subj_abbr)
+SELECT scp, subj_abbr
+  FROM stg_scopus_subjects
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, subj_abbr) DO NOTHING;
+
+INSERT INTO scopus_subject_keywords
+  (scp, subject)
+SELECT scp, subject
+  FROM stg_scopus_subject_keywords
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, subject) DO NOTHING;
+
+INSERT INTO scopus_classes(scp, class_type, class_code)
+SELECT scp, class_type, class_code
+  FROM stg_scopus_classes
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, class_type, class_code) DO NOTHING;
+-- endregion
+
+-- region authors and affiliations
+INSERT INTO scopus_authors(scp, author_seq, auid, author_indexed_name, author_surname, author_given_name,
+                           author_initials, author_e_address, author_rank)
+SELECT
+  scp, author_seq, auid, author_indexed_name, max(author_surname) AS author_surname,
+  max(author_given_name) AS author_given_name, max(author_initials) AS author_initials,
+  max(author_e_address) AS author_e_address,
+      ROW_NUMBER() OVER (PARTITION BY scp ORDER BY author_seq, author_indexed_name) AS author_rank
+  FROM stg_scopus_authors stg
+ WHERE scp % :chunks = :chunk_no
+ GROUP BY scp, author_seq, auid, author_indexed_name
+    ON CONFLICT (scp, author_seq) DO UPDATE SET --
+      auid = excluded.auid,
+      author_surname = excluded.author_surname,
+      author_given_name = excluded.author_given_name,
+      author_indexed_name = excluded.author_indexed_name,
+      author_initials = excluded.author_initials,
+      author_e_address = excluded.author_e_address,
+      author_rank = excluded.author_rank;
+
+INSERT INTO scopus_affiliations(scp, affiliation_no, afid, dptid, organization, city_group, state, postal_code,
+                                country_code,
+                                country)
+SELECT scp, affiliation_no, afid, dptid, organization, city_group, state, postal_code, country_code, country
+  FROM stg_scopus_affiliations
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, affiliation_no) DO UPDATE SET --
+      afid = excluded.afid,
+      dptid = excluded.dptid,
+      city_group = excluded.city_group,
+      organization = excluded.organization,
+      state = excluded.state,
+      postal_code = excluded.postal_code,
+      country_code = excluded.country_code,
+      country = excluded.country;
+
+INSERT INTO scopus_author_affiliations(scp, author_seq, affiliation_no)
+SELECT scp, stg_scopus_author_affiliations.author_seq, stg_scopus_author_affiliations.affiliation_no
+  FROM stg_scopus_author_affiliations
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, author_seq, affiliation_no) DO NOTHING;
+-- endregion
+
+-- region chemical groups
+INSERT INTO scopus_chemical_groups(scp, chemicals_source, chemical_name, cas_registry_number)
+SELECT DISTINCT scp, chemicals_source, chemical_name, cas_registry_number
+  FROM stg_scopus_chemical_groups
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, chemical_name, cas_registry_number) DO UPDATE --
+      SET chemicals_source = excluded.chemicals_source;
+-- endregion
+
+-- region abstracts and titles
+INSERT INTO scopus_abstracts(scp, abstract_language, abstract_text)
+SELECT scp, abstract_language, abstract_text
+  FROM stg_scopus_abstracts
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, abstract_language) DO UPDATE SET --
+      abstract_text = excluded.abstract_text;
+
+INSERT INTO scopus_titles(scp, language, title)
+  -- SELECT scp, language, max(title) AS title
+SELECT scp, language, title AS title
+  FROM
+    stg_scopus_titles stg
+ WHERE scp % :chunks = :chunk_no
+    --  GROUP BY scp, language
+    ON CONFLICT (scp, language) DO UPDATE SET --
+      title = excluded.title;
+-- endregion
+
+-- region keywords
+INSERT INTO scopus_keywords(scp, keyword)
+SELECT scp, keyword
+  FROM stg_scopus_keywords
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, keyword) DO NOTHING;
+-- endregion
+
+-- region publication identifiers
+INSERT INTO scopus_publication_identifiers(scp, document_id, document_id_type)
+SELECT scp, document_id, document_id_type
+  FROM stg_scopus_publication_identifiers
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp, document_id, document_id_type) DO NOTHING;
+-- endregion
+
+-- region grants
+INSERT INTO scopus_grants(scp, grant_id, grantor_acronym, grantor,
+                          grantor_country_code, grantor_funder_registry_id)
+SELECT
+  scp, grant_id, max(grantor_acronym) AS grantor_acronym, grantor, max(grantor_country_code) AS grantor_country_code,
+  max(grantor_funder_registry_id) AS grantor_funder_registry_id
+  FROM stg_scopus_grants
+ WHERE scp % :chunks = :chunk_no
+ GROUP BY scp, grant_id, grantor
+    ON CONFLICT (scp, grant_id, grantor) DO UPDATE SET --
+      grantor_acronym = excluded.grantor_acronym,
+      grantor_country_code = excluded.grantor_country_code,
+      grantor_funder_registry_id = excluded.grantor_funder_registry_id;
+
+INSERT INTO scopus_grant_acknowledgments(scp, grant_text)
+SELECT scp, grant_text
+  FROM stg_scopus_grant_acknowledgments
+ WHERE scp % :chunks = :chunk_no
+    ON CONFLICT (scp) DO UPDATE SET --
+      grant_text = excluded.grant_text;
+-- endregion
+
+-- region references
+INSERT INTO scopus_references(scp, ref_sgr, citation_text)
+SELECT scp, ref_sgr, max(citation_text) AS citation_text
+  FROM stg_scopus_references
+ WHERE scp % :chunks = :chunk_no
+ GROUP BY scp, ref_sgr
+    ON CONFLICT (scp, ref_sgr) DO UPDATE SET --
+      citation_text = excluded.citation_text;
+-- endregion
+INSERT INTO stg_scopus_merge_state(part)
+VALUES (format('scp %% %s = %s', :chunks, :chunk_no))
+    ON CONFLICT (part) DO UPDATE SET merged_at = excluded.merged_at;
+
+COMMIT;
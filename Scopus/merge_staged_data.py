@@ -0,0 +1,161 @@
+"""
+Title: Scopus Staged Data Merge Driver
+Date: 10/16/2026
+
+Merge staged Scopus data into the Scopus tables in concurrent, resumable parts instead of one long serial session
+(merge_staged_data.sql). Shared records (sources, conferences, publication groups and classifications) are merged first
+by merge_staged_shared_data.sql. Publications are then split into chunks by `scp % chunks` and merged by
+merge_staged_chunk.sql in parallel psql sessions, one transaction per chunk.
+
+Every merged part is recorded in stg_scopus_merge_state in the same transaction. A rerun after an interruption skips
+the merged parts, so it must use the same number of chunks. The merge state is cleared once the merge completes; it is
+not truncated by truncate_staged_data.sql. process_pub_zips.py also records there which publication ZIP is staged
+(the 'staged' part), so that it resumes an interrupted merge of that ZIP instead of staging it again.
+
+Usage: merge_staged_data.py [-n parallel_jobs] [-c chunks]
+
+    -n parallel_jobs  number of concurrent merge sessions, # of CPU cores by default
+    -c chunks         number of publication chunks, 32 by default
+
+Connection parameters come from the PGHOST/PGDATABASE/PGUSER environment variables.
+"""
+
+import argparse
+import concurrent.futures as cf
+import os
+import subprocess
+import sys
+import time
+import psycopg2
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_PART = 'shared'
+STAGED_PART = 'staged'
+DEFAULT_CHUNKS = 32
+
+
+class MergeError(Exception):
+    pass
+
+
+def chunk_part(chunks, chunk_no):
+    """
+    The stg_scopus_merge_state part of a publication chunk, as recorded by merge_staged_chunk.sql
+    """
+    return 'scp % {} = {}'.format(chunks, chunk_no)
+
+
+def run_merge_script(script, variables=None):
+    """
+    Run a merge SQL script via psql.
+
+    Arguments:
+        script: (str) SQL script file name in this directory
+        variables: (dict) psql variables
+
+    Output: (float) elapsed seconds
+    """
+    start_time = time.time()
+    command = ['psql', '-f', os.path.join(SCRIPT_DIR, script)]
+    for name, value in (variables or {}).items():
+        command += ['-v', '{}={}'.format(name, value)]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if result.returncode != 0:
+        raise MergeError("{} {} failed:\n{}".format(script, variables or '', result.stdout))
+    return time.time() - start_time
+
+
+def execute_on_merge_state(statement, args=None):
+    """
+    Output: (list) the result rows of a statement, run in its own transaction
+    """
+    with psycopg2.connect("") as conn:
+        with conn.cursor() as curs:
+            curs.execute(statement, args)
+            rows = curs.fetchall() if curs.description else []
+    conn.close()
+    return rows
+
+
+def merged_parts():
+    return {part for part, in execute_on_merge_state("SELECT part FROM stg_scopus_merge_state WHERE part <> %s",
+                                                     (STAGED_PART,))}
+
+
+def staged_zip():
+    """
+    Output: (str, int) the publication ZIP whose staged data is not completely merged yet and its number of failed
+    publications, or (None, None)
+    """
+    rows = execute_on_merge_state("SELECT pub_zip, failures FROM stg_scopus_merge_state WHERE part = %s",
+                                  (STAGED_PART,))
+    return rows[0] if rows else (None, None)
+
+
+def record_staged_zip(pub_zip, failures):
+    """
+    Start the merge state of a newly staged publication ZIP
+    """
+    execute_on_merge_state('''DELETE FROM stg_scopus_merge_state;
+        INSERT INTO stg_scopus_merge_state(part, pub_zip, failures) VALUES (%s, %s, %s)''',
+                           (STAGED_PART, pub_zip, failures))
+
+
+def clear_merge_state():
+    execute_on_merge_state("DELETE FROM stg_scopus_merge_state")
+
+
+def merge_staged_data(jobs, chunks=DEFAULT_CHUNKS, verbose=True):
+    """
+    Merge all staged data, skipping the parts merged earlier.
+
+    Raises MergeError when a part fails or the merge state was recorded with a different number of chunks.
+    """
+    done = merged_parts()
+    pending = [chunk_no for chunk_no in range(chunks) if chunk_part(chunks, chunk_no) not in done]
+    stale = done - {SHARED_PART} - {chunk_part(chunks, chunk_no) for chunk_no in range(chunks)}
+    if stale:
+        raise MergeError("The interrupted merge used different chunks: {}. Resume it with the same number of chunks."
+                         .format(', '.join(sorted(stale))))
+    if done and verbose:
+        print("Resuming the merge: {} part(s) are already merged".format(len(done)))
+
+    if SHARED_PART not in done:
+        elapsed = run_merge_script('merge_staged_shared_data.sql')
+        if verbose:
+            print("Merged shared records in {:.1f} s".format(elapsed))
+
+    with cf.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_merge_script, 'merge_staged_chunk.sql',
+                                   {'chunks': chunks, 'chunk_no': chunk_no}): chunk_no for chunk_no in pending}
+        try:
+            for future in cf.as_completed(futures):
+                elapsed = future.result()
+                if verbose:
+                    print("Merged {} in {:.1f} s".format(chunk_part(chunks, futures[future]), elapsed))
+        except MergeError:
+            # Merged chunks stay committed: stop starting new ones and let a rerun resume
+            for future in futures:
+                future.cancel()
+            raise
+    clear_merge_state()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='''
+     Merge staged Scopus data into the Scopus tables in concurrent, resumable chunks.
+    ''', formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument('-n', dest='jobs', type=int, default=os.cpu_count(),
+                            help='number of concurrent merge sessions, # of CPU cores by default')
+    arg_parser.add_argument('-c', dest='chunks', type=int, default=DEFAULT_CHUNKS,
+                            help='number of publication chunks, {} by default'.format(DEFAULT_CHUNKS))
+    args = arg_parser.parse_args()
+    try:
+        merge_staged_data(args.jobs, args.chunks)
+    except MergeError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
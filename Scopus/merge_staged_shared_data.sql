@@ -0,0 +1,98 @@
+\set ON_ERROR_STOP on
+\set ECHO all
+
+\if :{?schema}
+SET search_path = :schema;
+\endif
+
+-- DataGrip: start execution from here
+SET TIMEZONE = 'US/Eastern';
+
+-- Merge staged records shared by publications: sources, conferences, publication groups and classifications.
+-- Run before merging publication chunks (merge_staged_chunk.sql) that reference them.
+BEGIN;
+
+-- region sources and conferences
+-- Insert new sources only generated in stg_scopus_sources
+INSERT INTO scopus_sources(ernie_source_id, source_id, issn_main, isbn_main, source_type,
+                           source_title,
+                           coden_code, website, publisher_name, publisher_e_address, pub_date)
+SELECT
+  ernie_source_id, source_id, issn_main, isbn_main, source_type, source_title, coden_code, website, publisher_name,
+  publisher_e_address, pub_date
+  FROM stg_scopus_sources;
+
+INSERT INTO scopus_isbns
+  (ernie_source_id, isbn, isbn_length, isbn_type, isbn_level)
+SELECT ernie_source_id, isbn, max(isbn_length), isbn_type, max(isbn_level)
+  FROM stg_scopus_isbns
+ GROUP BY ernie_source_id, isbn, isbn_type
+    ON CONFLICT (ernie_source_id, isbn, isbn_type) DO UPDATE SET --
+      isbn_length = excluded.isbn_length, --
+      isbn_level = excluded.isbn_level;
+
+INSERT INTO scopus_issns(ernie_source_id, issn, issn_type)
+SELECT ernie_source_id, issn, issn_type
+  FROM stg_scopus_issns
+    ON CONFLICT (ernie_source_id, issn, issn_type) DO NOTHING;
+
+INSERT INTO scopus_conference_events(conf_code, conf_name, conf_address, conf_city, conf_postal_code,
+                                     conf_start_date,
+                                     conf_end_date, conf_number, conf_catalog_number, conf_sponsor)
+SELECT
+  conf_code, conf_name, max(conf_address) AS conf_address, string_agg(DISTINCT conf_city, ',') AS conf_city,
+  max(conf_postal_code) AS conf_postal_code, max(conf_start_date) AS conf_start_date,
+  max(conf_end_date) AS conf_start_date, max(conf_number) AS conf_number,
+  max(conf_catalog_number) AS conf_catalog_number, max(conf_sponsor) AS conf_sponsor
+  FROM stg_scopus_conference_events
+ GROUP BY conf_code, conf_name
+    ON CONFLICT (conf_code, conf_name) DO UPDATE SET --
+      conf_address = excluded.conf_address,
+      conf_city = excluded.conf_city,
+      conf_postal_code = excluded.conf_postal_code,
+      conf_start_date = excluded.conf_start_date,
+      conf_end_date = excluded.conf_end_date,
+      conf_number = excluded.conf_number,
+      conf_catalog_number = excluded.conf_catalog_number,
+      conf_sponsor = excluded.conf_sponsor;
+
+INSERT INTO scopus_conf_proceedings(ernie_source_id, conf_code, conf_name, proc_part_no, proc_page_range,
+                                    proc_page_count)
+SELECT
+  ernie_source_id, conf_code, conf_name, string_agg(DISTINCT proc_part_no, ','), max(proc_page_range),
+  max(proc_page_count)
+  FROM stg_scopus_conf_proceedings
+ GROUP BY ernie_source_id, conf_code, conf_name
+    ON CONFLICT (ernie_source_id, conf_code, conf_name) DO UPDATE SET --
+      proc_part_no = excluded.proc_part_no,
+      proc_page_range = excluded.proc_page_range,
+      proc_page_count = excluded.proc_page_count;
+
+INSERT INTO scopus_conf_editors(ernie_source_id, conf_code, conf_name, indexed_name,
+                                surname, degree, address, organization)
+SELECT DISTINCT ernie_source_id, conf_code, conf_name, indexed_name, surname, degree, address, organization
+  FROM stg_scopus_conf_editors
+    ON CONFLICT (ernie_source_id, conf_code, conf_name, indexed_name) DO UPDATE SET --
+      surname = excluded.surname,
+      degree = excluded.degree,
+      address = excluded.address,
+      organization = excluded.organization;
+-- endregion
+-- region publication groups
+INSERT INTO scopus_publication_groups(sgr, pub_year, pub_zip)
+SELECT sgr, pub_year, pub_zip
+  FROM stg_scopus_publication_groups
+    ON CONFLICT (sgr) DO UPDATE SET pub_year = excluded.pub_year, pub_zip = excluded.pub_zip;
+-- endregion
+
+-- region classification lookup
+INSERT INTO scopus_classification_lookup(class_type, class_code, description)
+SELECT DISTINCT class_type, class_code, description
+  FROM stg_scopus_classification_lookup
+    ON CONFLICT (class_type, class_code) DO UPDATE SET --
+      description = excluded.description;
+INSERT INTO stg_scopus_merge_state(part)
+VALUES ('shared')
+    ON CONFLICT (part) DO UPDATE SET merged_at = excluded.merged_at;
+
+COMMIT;
@@ -1,35 +1,91 @@
 \set ON_ERROR_STOP on
 \set ECHO all
 
+-- Delete the publications listed in `delete.txt` in chunks of `:chunk_size` SCPs, 50,000 by default:
+-- psql -f process_deletes.sql [-v chunk_size=N]
+-- Every chunk is deleted from child tables in dependency order, then from scopus_publications, and COMMITted.
+\if :{?chunk_size}
+\else
+  \set chunk_size 50000
+\endif
+
 -- DataGrip: start execution from here
 SET TIMEZONE = 'US/Eastern';
 
+SELECT set_config('scopus.delete_chunk_size', :'chunk_size', FALSE);
+
 -- Create table holding scps then drop at the end
-CREATE TEMP TABLE del_scps_stg (
+CREATE TEMP TABLE del_scps_raw (
     scp BIGINT NOT NULL
 );
 
---edit the delete file with sed, then perform a client side copy into the table
-\! sed "s/DELETE-2-s2.0-//g" delete.txt > edited_delete.txt
-\copy del_scps_stg FROM 'edited_delete.txt'
-\! rm edited_delete.txt
+-- Client-side copy of the delete file, stripping the `DELETE-2-s2.0-` prefix on the fly
+\copy del_scps_raw FROM PROGRAM 'sed "s/DELETE-2-s2.0-//g" delete.txt'
+
+CREATE TEMP TABLE del_scps_stg (
+    scp BIGINT
+        CONSTRAINT del_scps_stg_pk PRIMARY KEY
+);
+
+INSERT INTO del_scps_stg(scp)
+SELECT DISTINCT scp
+  FROM del_scps_raw;
+
+ANALYZE del_scps_stg;
+
+CREATE TEMP TABLE del_counts (
+    table_name TEXT
+        CONSTRAINT del_counts_pk PRIMARY KEY,
+    deleted_rows BIGINT NOT NULL
+);
 
 \echo 'Following are records that need to be deleted...'
 SELECT *
   FROM del_scps_stg
  LIMIT 100;
 
-\echo ***DELETING FROM TABLE: scopus_publications
+\echo ***DELETING FROM TABLE: scopus_publications AND ITS CHILD TABLES
 DO $block$
-    DECLARE processed BIGINT;
+    DECLARE
+        -- Children before parents: scopus_author_affiliations references scopus_authors and scopus_affiliations
+        del_tables TEXT[] := ARRAY ['scopus_author_affiliations', 'scopus_authors', 'scopus_affiliations',
+            'scopus_source_publication_details', 'scopus_subjects', 'scopus_subject_keywords', 'scopus_classes',
+            'scopus_references', 'scopus_publication_identifiers', 'scopus_abstracts', 'scopus_titles',
+            'scopus_keywords', 'scopus_chemical_groups', 'scopus_grants', 'scopus_grant_acknowledgments',
+            'scopus_publications'];
+        chunk_size INT := current_setting('scopus.delete_chunk_size')::INT;
+        last_scp BIGINT := -1;
+        scps BIGINT[];
+        del_table TEXT;
+        processed BIGINT;
     BEGIN
-        DELETE FROM scopus_publications WHERE scp IN ( SELECT scp FROM del_scps_stg );
-        GET DIAGNOSTICS processed = ROW_COUNT;
+        LOOP
+            scps := ARRAY(SELECT scp FROM del_scps_stg WHERE scp > last_scp ORDER BY scp LIMIT chunk_size);
+            EXIT WHEN cardinality(scps) = 0;
+
+            FOREACH del_table IN ARRAY del_tables LOOP
+                EXECUTE format('DELETE FROM %I WHERE scp = ANY($1)', del_table) USING scps;
+                GET DIAGNOSTICS processed = ROW_COUNT;
+
+                INSERT INTO del_counts(table_name, deleted_rows)
+                VALUES (del_table, processed)
+                    ON CONFLICT (table_name) DO UPDATE SET deleted_rows = del_counts.deleted_rows + excluded.deleted_rows;
+            END LOOP;
+
+            last_scp := scps[cardinality(scps)];
+            COMMIT;
+            RAISE NOTICE 'Deleted a chunk of % SCPs up to %', cardinality(scps), last_scp;
+        END LOOP;
 
         UPDATE update_log_scopus
-        SET num_delete=processed
+        SET num_delete = coalesce((SELECT deleted_rows FROM del_counts WHERE table_name = 'scopus_publications'), 0)
         WHERE num_delete = 0 AND id = (
             SELECT max(id)
             FROM update_log_scopus
         );
-    END $block$;
\ No newline at end of file
+    END $block$;
+
+\echo ***DELETED ROWS PER TABLE
+SELECT table_name, deleted_rows
+  FROM del_counts
+ ORDER BY deleted_rows DESC;
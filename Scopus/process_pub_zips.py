@@ -0,0 +1,386 @@
+"""
+Title: Scopus Publication ZIP Processor
+Date: 10/16/2026
+
+Process a directory of Scopus publication ZIPs: the Python counterpart of process_pub_zips.sh.
+XML members are read straight from each ZIP without extracting it. Documents are staged by `stg_scopus_parse_document`
+(see Postgres/DDL/Procedures) over a pool of persistent connections, a batch of documents per worker task, instead of one
+psql process, connection and `pg_read_binary_file` per document. Staged data is merged once per ZIP by
+merge_staged_data.py in concurrent chunks.
+With `-c`, documents are parsed on this host by scopus_parser.py in parallel processes and staged via COPY instead.
+
+Usage: process_pub_zips.py [-l processed_log] [-rep] [-s subset_SP | -c] [-e max_errors] [-v] [-v] [-n parallel_jobs]
+                           [-b batch_size] [-f failed_pub_dir] [working_dir]
+
+    -l processed_log  log successfully completed publication ZIPs
+                      skip already processed files (unless `-rep`)
+    -rep              reprocess previously successfully completed publication ZIPs
+    -s subset_SP      parse a subset of data via the specified subset parsing Stored Procedure (SP)
+    -c                parse client-side: parse documents in worker processes and COPY staged rows in bulk
+    -e max_errors     stop when the error number reaches this threshold, 01 by default
+    -v                verbose output: print processed XML files
+    -v -v             extra-verbose output: print per document timings as well
+    -n parallel_jobs  number of parallel workers and persistent connections, # of CPU cores by default
+                      also the number of concurrent merge sessions
+    -b batch_size     number of documents per worker task, 100 by default
+    -f failed_pub_dir write failed publication XML files and the error log to `{failed_pub_dir}/{pub_ZIP_name}/`,
+                      `../failed` by default
+
+If a run is interrupted while merging a ZIP, the next run resumes that merge without staging the ZIP again.
+To stop process gracefully after the current ZIP is processed, create a `{working_dir}/.stop` signal file.
+Connection parameters come from the PGHOST/PGDATABASE/PGUSER environment variables.
+
+Exit status: 0 on success, 1 if an error occurred, 255 when the maximum number of errors is reached / on a fatal failure.
+"""
+
+import argparse
+import concurrent.futures as cf
+import datetime
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+import psycopg2
+import psycopg2.pool
+import merge_staged_data
+import scopus_parser
+
+FATAL_FAILURE_CODE = 255
+STOP_FILE = ".stop"
+ERROR_LOG = "error.log"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_psql(script):
+    """
+    Run one of the staging SQL scripts via psql. A failure is fatal, as in process_pub_zips.sh.
+
+    Arguments: script: (str) SQL script file name in this directory
+    """
+    result = subprocess.run(['psql', '-f', os.path.join(SCRIPT_DIR, script)], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, universal_newlines=True)
+    if result.returncode != 0:
+        print("=== psql output ===")
+        print(result.stdout)
+        print("===================")
+        sys.exit(FATAL_FAILURE_CODE)
+
+
+class PubZipStager:
+    """
+    Stage the XML members of publication ZIPs over a pool of persistent autocommit connections.
+    The parsing SPs COMMIT, so every document is CALLed outside of a transaction block.
+    """
+
+    def __init__(self, jobs, batch_size, subset_sp, verbosity):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(jobs, jobs, "")
+        self.executor = cf.ThreadPoolExecutor(max_workers=jobs)
+        self.batch_size = batch_size
+        self.subset_sp = subset_sp or ''
+        self.verbosity = verbosity
+        self.halt = threading.Event()
+        self.lock = threading.Lock()
+        self.max_errors = 0
+        self.failures = 0
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.closeall()
+
+    def stage_batch(self, archive, members, pub_zip, failed_dir):
+        """
+        Stage a batch of documents over one pooled connection.
+
+        Output: (successes, failures) counts. Batches stop early once the error threshold is reached.
+        """
+        successes = failures = 0
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            for member in members:
+                if self.halt.is_set():
+                    break
+                if self.verbosity:
+                    print("Parsing {}".format(member))
+                start_time = time.time()
+                xml = archive.read(member)
+                try:
+                    with conn.cursor() as curs:
+                        curs.execute("CALL stg_scopus_parse_document(xmlparse(DOCUMENT convert_from(%s, 'UTF8')), %s, %s)",
+                                     (psycopg2.Binary(xml), pub_zip, self.subset_sp))
+                except psycopg2.Error as e:
+                    failures += 1
+                    self.record_failure(member, xml, e, failed_dir)
+                    if conn.closed:
+                        self.pool.putconn(conn, close=True)
+                        conn = self.pool.getconn()
+                        conn.autocommit = True
+                    continue
+                successes += 1
+                if self.verbosity:
+                    print("{}: SUCCESSFULLY PARSED.".format(member))
+                if self.verbosity > 1:
+                    print("{}: {:.3f} s".format(member, time.time() - start_time))
+        finally:
+            self.pool.putconn(conn)
+        return successes, failures
+
+    def record_failure(self, member, xml, error, failed_dir):
+        """
+        Write the failed publication XML and its error into `failed_dir` and halt once the error threshold is reached.
+        """
+        print("{} parsing FAILED.\n".format(member))
+        with self.lock:
+            # Let running documents finish, but do not start new ones: `parallel --halt soon,fail=max_errors`
+            self.failures += 1
+            if 0 < self.max_errors <= self.failures:
+                self.halt.set()
+            os.makedirs(failed_dir, exist_ok=True)
+            with open(os.path.join(failed_dir, os.path.basename(member)), 'wb') as failed_xml:
+                failed_xml.write(xml)
+            with open(os.path.join(failed_dir, ERROR_LOG), 'a') as error_log:
+                error_log.write("{} parsing FAILED.\n{}\n".format(member, error))
+
+    def stage_zip(self, pub_zip_path, failed_dir, max_errors, prior_failures):
+        """
+        Stage all XML members of a publication ZIP.
+
+        Output: (processed, failures) counts for the ZIP
+        """
+        pub_zip = os.path.basename(pub_zip_path)
+        processed = failures = 0
+        self.halt.clear()
+        self.max_errors = max_errors
+        self.failures = prior_failures
+        with zipfile.ZipFile(pub_zip_path) as archive:
+            members = [info.filename for info in archive.infolist() if not info.is_dir() and info.filename.endswith('.xml')]
+            futures = [self.executor.submit(self.stage_batch, archive, members[offset:offset + self.batch_size], pub_zip,
+                                            failed_dir) for offset in range(0, len(members), self.batch_size)]
+            for future in cf.as_completed(futures):
+                successes, batch_failures = future.result()
+                processed += successes + batch_failures
+                failures += batch_failures
+        return processed, failures
+
+
+# Per-process state of client-side parsing workers
+WORKER = {}
+
+
+def init_client_side_worker():
+    WORKER['conn'] = psycopg2.connect("")
+    WORKER['parser'] = scopus_parser.ScopusParser()
+    WORKER['archives'] = {}
+
+
+def parse_and_copy_batch(pub_zip_path, members):
+    """
+    Parse a batch of documents and COPY their rows in one transaction. When the batch fails, its documents are retried one
+    by one, so that a bad document only fails itself.
+
+    Output: (successes, [(member, error message)])
+    """
+    conn, parser = WORKER['conn'], WORKER['parser']
+    if pub_zip_path not in WORKER['archives']:
+        for archive in WORKER['archives'].values():
+            archive.close()
+        WORKER['archives'] = {pub_zip_path: zipfile.ZipFile(pub_zip_path)}
+    archive = WORKER['archives'][pub_zip_path]
+    pub_zip = os.path.basename(pub_zip_path)
+
+    documents, failures = [], []
+    for member in members:
+        try:
+            documents.append((member, parser.parse(archive.read(member), pub_zip)))
+        except Exception as e:
+            failures.append((member, repr(e)))
+    try:
+        scopus_parser.stage_documents(conn, [rows for member, rows in documents])
+        return len(documents), failures
+    except psycopg2.Error:
+        conn.rollback()
+    successes = 0
+    for member, rows in documents:
+        try:
+            scopus_parser.stage_documents(conn, [rows])
+            successes += 1
+        except psycopg2.Error as e:
+            conn.rollback()
+            failures.append((member, str(e)))
+    return successes, failures
+
+
+class ClientSideStager(PubZipStager):
+    """
+    Parse publication ZIPs with scopus_parser.py in a pool of worker processes, each with its own connection.
+    """
+
+    def __init__(self, jobs, batch_size, verbosity):
+        self.executor = cf.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=init_client_side_worker)
+        self.batch_size = batch_size
+        self.verbosity = verbosity
+        self.halt = threading.Event()
+        self.lock = threading.Lock()
+        self.max_errors = 0
+        self.failures = 0
+
+    def close(self):
+        self.executor.shutdown()
+
+    def stage_zip(self, pub_zip_path, failed_dir, max_errors, prior_failures):
+        pub_zip = os.path.basename(pub_zip_path)
+        processed = failures = 0
+        self.halt.clear()
+        self.max_errors = max_errors
+        self.failures = prior_failures
+        with zipfile.ZipFile(pub_zip_path) as archive:
+            members = [info.filename for info in archive.infolist() if not info.is_dir() and info.filename.endswith('.xml')]
+            futures = {self.executor.submit(parse_and_copy_batch, os.path.abspath(pub_zip_path),
+                                            members[offset:offset + self.batch_size]): offset
+                       for offset in range(0, len(members), self.batch_size)}
+            for future in cf.as_completed(futures):
+                if future.cancelled():
+                    continue
+                successes, batch_failures = future.result()
+                for member, error in batch_failures:
+                    self.record_failure(member, archive.read(member), error, failed_dir)
+                processed += successes + len(batch_failures)
+                failures += len(batch_failures)
+                if self.verbosity:
+                    print("{}: {} documents SUCCESSFULLY PARSED.".format(pub_zip, successes))
+                if self.halt.is_set():
+                    for pending in futures:
+                        pending.cancel()
+        return processed, failures
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='''
+     Process a directory of Scopus publication ZIPs: stage all XML documents and merge them into the Scopus tables.
+    ''', formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument('working_dir', nargs='?', default='.', help='Directory of publication ZIPs, `.` by default')
+    arg_parser.add_argument('-l', dest='processed_log', help='log successfully completed publication ZIPs')
+    arg_parser.add_argument('-rep', dest='reprocess', action='store_true',
+                            help='reprocess previously successfully completed publication ZIPs')
+    arg_parser.add_argument('-s', dest='subset_sp', help='parse a subset of data via the specified subset parsing SP')
+    arg_parser.add_argument('-c', dest='client_side', action='store_true',
+                            help='parse client-side in worker processes and COPY staged rows in bulk')
+    arg_parser.add_argument('-e', dest='max_errors', type=int, default=1,
+                            help='stop when the error number reaches this threshold, 01 by default')
+    arg_parser.add_argument('-v', dest='verbosity', action='count', default=0, help='verbose output')
+    arg_parser.add_argument('-n', dest='jobs', type=int, default=os.cpu_count(),
+                            help='number of parallel workers and connections, # of CPU cores by default')
+    arg_parser.add_argument('-b', dest='batch_size', type=int, default=100,
+                            help='number of documents per worker task, 100 by default')
+    arg_parser.add_argument('-f', dest='failed_files_dir', default='../failed',
+                            help='write failed publication XML files to `{failed_pub_dir}/{pub_ZIP_name}/`')
+    args = arg_parser.parse_args()
+    if args.client_side and args.subset_sp:
+        arg_parser.error('subset parsing SPs are not supported by client-side parsing')
+
+    os.chdir(args.working_dir)
+    working_dir = os.getcwd()
+    print("\n## Running {} under {}@{} in {} ##".format(' '.join(sys.argv), os.environ.get('USER'), os.uname()[1],
+                                                       working_dir))
+
+    already_processed_zips = set()
+    if args.processed_log and os.path.exists(args.processed_log):
+        with open(args.processed_log) as processed_log:
+            already_processed_zips = {line.rstrip('\n') for line in processed_log}
+
+    pub_zips = sorted(name for name in os.listdir('.') if name.endswith('.zip'))
+    total_failures = total_processed_pubs = elapsed = 0
+    process_start_time = time.time()
+    if args.client_side:
+        stager = ClientSideStager(args.jobs, args.batch_size, args.verbosity)
+    else:
+        stager = PubZipStager(args.jobs, args.batch_size, args.subset_sp, args.verbosity)
+    try:
+        for i, pub_zip in enumerate(pub_zips, start=1):
+            start_time = time.time()
+            already_processed = pub_zip in already_processed_zips
+            if already_processed and not args.reprocess:
+                print("Skipping publication ZIP {} (#{} out of {}).\nIt is already marked as completed.".format(
+                    pub_zip, i, len(pub_zips)))
+                continue
+
+            print("\nProcessing {} (publication ZIP #{} out of {})".format(pub_zip, i, len(pub_zips)))
+            if not zipfile.is_zipfile(pub_zip):
+                print("Corrupted ZIP: {}".format(os.path.join(working_dir, pub_zip)))
+                sys.exit(FATAL_FAILURE_CODE)
+            failed_dir = os.path.join(args.failed_files_dir, pub_zip)
+
+            staged_pub_zip, staged_failures = merge_staged_data.staged_zip()
+            if staged_pub_zip == pub_zip:
+                # The staged data of this ZIP was partially merged by an interrupted run
+                print("Resuming the interrupted merge of {}".format(pub_zip))
+                processed_pubs, failures = 0, staged_failures
+            else:
+                print("Truncating staged data")
+                merge_staged_data.clear_merge_state()
+                run_psql('truncate_staged_data.sql')
+                print("Truncated.")
+
+                print("Parsing ...")
+                processed_pubs, failures = stager.stage_zip(pub_zip, failed_dir, args.max_errors, total_failures)
+                print("Parsed {} publications".format(processed_pubs))
+                if processed_pubs == 0:
+                    print("Unexpected PROBLEM")
+                    sys.exit(FATAL_FAILURE_CODE)
+                total_processed_pubs += processed_pubs
+                total_failures += failures
+                if failures == 0:
+                    print("OK")
+                elif failures == 1:
+                    print("1 publication FAILED PARSING")
+                else:
+                    print("{} publications FAILED PARSING".format(failures))
+
+                if args.max_errors > 0 and total_failures >= args.max_errors:
+                    print("Error(s) occurred during processing of {}.\n=====".format(working_dir))
+                    with open(os.path.join(failed_dir, ERROR_LOG)) as error_log:
+                        for line, text in zip(range(100), error_log):
+                            print(text, end='')
+                    print("[skipped ?]\n=====")
+                    sys.exit(FATAL_FAILURE_CODE)
+                merge_staged_data.record_staged_zip(pub_zip, failures)
+
+            print("Merging staged data into Scopus tables")
+            try:
+                merge_staged_data.merge_staged_data(args.jobs, verbose=args.verbosity > 0)
+            except merge_staged_data.MergeError as e:
+                print(e)
+                sys.exit(FATAL_FAILURE_CODE)
+
+            if args.processed_log and not already_processed and failures == 0:
+                with open(args.processed_log, 'a') as processed_log:
+                    processed_log.write(pub_zip + '\n')
+
+            if os.path.exists(STOP_FILE):
+                print("\nFound the stop signal file. Gracefully stopping...")
+                break
+
+            delta = time.time() - start_time
+            print("Done with {} publication ZIP in {} at {:.1f} pubs/min.".format(
+                pub_zip, datetime.timedelta(seconds=int(delta)), processed_pubs * 60 / max(delta, 1e-9)))
+            if i < len(pub_zips):
+                elapsed += delta
+                eta = process_start_time + len(pub_zips) * elapsed / i
+                print("ETA for completion of the current directory: {}".format(datetime.datetime.fromtimestamp(eta)))
+    finally:
+        stager.close()
+
+    print("\nDIRECTORY SUMMARY:")
+    print("Total publications: {}".format(total_processed_pubs))
+    if total_failures == 0:
+        print("ALL IS WELL")
+    else:
+        print("{} publications FAILED PARSING".format(total_failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-#Parse test/csv files for DOI's
+#Parse pdf/txt/csv files (or a directory of them) for DOI's
 #This works on scopus data
+#DOI's not found in scopus are resolved through a local sqlite cache, then by a rate-limited concurrent pool of
+#content negotiation requests (crossref by default, `-u` points it to another server e.g. a local stub)
+#usage: scopus_doi_parser.py file_or_directory [-c cache_file] [-j jobs] [-r requests_per_second] [-u resolver_url]
 
 import time,os
 import psycopg2
@@ -13,29 +16,20 @@ import PyPDF2
 from habanero import cn
 import csv,json
 import requests
-
-#start time
-start_time=time.time()
-
-#Input file
-file_name=sys.argv[1]
-base_name=os.path.dirname(file_name)
+import sqlite3
+import threading
+import concurrent.futures as cf
 
 #regex for doi's
 # doiRegex=re.compile(r'10\.\w*/\w*')
 doiRegex=re.compile(r'(10[.][0-9]{4,}(?:[.][0-9]+)*/(?:(?!["&\'<>])\S)+)')
-#List of doi
-doi_list=[]
-final_result=[]
-wos_doi=[]
-crossref_doi=[]
 
 #Parse pdf files and look for doi
 
 
 #extrat doi's from pdf files
 def pdf_doi(file_name):
-    global doiRegex,doi_list
+    doi_list=[]
     fileObject = open(file_name,'rb')
     pdfObject=PyPDF2.PdfFileReader(fileObject)
     for i in range(pdfObject.numPages):
@@ -44,10 +38,11 @@ def pdf_doi(file_name):
         if match:
             doi_list.extend([x.strip('.') for x in match])
     fileObject.close()
+    return doi_list
 
 #extract doi's from txt files
 def txt_doi(file_name):
-    global doiRegex,doi_list
+    doi_list=[]
     print('Parsing text file')
     with open(file_name) as f:
         line=f.readline()
@@ -56,10 +51,11 @@ def txt_doi(file_name):
             if match:
                 doi_list.extend([x.strip('.') for x in match])
             line=f.readline()
+    return doi_list
 
 #extract doi's from csv files
 def csv_doi(file_name):
-    global doiRegex,doi_list
+    doi_list=[]
     fileObject=open(file_name,'r')
     csvObject=csv.reader(fileObject)
     for row in csvObject:
@@ -68,85 +64,203 @@ def csv_doi(file_name):
         if match:
             doi_list.extend([x.strip('.') for x in match])
     fileObject.close()
+    return doi_list
 
 
 #determine file format
-file_type=file_name.split('.')
-if file_type[-1] == 'pdf':
-    pdf_doi(file_name)
-    #Call pdf method
-elif file_type[-1] == 'csv':
-    csv_doi(file_name)
-    #Call csv method
-else:
-    txt_doi(file_name)
-    #Call txt method  
-
-
-#Final list of doi's
-print('Doi\'s collected')
-for i in set(doi_list):
-    print(i)
-
-
-postgres_conn=psycopg2.connect("")
-#obtain records from crossref
-def crossref_publications(doi_missed):
-    global final_result
-    for i in set(doi_missed):
+def file_doi(file_name):
+    file_type=file_name.split('.')
+    if file_type[-1] == 'pdf':
+        return pdf_doi(file_name)
+        #Call pdf method
+    elif file_type[-1] == 'csv':
+        return csv_doi(file_name)
+        #Call csv method
+    else:
+        return txt_doi(file_name)
+        #Call txt method
+
+
+#extract doi's from a file, or from all files of a directory: PDF parsing fans out across processes
+def collect_doi(path,jobs):
+    if not os.path.isdir(path):
+        return file_doi(path)
+    file_names=sorted(os.path.join(path,name) for name in os.listdir(path) if os.path.isfile(os.path.join(path,name)))
+    doi_list=[]
+    with cf.ProcessPoolExecutor(max_workers=jobs) as executor:
+        for file_name,dois in zip(file_names,executor.map(file_doi,file_names)):
+            print('Parsed',file_name)
+            doi_list.extend(dois)
+    return doi_list
+
+
+#space out requests to at most `rate` per second across all threads
+class RateLimiter:
+    def __init__(self,rate):
+        self.interval=1.0/rate if rate else 0
+        self.next_time=time.time()
+        self.lock=threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now=time.time()
+            delay=self.next_time-now
+            self.next_time=max(now,self.next_time)+self.interval
+        if delay>0:
+            time.sleep(delay)
+
+
+#resolve a doi to [title, year, doi] via content negotiation, None if the doi is not found
+class CrossrefBackend:
+    def __init__(self,url=None):
+        self.url=url
+
+    def resolve(self,doi):
         try:
-            crossrefObject=cn.content_negotiation(ids = i,format='citeproc-json')
-        # print('Calling ',i)
-            data=json.loads(crossrefObject)
-            if 'published-print' in data.keys():
-                final_result.append(['crossref',data['title'],data['published-print']['date-parts'][0][0],data['DOI']])
-            else:
-                final_result.append(['crossref',data['title'],data['published-online']['date-parts'][0][0],data['DOI']])
+            kwargs={'url':self.url} if self.url else {}
+            crossrefObject=cn.content_negotiation(ids=doi,format='citeproc-json',**kwargs)
         except requests.exceptions.HTTPError as error:
+            #only a 404 means not found: rate limiting (429) and server errors are transient and re-raised uncached
+            if error.response is None or error.response.status_code!=404:
+                raise
             print('DOI not found ',error)
-            crossref_doi.append(i)
+            return None
+        data=json.loads(crossrefObject)
+        if 'published-print' in data.keys():
+            return [data['title'],data['published-print']['date-parts'][0][0],data['DOI']]
+        else:
+            return [data['title'],data['published-online']['date-parts'][0][0],data['DOI']]
+
+
+#DOI resolution: persistent sqlite cache in front of a rate-limited concurrent pool of backend requests
+class DoiResolver:
+    def __init__(self,cache_file,backend,jobs=8,rate=10):
+        self.cache=sqlite3.connect(cache_file)
+        self.cache.execute('''CREATE TABLE IF NOT EXISTS doi_cache (
+            doi TEXT PRIMARY KEY, found INTEGER NOT NULL, title TEXT, publication_year INTEGER, resolved_doi TEXT,
+            cached_at REAL NOT NULL)''')
+        self.backend=backend
+        self.jobs=jobs
+        self.limiter=RateLimiter(rate)
+
+    def cached(self,dois):
+        results={}
+        dois=list(dois)
+        #stay under the sqlite host parameter limit
+        for offset in range(0,len(dois),500):
+            chunk=dois[offset:offset+500]
+            for doi,found,title,year,resolved_doi in self.cache.execute(
+                    'SELECT doi, found, title, publication_year, resolved_doi FROM doi_cache WHERE doi IN (%s)'
+                    % ','.join('?'*len(chunk)),chunk):
+                results[doi]=[title,year,resolved_doi] if found else None
+        return results
 
-        
+    def fetch(self,doi):
+        self.limiter.wait()
+        return self.backend.resolve(doi)
 
-def get_publications(conn):
-    global final_result,wos_doi
+    #Output: dict doi -> [title, year, doi] or None for not found doi's. Transient failures are not cached.
+    def resolve(self,dois):
+        results=self.cached(set(dois))
+        misses=sorted(set(dois)-set(results))
+        print('%d doi\'s cached, %d to resolve' % (len(results),len(misses)))
+        resolved=[]
+        with cf.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures={executor.submit(self.fetch,doi):doi for doi in misses}
+            for future in cf.as_completed(futures):
+                doi=futures[future]
+                try:
+                    result=future.result()
+                except (requests.exceptions.RequestException,ValueError,KeyError) as error:
+                    print('DOI resolution failed ',doi,error)
+                    continue
+                results[doi]=result
+                resolved.append((doi,1 if result else 0)+(tuple(result) if result else (None,None,None))+(time.time(),))
+        #write results back in bulk
+        with self.cache:
+            self.cache.executemany('INSERT OR REPLACE INTO doi_cache VALUES (?, ?, ?, ?, ?, ?)',resolved)
+        return results
+
+    def close(self):
+        self.cache.close()
+
+
+def get_publications(conn,doi_list,resolver):
+    final_result=[]
+    crossref_doi=[]
     print('Getting doi details')
     curs=conn.cursor()
-    curs.execute('''SELECT spi.scp, st.title, sspd.publication_year, spi.document_id
-    FROM public.scopus_publication_identifiers spi
-       INNER JOIN public.scopus_titles st ON st.scp = spi.scp
-       INNER JOIN public.scopus_source_publication_details sspd ON sspd.scp = spi.scp
-    AND spi.document_id IN %s and spi.document_id_type=%s AND st.language='English' ''',(tuple(set(doi_list)),'doi'))
-
-    results=curs.fetchall()
-
-    #writing files to csv file
-    for row in results:
-        final_result.append(list(row))
-        wos_doi.append(row[3])
-        # print(list(row))
-
-    #obtaining missed doi's to search in crossref    
-    doi_missed=[x for x in doi_list if x not in set(wos_doi)]
+    doi_set=set(doi_list)
+    wos_doi=set()
+    if doi_set:
+        curs.execute('''SELECT spi.scp, st.title, sspd.publication_year, spi.document_id
+        FROM public.scopus_publication_identifiers spi
+           INNER JOIN public.scopus_titles st ON st.scp = spi.scp
+           INNER JOIN public.scopus_source_publication_details sspd ON sspd.scp = spi.scp
+        AND spi.document_id IN %s and spi.document_id_type=%s AND st.language='English' ''',(tuple(doi_set),'doi'))
+
+        results=curs.fetchall()
+
+        #writing files to csv file
+        for row in results:
+            final_result.append(list(row))
+            wos_doi.add(row[3])
+            # print(list(row))
+
+    #obtaining missed doi's to search in crossref
+    doi_missed=doi_set-wos_doi
     if len(doi_missed) > 0:
-        crossref_publications(doi_missed)
+        for doi,result in resolver.resolve(doi_missed).items():
+            if result:
+                final_result.append(['crossref']+result)
+            else:
+                crossref_doi.append(doi)
     print('No of doi\'s not found in scopus ',len(crossref_doi))
     for i in crossref_doi:
         print(i)
     curs.close()
+    return final_result
+
+
+if __name__ == '__main__':
+    #start time
+    start_time=time.time()
+
+    parser=argparse.ArgumentParser(description='Look up the DOI\'s found in a pdf/txt/csv file or a directory of files')
+    parser.add_argument('file_name',help='input file, or directory of input files')
+    parser.add_argument('-c','--cache',help='sqlite DOI cache file, doi_cache.sqlite next to the input by default')
+    parser.add_argument('-j','--jobs',type=int,default=os.cpu_count(),help='parallel PDF parsers and DOI requests')
+    parser.add_argument('-r','--rate',type=float,default=10,help='max DOI requests per second, 10 by default')
+    parser.add_argument('-u','--url',help='content negotiation server, https://doi.org by default')
+    args=parser.parse_args()
+
+    #Input file
+    file_name=args.file_name
+    base_name=file_name if os.path.isdir(file_name) else os.path.dirname(file_name)
+
+    doi_list=collect_doi(file_name,args.jobs)
+
+    #Final list of doi's
+    print('Doi\'s collected')
+    for i in set(doi_list):
+        print(i)
 
-get_publications(postgres_conn)
+    postgres_conn=psycopg2.connect("")
+    resolver=DoiResolver(args.cache or os.path.join(base_name,'doi_cache.sqlite'),CrossrefBackend(args.url),args.jobs,
+                         args.rate)
+    final_result=get_publications(postgres_conn,doi_list,resolver)
+    resolver.close()
 
-#write results to file
+    #write results to file
 
-fileWriter=open(os.path.join(base_name,'doi_results.csv'),'w')
-csvWriter=csv.writer(fileWriter)
-csvWriter.writerow(['source_id','document_title','publication_year','doi'])
-csvWriter.writerows(final_result)
-fileWriter.close()
+    fileWriter=open(os.path.join(base_name,'doi_results.csv'),'w')
+    csvWriter=csv.writer(fileWriter)
+    csvWriter.writerow(['source_id','document_title','publication_year','doi'])
+    csvWriter.writerows(final_result)
+    fileWriter.close()
 
-print('Results written to file ',os.path.join(base_name,'doi_results.csv'))
+    print('Results written to file ',os.path.join(base_name,'doi_results.csv'))
 
-postgres_conn.close()
+    postgres_conn.close()
 
-print('Total duration ',time.time()-start_time)
\ No newline at end of file
+    print('Total duration ',time.time()-start_time)
@@ -0,0 +1,494 @@
+"""
+Title: Scopus Client-Side Parser
+Date: 10/16/2026
+
+lxml counterpart of the `stg_scopus_parse_*` procedures (Postgres/DDL/Procedures). A Scopus publication XML is parsed on
+the ETL host into rows of the stg_scopus_* staging tables, which are then written to Postgres in bulk via COPY, so that
+parse cost scales out with the number of ETL workers instead of pinning the database CPUs.
+
+Every column is extracted with the XPath of the corresponding procedure and the same grouping, de-duplication and
+coalescing rules, so the staged data matches what the procedures stage. Source ids (`ernie_source_id`) are resolved
+against scopus_sources, and new sources are generated in stg_scopus_sources, once per batch of documents.
+
+Usage:
+    parser = ScopusParser()
+    documents = [parser.parse(xml, pub_zip) for xml in xml_documents]
+    stage_documents(conn, documents)
+"""
+
+import datetime
+import functools
+import io
+import re
+from lxml import etree
+import psycopg2.extras
+
+NAMESPACES = {'ce': 'http://www.elsevier.com/xml/ani/common', 'ait': 'http://www.elsevier.com/xml/ani/ait'}
+ELSEVIER_BIBLIO_DB_DIVISION_CHEMICAL_SRC = 'esbd'
+
+# Staging tables and their columns in COPY order. Tables keyed by `ernie_source_id` are staged once sources are resolved.
+STG_COLUMNS = {
+    'stg_scopus_publication_groups': ['sgr', 'pub_year', 'pub_zip'],
+    'stg_scopus_publications': ['scp', 'sgr', 'correspondence_person_indexed_name', 'correspondence_orgs',
+                                'correspondence_city', 'correspondence_country', 'correspondence_e_address', 'pub_type',
+                                'citation_type', 'citation_language', 'process_stage', 'state', 'ernie_source_id',
+                                'date_sort'],
+    'stg_scopus_isbns': ['ernie_source_id', 'isbn', 'isbn_length', 'isbn_type', 'isbn_level'],
+    'stg_scopus_issns': ['ernie_source_id', 'issn', 'issn_type'],
+    'stg_scopus_conference_events': ['conf_code', 'conf_name', 'conf_address', 'conf_city', 'conf_postal_code',
+                                     'conf_start_date', 'conf_end_date', 'conf_number', 'conf_catalog_number',
+                                     'conf_sponsor'],
+    'stg_scopus_conf_proceedings': ['ernie_source_id', 'conf_code', 'conf_name', 'proc_part_no', 'proc_page_range',
+                                    'proc_page_count'],
+    'stg_scopus_conf_editors': ['ernie_source_id', 'conf_code', 'conf_name', 'indexed_name', 'surname', 'degree',
+                                'address', 'organization'],
+    'stg_scopus_source_publication_details': ['scp', 'issue', 'volume', 'first_page', 'last_page', 'publication_year',
+                                              'publication_date', 'indexed_terms', 'conf_code', 'conf_name'],
+    'stg_scopus_subjects': ['scp', 'subj_abbr'],
+    'stg_scopus_subject_keywords': ['scp', 'subject'],
+    'stg_scopus_classes': ['scp', 'class_type', 'class_code'],
+    'stg_scopus_classification_lookup': ['class_type', 'class_code', 'description'],
+    'stg_scopus_authors': ['scp', 'author_seq', 'auid', 'author_indexed_name', 'author_surname', 'author_given_name',
+                           'author_initials', 'author_e_address', 'author_rank'],
+    'stg_scopus_affiliations': ['scp', 'affiliation_no', 'afid', 'dptid', 'organization', 'city_group', 'state',
+                                'postal_code', 'country_code', 'country'],
+    'stg_scopus_author_affiliations': ['scp', 'author_seq', 'affiliation_no'],
+    'stg_scopus_chemical_groups': ['scp', 'chemicals_source', 'chemical_name', 'cas_registry_number'],
+    'stg_scopus_abstracts': ['scp', 'abstract_text', 'abstract_language'],
+    'stg_scopus_titles': ['scp', 'title', 'language'],
+    'stg_scopus_keywords': ['scp', 'keyword'],
+    'stg_scopus_publication_identifiers': ['scp', 'document_id', 'document_id_type'],
+    'stg_scopus_grants': ['scp', 'grant_id', 'grantor_acronym', 'grantor', 'grantor_country_code',
+                          'grantor_funder_registry_id'],
+    'stg_scopus_grant_acknowledgments': ['scp', 'grant_text'],
+    'stg_scopus_references': ['scp', 'ref_sgr', 'citation_text']}
+SOURCE_COLUMNS = ['source_id', 'issn_main', 'isbn_main', 'source_type', 'source_title', 'coden_code', 'website',
+                  'publisher_name', 'publisher_e_address', 'pub_date']
+# Source keyed rows hold a source key (source_id, issn_main, isbn_main) in place of `ernie_source_id` until it is resolved
+SOURCE_KEYED_TABLES = ['stg_scopus_publications', 'stg_scopus_isbns', 'stg_scopus_issns', 'stg_scopus_conf_proceedings',
+                       'stg_scopus_conf_editors']
+
+ASJC_CODE_WITH_SEMICOLON = re.compile(r'([0-9];)')
+ASJC_INVALID_CODE = re.compile(r'([0-9a-zA-Z.,;:/])')
+
+
+@functools.lru_cache(maxsize=None)
+def _xpath(path):
+    return etree.XPath(path, namespaces=NAMESPACES)
+
+
+def _text(node, path):
+    """
+    String value of the first node selected by `path`, or None: the `TEXT PATH` column of an XMLTABLE.
+    """
+    result = _xpath(path)(node)
+    if isinstance(result, str):
+        return result
+    if not result:
+        return None
+    value = result[0]
+    return value if isinstance(value, str) else value.xpath('string()')
+
+
+def _int(node, path):
+    """
+    The `SMALLINT/BIGINT PATH` column of an XMLTABLE. A non-numeric value fails the document as the cast would.
+    """
+    value = _text(node, path)
+    return int(value) if value is not None else None
+
+
+def _join(values, separator):
+    """
+    string_agg() of the non-NULL values
+    """
+    values = [value for value in values if value is not None]
+    return separator.join(values) if values else None
+
+
+def _max(values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def try_parse(year, month, day):
+    """
+    Python counterpart of the try_parse() SQL function: a date, with 0/missing months and days defaulting to 1,
+    or None when the date is not valid.
+    """
+    try:
+        return datetime.date(year, month or 1, day or 1)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(node, prefix, year='year', month='month', day='day'):
+    return try_parse(_int(node, prefix + year), _int(node, prefix + month), _int(node, prefix + day))
+
+
+class ScopusParser:
+    """
+    Parse Scopus publication XML into stg_scopus_* rows. Each parse_* method mirrors the procedure of the same name.
+    """
+
+    def parse(self, xml, pub_zip):
+        """
+        Arguments:
+            xml: (bytes) publication XML document
+            pub_zip: (str) name of the publication ZIP the document comes from
+
+        Output: (dict) staging table -> list of row tuples in STG_COLUMNS order, plus 'sources': source key -> source row
+        """
+        rows = {table: [] for table in STG_COLUMNS}
+        rows['sources'] = {}
+        root = etree.fromstring(xml)
+        for item in _xpath('//item')(root):
+            scp = _int(item, 'bibrecord/item-info/itemidlist/itemid[@idtype="SCP"]')
+            source_key = self.parse_source_and_conferences(item, rows)
+            self.parse_publication_and_group(item, scp, source_key, pub_zip, rows)
+            self.parse_pub_details_subjects_and_classes(item, scp, rows)
+            self.parse_authors_and_affiliations(item, scp, rows)
+            self.parse_chemical_groups(item, scp, rows)
+            self.parse_abstracts_and_titles(item, scp, rows)
+            self.parse_keywords(item, scp, rows)
+            self.parse_publication_identifiers(item, scp, rows)
+            self.parse_grants(item, scp, rows)
+            self.parse_references(item, scp, rows)
+        return rows
+
+    def parse_publication_and_group(self, item, scp, source_key, pub_zip, rows):
+        sgr = _int(item, 'bibrecord/item-info/itemidlist/itemid[@idtype="SGR"]')
+        rows['stg_scopus_publication_groups'].append(
+            (sgr, _int(item, 'bibrecord/head/source/publicationyear/@first'), pub_zip))
+        head = 'bibrecord/head/'
+        rows['stg_scopus_publications'].append((
+            scp, sgr, _text(item, head + 'correspondence[1]/person/ce:indexed-name'),
+            _join((_text(organization, 'normalize-space()') for organization in
+                   _xpath(head + 'correspondence/affiliation/organization')(item)), '\n'),
+            _text(item, head + 'correspondence[1]/affiliation/city'),
+            _text(item, head + 'correspondence[1]/affiliation/country'),
+            _text(item, head + 'correspondence[1]/ce:e-address'),
+            _text(item, 'ait:process-info/ait:status/@type'),
+            _text(item, head + 'citation-info/citation-type/@code'),
+            # An XML PATH column: all selected values are concatenated
+            _join(_xpath(head + 'citation-info/citation-language/@language')(item), '') or None,
+            _text(item, 'ait:process-info/ait:status/@stage'),
+            _text(item, 'ait:process-info/ait:status/@state'),
+            source_key,
+            _date(item, 'ait:process-info/ait:date-sort/@')))
+
+    def parse_source_and_conferences(self, item, rows):
+        """
+        Source elements are grouped by (source_id, issn_main, isbn_main), their text columns string_agg()-ed by ' ' and
+        their publication dates max()-ed. As in the procedure, the first group is the publication's source: only it is
+        staged, and the ISBNs, ISSNs, conferences and editors of all source elements refer to it.
+
+        Output: the (source_id, issn_main, isbn_main) key of the publication's source, or None without a source id
+        """
+        sources = _xpath('bibrecord/head/source')(item)
+        groups = {}
+        for source in sources:
+            key = (_text(source, '@srcid') or '', _text(source, 'issn[1]') or '', _text(source, 'isbn[1]') or '')
+            if key != ('', '', ''):
+                groups.setdefault(key, []).append((
+                    _text(source, '@type'), _text(source, 'sourcetitle'), _text(source, 'codencode'),
+                    _text(source, 'publisher/publishername'), _text(source, 'publisher/ce:e-address'),
+                    _date(source, 'publicationdate/')))
+        source_key = next(iter(groups), None)
+        if source_key is not None:
+            source_type, source_title, coden_code, publisher_name, publisher_e_address, pub_date = \
+                zip(*groups[source_key])
+            rows['sources'][source_key] = (
+                *source_key, _join(source_type, ' '), _join(source_title, ' '), _join(coden_code, ' '),
+                _join((_text(address, 'normalize-space()') for address in
+                       _xpath('bibrecord/head/source/website/ce:e-address')(item)), ','),
+                _join(publisher_name, ' '), _join(publisher_e_address, ' '), _max(pub_date))
+
+        rows['stg_scopus_isbns'].extend(
+            {(source_key, _text(isbn, '.'), _text(isbn, '@length'), _text(isbn, '@type') or '', _text(isbn, '@level')):
+                 None for isbn in _xpath('bibrecord/head/source/isbn')(item)})
+        rows['stg_scopus_issns'].extend((source_key, _text(issn, '.'), _text(issn, '@type') or '')
+                                        for issn in _xpath('bibrecord/head/source/issn')(item))
+
+        conference_info = 'bibrecord/head/source/additional-srcinfo/conferenceinfo/'
+        # Sponsors are aggregated per conference over all events, then set on the event rows of that conference
+        sponsors = {}
+        for sponsor in _xpath(conference_info + 'confevent/confsponsors/confsponsor')(item):
+            conference = (_text(sponsor, '../../confcode') or '', _text(sponsor, 'normalize-space(../../confname)'))
+            sponsors.setdefault(conference, []).append(_text(sponsor, 'normalize-space(.)'))
+        # One event row per source element, DISTINCT: for a source without a conference, all NULL but a '' code and name
+        event = 'additional-srcinfo/conferenceinfo/confevent/'
+        for source in sources:
+            conf_code = _text(source, event + 'confcode') or ''
+            conf_name = _text(source, 'normalize-space(' + event + 'confname)')
+            event_row = (
+                conf_code, conf_name, _text(source, event + 'conflocation/address-part'),
+                _text(source, event + 'conflocation/city'), _text(source, event + 'conflocation/postal-code'),
+                _date(source, event + 'confdate/startdate/@'), _date(source, event + 'confdate/enddate/@'),
+                _text(source, event + 'confnumber'), _text(source, event + 'confcatnumber'),
+                _join(sponsors.get((conf_code, conf_name), ()), ','))
+            if event_row not in rows['stg_scopus_conference_events']:
+                rows['stg_scopus_conference_events'].append(event_row)
+
+        for publication in _xpath(conference_info + 'confpublication')(item):
+            part_no, page_range, page_count = (_text(publication, 'procpartno'), _text(publication, 'procpagerange'),
+                                               _text(publication, 'procpagecount'))
+            if part_no is not None or page_range is not None or page_count is not None:
+                rows['stg_scopus_conf_proceedings'].append((
+                    source_key, _text(publication, 'preceding-sibling::confevent/confcode') or '',
+                    _text(publication, 'normalize-space(preceding-sibling::confevent/confname)'), part_no, page_range,
+                    self.page_count(page_count)))
+
+        # Editor addresses and organizations are aggregated per conference over all conference publications. The
+        # procedure groups them by the conference name as is and matches the editors' normalized name against it. Without
+        # a source, its UPDATE matches no editor (the NULL `ernie_source_id`).
+        editor_details = []
+        for path in ['editoraddress', 'editororganization']:
+            details = {}
+            if source_key is not None:
+                for detail in _xpath(conference_info + 'confpublication/confeditors/' + path)(item):
+                    details.setdefault((_text(detail, '../../preceding-sibling::confevent/confcode') or '',
+                                        _text(detail, '../../preceding-sibling::confevent/confname') or ''),
+                                       []).append(_text(detail, 'normalize-space()'))
+            editor_details.append(details)
+        addresses, organizations = editor_details
+        for editor in _xpath(conference_info + 'confpublication/confeditors/editors/editor')(item):
+            conf_code = _text(editor, '../../../preceding-sibling::confevent/confcode') or ''
+            conf_name = _text(editor, 'normalize-space(../../../preceding-sibling::confevent/confname)')
+            rows['stg_scopus_conf_editors'].append((
+                source_key, conf_code, conf_name, _text(editor, 'ce:indexed-name') or '', _text(editor, 'ce:surname'),
+                _text(editor, 'ce:degrees'), _join(addresses.get((conf_code, conf_name), ()), ','),
+                _join(organizations.get((conf_code, conf_name), ()), ',')))
+        return source_key
+
+    @staticmethod
+    def page_count(page_count):
+        if page_count is None:
+            return None
+        if page_count.endswith('p'):
+            return int(page_count.rstrip('p'))
+        if page_count.endswith('p.'):
+            return int(page_count.rstrip('p.'))
+        if re.search(r'[^0-9]', page_count):
+            return None
+        return int(page_count)
+
+    def parse_pub_details_subjects_and_classes(self, item, scp, rows):
+        indexed_terms = _join((_text(term, 'normalize-space()') for term in _xpath(
+            'bibrecord/head/enhancement/descriptorgroup/descriptors/descriptor/mainterm')(item)), ',')
+        details = {}
+        for source in _xpath('bibrecord/head/source')(item):
+            details[(scp, _text(source, 'volisspag/voliss/@issue'), _text(source, 'volisspag/voliss/@volume'),
+                     _text(source, 'volisspag/pagerange/@first'), _text(source, 'volisspag/pagerange/@last'),
+                     _int(source, 'publicationyear/@first'), _date(source, 'publicationdate/'), indexed_terms,
+                     _text(source, 'additional-srcinfo/conferenceinfo/confevent/confcode'),
+                     _text(source, 'normalize-space(additional-srcinfo/conferenceinfo/confevent/confname)'))] = None
+        rows['stg_scopus_source_publication_details'].extend(details)
+
+        classifications = 'bibrecord/head/enhancement/classificationgroup/classifications'
+        rows['stg_scopus_subjects'].extend({(scp, _text(classification, '.')): None for classification in
+                                            _xpath(classifications + '[@type="SUBJABBR"]/classification')(item)})
+        rows['stg_scopus_subject_keywords'].extend({(scp, _text(classification, '.')): None for classification in
+                                                    _xpath(classifications + '[@type="SUBJECT"]/classification')(item)})
+        classes = {}
+        for classification in _xpath(classifications + '[not(@type="SUBJABBR" or @type="SUBJECT")]/classification')(item):
+            class_type = _text(classification, '../@type')
+            class_code = _text(classification, 'classification-code')
+            if class_code is None:
+                class_code = _text(classification, '.')
+            # ASJC codes are 4-digit integer strings: '1004;' keeps its code, other malformed codes are nulled
+            if class_type == 'ASJC' and class_code is not None and ASJC_CODE_WITH_SEMICOLON.search(class_code):
+                class_code = class_code[:4]
+            elif class_type == 'ASJC' and class_code is not None and len(class_code) != 4 and \
+                    ASJC_INVALID_CODE.search(class_code):
+                class_code = None
+            classes[(scp, class_type, class_code)] = None
+        rows['stg_scopus_classes'].extend(classes)
+        rows['stg_scopus_classification_lookup'].extend(
+            {(_text(code, '../../@type'), _text(code, '.'), _text(code, 'following-sibling::classification-description')):
+                 None for code in _xpath(classifications + '[not(@type="ASJC" or @type="SUBJABBR" or @type="SUBJECT")]'
+                                                           '/classification/classification-code')(item)})
+
+    def parse_authors_and_affiliations(self, item, scp, rows):
+        # Group by (author_seq, auid, author_indexed_name), rank within the publication, then keep one row per (author_seq, auid)
+        grouped = {}
+        for author in _xpath('bibrecord/head/author-group/author')(item):
+            key = (_int(author, '@seq'), _int(author, '@auid'), _text(author, 'ce:indexed-name'))
+            values = (_text(author, 'ce:surname'), _text(author, 'ce:given-name'), _text(author, 'ce:initials'),
+                      _text(author, 'ce:e-address'))
+            grouped[key] = tuple(_max(pair) for pair in zip(grouped.get(key, values), values))
+        # ORDER BY author_seq, author_indexed_name sorts NULLs last
+        ranked = sorted(grouped.items(), key=lambda group: (group[0][0] is None, group[0][0] or 0,
+                                                            group[0][2] is None, group[0][2] or ''))
+        authors = {}
+        for author_rank, ((author_seq, auid, indexed_name), values) in enumerate(ranked, start=1):
+            authors.setdefault((author_seq, auid), (scp, author_seq, auid, indexed_name, *values, author_rank))
+        rows['stg_scopus_authors'].extend(authors.values())
+
+        affiliations = _xpath('bibrecord/head/author-group/affiliation')(item)
+        # The organizations of all affiliations are aggregated per publication, as the procedure does
+        organization = _join((_text(organization, 'normalize-space()') for organization in
+                              _xpath('bibrecord/head/author-group/affiliation/organization')(item)), ',')
+        affiliation_afids = []
+        for affiliation_no, affiliation in enumerate(affiliations, start=1):
+            afid = _int(affiliation, '@afid')
+            affiliation_afids.append((affiliation_no, afid))
+            city_group = _text(affiliation, 'city-group')
+            rows['stg_scopus_affiliations'].append((
+                scp, affiliation_no, afid, _int(affiliation, '@dptid'), organization,
+                city_group if city_group is not None else _text(affiliation, 'city'), _text(affiliation, 'state'),
+                _text(affiliation, 'postal-code'), _text(affiliation, '@country'), _text(affiliation, 'country')))
+        if affiliations:
+            author_afids = [(_int(author, '@seq'), _int(author, '../affiliation/@afid'))
+                            for author in _xpath('bibrecord/head/author-group/author')(item)]
+            rows['stg_scopus_author_affiliations'].extend(
+                {(scp, author_seq, affiliation_no): None for affiliation_no, afid in affiliation_afids
+                 for author_seq, author_afid in author_afids if afid is not None and afid == author_afid})
+
+    def parse_chemical_groups(self, item, scp, rows):
+        for cas_registry_number in _xpath(
+                'bibrecord/head/enhancement/chemicalgroup/chemicals/chemical/cas-registry-number')(item):
+            chemicals_source = _text(cas_registry_number, '../chemicals[@source]')
+            rows['stg_scopus_chemical_groups'].append((
+                scp, chemicals_source if chemicals_source is not None else ELSEVIER_BIBLIO_DB_DIVISION_CHEMICAL_SRC,
+                _text(cas_registry_number, '../chemical-name'), _text(cas_registry_number, '.')))
+
+    def parse_abstracts_and_titles(self, item, scp, rows):
+        abstracts = {}
+        for para in _xpath('bibrecord/head/abstracts/abstract/ce:para')(item):
+            abstracts.setdefault(_text(para, '../@xml:lang'), []).append(_text(para, 'normalize-space()'))
+        rows['stg_scopus_abstracts'].extend(
+            (scp, _join(paras, '\n'), abstract_language) for abstract_language, paras in abstracts.items())
+
+        titles = {}
+        for title in _xpath('bibrecord/head/citation-title/titletext')(item):
+            titles.setdefault(_text(title, '@language') or '', []).append(_text(title, 'normalize-space()'))
+        rows['stg_scopus_titles'].extend((scp, _max(values), language) for language, values in titles.items())
+
+    def parse_keywords(self, item, scp, rows):
+        rows['stg_scopus_keywords'].extend(
+            {(scp, _text(keyword, '.')): None for keyword in
+             _xpath('bibrecord/head/citation-info/author-keywords/author-keyword')(item)})
+
+    def parse_publication_identifiers(self, item, scp, rows):
+        identifiers = {(scp, _text(itemid, '.'), _text(itemid, '@idtype')): None for itemid in
+                       _xpath('bibrecord/item-info/itemidlist/itemid[@idtype!="SCP" and @idtype!="SGR"]')(item)}
+        for document_id_type in ['doi', 'pii']:
+            identifiers.update({(scp, _text(identifier, '.'), document_id_type.upper()): None for identifier in
+                                _xpath('bibrecord/item-info/itemidlist/ce:' + document_id_type)(item)})
+        rows['stg_scopus_publication_identifiers'].extend(identifiers)
+
+    def parse_grants(self, item, scp, rows):
+        grants = {}
+        for grant in _xpath('bibrecord/head/grantlist/grant')(item):
+            key = (_text(grant, 'grant-id'), _text(grant, 'grant-agency'))
+            values = (_text(grant, 'grant-acronym'), _text(grant, 'grant-agency/@iso-code'),
+                      _text(grant, 'grant-agency-id'))
+            grants[key] = tuple(_max(pair) for pair in zip(grants.get(key, values), values))
+        rows['stg_scopus_grants'].extend(
+            (scp, grant_id or '', grantor_acronym, grantor, grantor_country_code, grantor_funder_registry_id)
+            for (grant_id, grantor), (grantor_acronym, grantor_country_code, grantor_funder_registry_id) in
+            grants.items())
+        rows['stg_scopus_grant_acknowledgments'].extend(
+            {(scp, _text(grant_text, '.')): None for grant_text in _xpath('bibrecord/head/grantlist/grant-text')(item)})
+
+    def parse_references(self, item, scp, rows):
+        references = {}
+        for reference in _xpath('bibrecord/tail/bibliography/reference')(item):
+            ref_sgr = _int(reference, 'ref-info/refd-itemidlist/itemid[@idtype="SGR"]/text()')
+            if scp is None or ref_sgr is None or ref_sgr == scp:
+                continue
+            ref_fulltext = _text(reference, 'ref-fulltext/text()[1]')
+            references.setdefault(ref_sgr, []).append(
+                ref_fulltext if ref_fulltext is not None else _text(reference, 'ref-info/ref-text/text()[1]'))
+        rows['stg_scopus_references'].extend(
+            (scp, ref_sgr, _max(citation_texts)) for ref_sgr, citation_texts in references.items())
+
+
+def copy_text(value):
+    """
+    Escape a value for the text format of COPY
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def resolve_sources(curs, sources):
+    """
+    Map source keys to `ernie_source_id`: existing sources from scopus_sources, new ones generated in stg_scopus_sources.
+    New sources are committed right away, like the COMMITs of stg_scopus_parse_source_and_conferences, so that
+    concurrent workers staging the same source see it. Keys are upserted in a fixed order to avoid deadlocks.
+
+    Arguments:
+        curs: cursor of a connection with no open work
+        sources: (dict) source key -> source row in SOURCE_COLUMNS order
+
+    Output: (dict) source key -> ernie_source_id
+    """
+    if not sources:
+        return {}
+    keys = sorted(sources)
+    curs.execute("""
+        SELECT ss.source_id, ss.issn_main, ss.isbn_main, ss.ernie_source_id
+          FROM scopus_sources ss
+          JOIN unnest(%s::TEXT[], %s::TEXT[], %s::TEXT[]) AS k(source_id, issn_main, isbn_main)
+            ON (ss.source_id, ss.issn_main, ss.isbn_main) = (k.source_id, k.issn_main, k.isbn_main);""",
+                 [list(column) for column in zip(*keys)])
+    source_ids = {(source_id, issn_main, isbn_main): ernie_source_id
+                  for source_id, issn_main, isbn_main, ernie_source_id in curs.fetchall()}
+    new_sources = [sources[key] for key in keys if key not in source_ids]
+    if new_sources:
+        returned = psycopg2.extras.execute_values(curs, """
+            INSERT INTO stg_scopus_sources(ernie_source_id, {0})
+            SELECT nextval('scopus_sources_ernie_source_id_seq'), *
+              FROM (VALUES %s) AS s({0})
+                ON CONFLICT (source_id, issn_main, isbn_main) DO UPDATE SET --
+                  source_type = excluded.source_type,
+                  source_title = excluded.source_title,
+                  coden_code = excluded.coden_code,
+                  website = excluded.website,
+                  publisher_name = excluded.publisher_name,
+                  publisher_e_address = excluded.publisher_e_address,
+                  pub_date = excluded.pub_date
+            RETURNING source_id, issn_main, isbn_main, ernie_source_id;""".format(', '.join(SOURCE_COLUMNS)),
+                                                  new_sources, template='(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::DATE)',
+                                                  fetch=True)
+        source_ids.update(((source_id, issn_main, isbn_main), ernie_source_id)
+                          for source_id, issn_main, isbn_main, ernie_source_id in returned)
+    curs.connection.commit()
+    return source_ids
+
+
+def stage_documents(conn, documents):
+    """
+    Stage parsed documents: resolve their sources, then COPY every staging table's rows in one transaction.
+
+    Arguments:
+        conn: psycopg2 connection
+        documents: list of ScopusParser.parse() outputs
+
+    Output: (dict) staging table -> number of rows staged
+    """
+    sources = {}
+    for rows in documents:
+        sources.update(rows['sources'])
+    with conn.cursor() as curs:
+        source_ids = resolve_sources(curs, sources)
+        counts = {}
+        for table, columns in STG_COLUMNS.items():
+            source_index = columns.index('ernie_source_id') if table in SOURCE_KEYED_TABLES else None
+            buffer = io.StringIO()
+            for rows in documents:
+                for row in rows[table]:
+                    if source_index is not None:
+                        row = row[:source_index] + (source_ids.get(row[source_index]),) + row[source_index + 1:]
+                    buffer.write('\t'.join(copy_text(value) for value in row) + '\n')
+                    counts[table] = counts.get(table, 0) + 1
+            if counts.get(table):
+                buffer.seek(0)
+                curs.copy_expert("COPY {}({}) FROM STDIN".format(table, ','.join(columns)), buffer)
+    conn.commit()
+    return counts
@@ -2,47 +2,170 @@
 Title: Scopus_Update Delete Function
 Author: Djamil Lakhdar-Hamina
 Date: 06/27/2019
+Updated on 10/16/2026: retention manager
 
 The point of this delete function is scan a directory. It scans the date when the file was uploaded and whether it was processed.
 If the file satisfies both conditions then it is deleted.
 
+Update sets are grouped by the date of their file names (`YYYY-MM-DD_ANI-ITEM-*`). A file or directory is eligible for
+removal when:
+    1. it was processed: it is in the `processed` archive directory or listed in `processed.log` (see load.sh),
+    2. it does not belong to the newest `keep` update sets,
+    3. it is older than `min_age_hours`.
+Eligible entries are removed oldest first, all of them or only until `free_gb` GB are available on the file system.
+Sizes of directory trees are scanned in parallel. With `-d`, only the report is printed.
+
 This is part of the code for an automated process which will leverage Jenkins to set off a process when
 triggered by the reception of an email with a url-link.
 
+Usage: scopus_update_delete_function.py [-k keep] [-a min_age_hours] [-f free_gb] [-j jobs] [-d] [data_directory]
 """
 
 import time
 import os
+import re
+import shutil
+import concurrent.futures as cf
 from argparse import ArgumentParser
 
-current_time=time.time()
+PROCESSED_LOG = 'processed.log'
+PROCESSED_ARCHIVE_DIR = 'processed'
+UPDATE_SET_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})_ANI-ITEM')
+GB = 1024 ** 3
+
+
+def tree_size(path):
+    """
+    Size of a file, or of all files in a directory tree, in bytes
+    """
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+    size = 0
+    for entry in os.scandir(path):
+        size += tree_size(entry.path) if entry.is_dir(follow_symlinks=False) else entry.stat(follow_symlinks=False).st_size
+    return size
+
+
+def remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+    return path
+
+
+def update_set(name):
+    """
+    Output: (tuple) the (year, month, day) update set of a file name, or None for other files
+    """
+    match = UPDATE_SET_PATTERN.match(name)
+    return tuple(int(part) for part in match.groups()) if match else None
+
+
+def scan(data_directory, jobs):
+    """
+    Assumptions:
 
-def delete_function(data_directory="/erniedev_data2/Scopus_updates"):
+    Given a directory, scan the update set files and directories in it and in its processed archive directory.
 
+    Output: list of dicts: path, name, update set, processed flag, age in hours and size
+    """
+    processed_names = set()
+    processed_log = os.path.join(data_directory, PROCESSED_LOG)
+    if os.path.exists(processed_log):
+        with open(processed_log) as log:
+            processed_names = {line.strip() for line in log}
+
+    present_time = time.time()
+    entries = []
+    archive_directory = os.path.join(data_directory, PROCESSED_ARCHIVE_DIR)
+    for directory in [data_directory, archive_directory]:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            entry_set = update_set(entry.name)
+            if entry_set is None:
+                continue
+            name = entry.name[:-len('.zip')] if entry.name.endswith('.zip') else entry.name
+            entries.append({'path': entry.path, 'name': entry.name, 'set': entry_set,
+                            'processed': directory == archive_directory or name in processed_names
+                                         or entry.name in processed_names,
+                            'age_hours': (present_time - entry.stat(follow_symlinks=False).st_mtime) / 3600})
+
+    with cf.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for entry, size in zip(entries, executor.map(tree_size, [entry['path'] for entry in entries])):
+            entry['size'] = size
+    return entries
+
+
+def delete_function(data_directory="/erniedev_data2/Scopus_updates", keep=2, min_age_hours=840, free_gb=None, jobs=8,
+                    dry_run=False):
     """
     Assumptions:
 
-    Given a directory, scan the files in directory. If it is processed and more than 5 weeks old then delete.
+    Given a directory, scan the files in directory. If it is processed, not one of the newest `keep` update sets and
+    more than 5 weeks (`min_age_hours`) old then delete, until `free_gb` GB are free if a target is given.
 
     Arguments: directory= /Scopus_update
 
     Input: directory
-    Output: remove a file
+    Output: list of removed (or to be removed in a dry run) paths
 
     """
 
-    present_time = time.time()
-    for file in os.listdir(data_directory):
-        file_mtimeresult = os.stat(os.path.join(data_directory, file))
-        file_mtimeresult = [file, (present_time - file_mtimeresult.st_mtime)]
-            if file_mtimeresult[1] > (840 * 3600):
-                print("The present file" + " " + str(file_mtimeresult[0]) + " " + "will be removed....")
-                os.remove(os.path.join(data_directory, file))
-                 print("The present file " + " "  + str(file_mtimeresult[0]) + " " + "is removed!")
+    entries = scan(data_directory, jobs)
+    kept_sets = set(sorted({entry['set'] for entry in entries}, reverse=True)[:keep])
+    eligible = sorted((entry for entry in entries if entry['processed'] and entry['set'] not in kept_sets and
+                       entry['age_hours'] > min_age_hours), key=lambda entry: (entry['set'], -entry['age_hours']))
+
+    free_bytes = shutil.disk_usage(data_directory).free
+    selected = []
+    for entry in eligible:
+        if free_gb is not None and free_bytes >= free_gb * GB:
+            break
+        selected.append(entry)
+        free_bytes += entry['size']
+
+    print("{:<60} {:>12} {:>10}  {}".format('Update set file', 'Size (GB)', 'Age (h)', 'Action'))
+    selected_paths = {entry['path'] for entry in selected}
+    for entry in sorted(entries, key=lambda entry: (entry['set'], entry['name'])):
+        if entry['path'] in selected_paths:
+            action = 'would remove' if dry_run else 'remove'
+        elif not entry['processed']:
+            action = 'keep: not processed'
+        elif entry['set'] in kept_sets:
+            action = 'keep: newest {} sets'.format(keep)
+        elif entry['age_hours'] <= min_age_hours:
+            action = 'keep: too recent'
+        else:
+            action = 'keep: {} GB free'.format(free_gb)
+        print("{:<60} {:>12.2f} {:>10.0f}  {}".format(entry['name'], entry['size'] / GB, entry['age_hours'], action))
+    print("{} file(s), {:.2f} GB {}".format(len(selected), sum(entry['size'] for entry in selected) / GB,
+                                          'would be freed' if dry_run else 'to be freed'))
+
+    if dry_run:
+        return [entry['path'] for entry in selected]
+    removed = []
+    with cf.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for path in executor.map(remove, [entry['path'] for entry in selected]):
+            print("The present file " + path + " is removed!")
+            removed.append(path)
+    return removed
+
 
 ## Run the function with relevant input
-print('Scanning for at least 5-week old files within the Scopus_updates directory... ')
-target_data_directory="/erniedev_data2/Scopus_updates"
-results= delete_function(target_data_directory)
-print('The relevant files are removed:',results )
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Remove processed Scopus update sets beyond the retention policy')
+    parser.add_argument('data_directory', nargs='?', default="/erniedev_data2/Scopus_updates")
+    parser.add_argument('-k', '--keep', type=int, default=2, help='keep the newest update sets, 2 by default')
+    parser.add_argument('-a', '--min_age_hours', type=float, default=840,
+                        help='only remove files older than this, 840 h (5 weeks) by default')
+    parser.add_argument('-f', '--free_gb', type=float, help='only remove files until this many GB are available')
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='parallel directory scans and removals, 8 by default')
+    parser.add_argument('-d', '--dry_run', action='store_true', help='report what would be removed')
+    args = parser.parse_args()
+    print('Scanning for processed, at least {}-hour old files within {}... '.format(args.min_age_hours,
+                                                                                    args.data_directory))
+    results = delete_function(args.data_directory, args.keep, args.min_age_hours, args.free_gb, args.jobs, args.dry_run)
+    print('The relevant files are removed:', results)
 ## End of script
@@ -8,22 +8,33 @@ Once the url is found it opens it up and saves it to a specified directory.
 This is part of the code for an automated process which will leverage Jenkins to set off a process when
 triggered by the reception of an email with a url-link.
 
+Downloads are managed by `ZipDownloader`: ZIPs are downloaded concurrently, interrupted downloads are resumed from
+their `.part` files via HTTP Range requests, every ZIP is verified (size and ZIP CRCs) and completed ZIPs are recorded in
+a `download_manifest.tsv` in the save path, so that a rerun skips them.
+
 Arguments: 
 	1. PMT Content
 	2. Save path
+	-j jobs: number of concurrent downloads, 4 by default
+	-r retries: number of attempts per ZIP, 5 by default
+	-s source: local directory or file:// URL to read the ZIPs from instead of the email links (offline testing)
 """
 
 import time
 import re
 import requests
-import urllib.request
+import argparse
+import concurrent.futures as cf
+import hashlib
+import io
 import os
-from sys import argv
-
-start_time=time.time()
+import sys
+import urllib.parse
+import zipfile
 
-pmt_content=argv[1]
-data_directory = argv[2]
+MANIFEST = 'download_manifest.tsv'
+PART_SUFFIX = '.part'
+CHUNK_SIZE = 1024 * 1024
 
 ## Build a function that 1) opens email 2) scans it for urls 3) stores urls and then opens file in them 4) then rename this downloaded file and store in specified directory.
 
@@ -58,21 +69,188 @@ def scopus_zip_file_name_date_edit(scopus_zip_file_name):
     return scopus_zip_file_name
 
 
-def email_parser(pmt_content, data_directory):
+class DownloadError(Exception):
+    pass
+
+
+class IncompleteDownload(DownloadError):
+    """
+    The download ended short of the ZIP size: its `.part` file is kept and resumed
+    """
+
+
+class CorruptDownload(DownloadError):
+    """
+    The downloaded ZIP is damaged (oversized, not a ZIP or failing a CRC check): its `.part` file can not be resumed
+    """
+
+
+class ZipDownloader:
+    """
+    Download ZIPs concurrently into a directory: resume `.part` files, verify and record completed ZIPs in the manifest.
+    """
+
+    def __init__(self, data_directory, jobs=4, retries=5, source=None):
+        self.data_directory = data_directory
+        self.jobs = jobs
+        self.retries = retries
+        if source and source.startswith('file://'):
+            source = urllib.parse.urlparse(source).path
+        self.source = source
+        self.manifest_path = os.path.join(data_directory, MANIFEST)
+        self.session = requests.Session()
+
+    def completed(self):
+        """
+        Output: (dict) file name -> size of the ZIPs recorded in the manifest
+        """
+        completed = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as manifest:
+                for line in manifest:
+                    name, size, sha256 = line.rstrip('\n').split('\t')
+                    completed[name] = int(size)
+        return completed
+
+    def open_source(self, url, offset):
+        """
+        Open a ZIP at `offset`: a local file when downloading from a source directory or a file:// URL, else via HTTP.
+
+        Output: (stream, total size, whether the stream starts at `offset`). The stream is a file or a requests Response.
+        """
+        parsed_url = urllib.parse.urlparse(url)
+        if self.source or parsed_url.scheme == 'file':
+            path = os.path.join(self.source, os.path.basename(parsed_url.path)) if self.source else parsed_url.path
+            stream = open(path, 'rb')
+            stream.seek(offset)
+            return stream, os.path.getsize(path), True
+
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+        response = self.session.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code == 416 and offset:
+            # Range Not Satisfiable: the `.part` file may already hold the whole ZIP (Content-Range: bytes */{total}),
+            # e.g. when the process was killed while verifying it
+            response.close()
+            total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+            if total.isdigit() and int(total) == offset:
+                return io.BytesIO(), offset, True
+            raise CorruptDownload("{} bytes downloaded, the server has {} bytes".format(offset, total or 'fewer'))
+        response.raise_for_status()
+        if response.status_code == 206:
+            # Content-Range: bytes {offset}-{last}/{total}
+            total = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+            return response, total, True
+        total = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+        return response, total, False
+
+    @staticmethod
+    def read_chunks(stream):
+        # iter_content raises connection errors in the middle of a body as requests exceptions (ChunkedEncodingError,
+        # ConnectionError) instead of the urllib3 ones of response.raw
+        if isinstance(stream, requests.Response):
+            return stream.iter_content(CHUNK_SIZE)
+        return iter(lambda: stream.read(CHUNK_SIZE), b'')
+
+    def download(self, url, scopus_zip_file_name):
+        """
+        Download one ZIP, retrying and resuming from its `.part` file after failures.
+
+        Output: (str) path of the verified ZIP
+        """
+        path = os.path.join(self.data_directory, scopus_zip_file_name)
+        part_path = path + PART_SUFFIX
+        for attempt in range(1, self.retries + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            try:
+                stream, total, resumed = self.open_source(url, offset)
+                with stream, open(part_path, 'ab' if resumed else 'wb') as part_file:
+                    if resumed and offset:
+                        print("Resuming {} at {} bytes".format(scopus_zip_file_name, offset))
+                    for chunk in self.read_chunks(stream):
+                        part_file.write(chunk)
+                self.verify(part_path, total)
+                os.replace(part_path, path)
+                return path
+            except (requests.RequestException, OSError, DownloadError) as e:
+                if isinstance(e, CorruptDownload) and os.path.exists(part_path):
+                    # A corrupted download can not be resumed
+                    os.remove(part_path)
+                print("{} download attempt #{} FAILED: {}".format(scopus_zip_file_name, attempt, e))
+                if attempt < self.retries:
+                    time.sleep(2 ** attempt)
+        raise DownloadError("all {} download attempts failed".format(self.retries))
+
+    @staticmethod
+    def verify(part_path, total):
+        size = os.path.getsize(part_path)
+        if total is not None and size < total:
+            raise IncompleteDownload("size {} bytes, expected {} bytes".format(size, total))
+        if total is not None and size > total:
+            raise CorruptDownload("size {} bytes, expected {} bytes".format(size, total))
+        try:
+            with zipfile.ZipFile(part_path) as archive:
+                bad_member = archive.testzip()
+        except zipfile.BadZipFile as e:
+            raise CorruptDownload(str(e))
+        if bad_member is not None:
+            raise CorruptDownload("CRC check failed for {}".format(bad_member))
+
+    def record(self, path):
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as zip_file:
+            for block in iter(lambda: zip_file.read(CHUNK_SIZE), b''):
+                sha256.update(block)
+        with open(self.manifest_path, 'a') as manifest:
+            manifest.write('{}\t{}\t{}\n'.format(os.path.basename(path), os.path.getsize(path), sha256.hexdigest()))
+
+    def download_all(self, downloads):
+        """
+        Arguments: downloads: list of (url, scopus_zip_file_name)
+
+        Output: (list) names of the ZIPs which failed to download
+        """
+        completed = self.completed()
+        pending = []
+        for url, scopus_zip_file_name in downloads:
+            path = os.path.join(self.data_directory, scopus_zip_file_name)
+            if completed.get(scopus_zip_file_name) is not None and os.path.exists(path) and \
+                    os.path.getsize(path) == completed[scopus_zip_file_name]:
+                print("Skipping {}: it is already downloaded.".format(scopus_zip_file_name))
+            else:
+                pending.append((url, scopus_zip_file_name))
+
+        failures = []
+        with cf.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {executor.submit(self.download, url, scopus_zip_file_name): scopus_zip_file_name
+                       for url, scopus_zip_file_name in pending}
+            for future in cf.as_completed(futures):
+                try:
+                    self.record(future.result())
+                except Exception as e:
+                    # One failed ZIP does not stop the others
+                    print("{}: {}".format(futures[future], e))
+                    failures.append(futures[future])
+                    continue
+                print("Downloaded", futures[future])
+        return failures
+
+
+def email_parser(pmt_content, data_directory, downloader):
     """
     Assumptions:
     Given an email, read the email, then scan it for url.
     If url is found, download, rename, and then save to specified directory.
-    Input: email_message and default value for directory= /erniedev_data2/Scopus_updates
+    Input: email_message, directory= /erniedev_data2/Scopus_updates and the ZipDownloader
     Output: A group of zip files, renamed, and stored in specified directory called /erniedev_data2/Scopus_updates
-    :return:
+    :return: names of the zip files which failed to download
     """
 
     ## Scan emails for url and store the url(s) in a list
     links= re.findall('https://\S[^<]*', pmt_content)
     links=links[0:3]
     links.remove(links[1])
-    ## Go through list of links, request https, download url with zip
+    ## Go through list of links, come up with names and download them concurrently
+    downloads=[]
     for url in links:
         #through list of links, come up with name, rename/store in testing_directory
         scopus_zip_file_name= re.findall('nete.*ANI.*zip', url)
@@ -80,17 +258,30 @@ def email_parser(pmt_content, data_directory):
         print("Old zip file name: ", scopus_zip_file_name)
         scopus_zip_file_name = scopus_zip_file_name_date_edit(scopus_zip_file_name)
         print("New zip file name: ", scopus_zip_file_name)
-        urllib.request.urlretrieve(url,os.path.join(data_directory,scopus_zip_file_name))
-        print(scopus_zip_file_name)
-
-
-## Run the function with the relevant input, which is already default argument for email_parser
-print("Scanning email now for url...")
-print("The email content is:")
-print("")
-print(pmt_content)
-print("")
-result=email_parser(pmt_content, data_directory)
-#print('The revelevant items are zip files:', result)
-print('The total duration for the whole process:',time.time()-start_time)
+        downloads.append((url, scopus_zip_file_name))
+    return downloader.download_all(downloads)
+
+
+if __name__ == '__main__':
+    start_time=time.time()
+    parser = argparse.ArgumentParser(description='Download the Scopus update ZIPs linked in a notification email')
+    parser.add_argument('pmt_content', help='notification email content')
+    parser.add_argument('data_directory', help='save path')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='number of concurrent downloads, 4 by default')
+    parser.add_argument('-r', '--retries', type=int, default=5, help='number of attempts per ZIP, 5 by default')
+    parser.add_argument('-s', '--source', help='local directory or file:// URL to read the ZIPs from (offline testing)')
+    args = parser.parse_args()
+
+    ## Run the function with the relevant input
+    print("Scanning email now for url...")
+    print("The email content is:")
+    print("")
+    print(args.pmt_content)
+    print("")
+    downloader = ZipDownloader(args.data_directory, args.jobs, args.retries, args.source)
+    failures=email_parser(args.pmt_content, args.data_directory, downloader)
+    print('The total duration for the whole process:',time.time()-start_time)
+    if failures:
+        print('FAILED downloads:', ', '.join(failures))
+        sys.exit(1)
 ## End of the script
@@ -11,13 +11,15 @@ SET TIMEZONE = 'US/Eastern';
 DO $$
   DECLARE staging_table_record RECORD;
   BEGIN
-    -- Truncate all default Scopus staging tables: the first on the current search path
+    -- Truncate all default Scopus staging tables: the first on the current search path.
+    -- The merge state is kept, so that an interrupted merge can be resumed (see merge_staged_data.py).
     FOR staging_table_record IN (
       SELECT pn.nspname, pc.relname
         FROM
           pg_catalog.pg_class pc
             LEFT JOIN pg_catalog.pg_namespace pn ON pn.oid = pc.relnamespace
-       WHERE pc.relkind IN ('r', 'p') AND pc.relname LIKE 'stg_scopus%' AND pg_catalog.pg_table_is_visible(pc.oid)
+       WHERE pc.relkind IN ('r', 'p') AND pc.relname LIKE 'stg_scopus%'
+         AND pc.relname <> 'stg_scopus_merge_state' AND pg_catalog.pg_table_is_visible(pc.oid)
     ) LOOP
       EXECUTE format('TRUNCATE TABLE %I.%I CASCADE', staging_table_record.nspname, staging_table_record.relname);
     END LOOP;
@@ -1,18 +1,25 @@
 # This is a generalized script to search a SOLR server for matches based on a list of search criteria
 # Usage:
 #        python mass_solr_search.py -c 'core_name' -qf 'query_field' -q|-f 'query or file' -ip 'solr ip address and port' -n 'number of solr results' -o 'output file name'
+#                                   [-j 'concurrent queries'] [-b 'queries per batch']
 # Example 1:
 #        python mass_solr_search.py -c wos_pub_core -qf citation -q "DNA microarray" -ip 10.0.0.5:8983 -n 10 -o dna_microarray.csv
 # Example 2:
 #        python mass_solr_search.py -c wos_pub_core -qf citation -f pirrung.txt -ip 10.0.0.5:8983 -n 5 -o pirrung.csv
+#
+# Queries run in batches over one persistent SOLR session (see solr_client.py). The WoS ids of each batch are mapped to
+# PMIDs with one wos_pmid_mapping query, and mappings are cached for the rest of the run.
 
 
 
 
 # Author: VJ Davey
-import sys; import string; import re ; import subprocess
+import sys; import re
+import psycopg2
+from solr_client import SolrClient, field_text, batches
 # search the SOLR database # pmid_file=sys.argv[6]
 query=None; core=None; query_field=None; search_file=None; num_results=10; ip_and_port='localhost:8983' ; psql_ip='localhost' ; psql_port='5432'; output_file='temp.csv'
+jobs=8; batch_size=500
 for i in range(0,len(sys.argv)):
     if sys.argv[i][0] == '-':
         option = sys.argv[i]
@@ -38,40 +45,55 @@ for i in range(0,len(sys.argv)):
             psql_ip = sys.argv[i+1]
         elif option[1:] in ['psql_port', 'pp']:
             psql_port = sys.argv[i+1]
+        elif option[1:] in ['jobs', 'j']:
+            jobs = int(sys.argv[i+1])
+        elif option[1:] in ['batch_size', 'b']:
+            batch_size = int(sys.argv[i+1])
         else:
             raise NameError('Unknown option : \'%s\''%(option))
 if (core==None) or (query_field==None): raise NameError('Missing critical information - core and query field')
-curl_search_string="curl \'http://%s/solr/%s/select?fl=id,citation,score&q=%s:"%(ip_and_port, core, query_field)
-curl_search_string_ending='&rows=%s&wt=csv&csv.separator=~\''%(num_results)
+search_string="fl=id,citation,score&q=%s:"%(query_field)
+search_string_ending='&rows=%s'%(num_results)
 stem_words=['et al']
-i=1; match=0; top_10_match=0
 queries=[]
 if search_file!=None:
-    with open(search_file) as f:
+    with open(search_file, encoding='utf-8', errors='ignore') as f:
         queries = f.read().splitlines()
 else:
     queries.append(query)
 
-with open(output_file, 'wb') as csv_file:
+solr = SolrClient(ip_and_port, core, jobs)
+conn = psycopg2.connect(host=psql_ip, port=psql_port, user='ernie_admin', dbname='ernie')
+pmids = {}
+
+def map_pmids(wos_ids):
+    # Map all new WoS ids of a batch with one query. The first mapping of a WoS id is used.
+    wos_ids = list({wos_id for wos_id in wos_ids if wos_id not in pmids})
+    if not wos_ids:
+        return
+    with conn.cursor() as curs:
+        curs.execute('select wos_id, pmid_int from wos_pmid_mapping where wos_id = ANY(%s)', (wos_ids,))
+        for wos_id, pmid_int in curs:
+            pmids.setdefault(wos_id, '' if pmid_int is None else str(pmid_int))
+    conn.rollback()
+
+with open(output_file, 'w', newline='') as csv_file:
     csv_file.write('query, wos_id, wos_title, PMID, search_result_rank, solr_score\n')
-    for line in queries:
-        print i; i+=1; line=(line.decode('utf-8')).encode('ascii','ignore')
-        input_string=re.sub('|'.join(stem_words),'',line); input_string=re.sub(r'[,.{}<>\"\'\n\r]','',input_string) ; input_string=re.sub(r'[:@*#() -]','\\+',input_string) ; input_string=re.sub(r'\u+2260','',input_string)
-        query_string=curl_search_string+input_string+curl_search_string_ending
-        s = subprocess.check_output(query_string, shell=True).split("\n")
-        print line ; print query_string
+    for offset, batch in batches(queries, batch_size):
+        lines=[line.encode('ascii','ignore').decode('ascii') for line in batch]
+        query_strings=[]
+        for line in lines:
+            input_string=re.sub('|'.join(stem_words),'',line); input_string=re.sub(r'[,.{}<>\"\'\n\r]','',input_string) ; input_string=re.sub(r'[:@*#() -]','\\+',input_string) ; input_string=re.sub(r'u+2260','',input_string)
+            query_strings.append(search_string+input_string+search_string_ending)
+        results = solr.select_many(query_strings)
+        map_pmids(field_text(doc.get('id')) for docs in results for doc in docs)
 
-        for result in s[1:-1]:
-            result_list=result.split('~'); wos_id=result_list[0]; citation='\"'+re.sub(r'[\"]','',result_list[1])+'\"'; score=result_list[2]
-            psql_query='\"select pmid_int from wos_pmid_mapping where wos_id=\''+ wos_id+'\';\"'
-            psql_result=subprocess.check_output("psql -h "+psql_ip+" -p "+psql_port+" -U ernie_admin -d ernie -c " + psql_query, shell=True).split("\n")
-            #found = ' pmid IS in file' if psql_result[2].lstrip() in open(pmid_file).read() else ' pmid NOT in file'
-            #match += 1 if (found == ' pmid IS in file' and  result==s[1]) else 0
-            #top_10_match +=1 if (found == ' pmid IS in file') else 0
-            print wos_id+":"+citation+" -- PMID: "+psql_result[2]+"\n" if len(psql_result) > 5 else wos_id+":"+citation+"\n"
-            if len(psql_result) > 5:
-                csv_file.write('\"'+re.sub(r'[,\n\r]','',line)+'\",'+wos_id+','+citation+','+psql_result[2].lstrip()+','+str(s.index(result))+','+score+"\n")
-            else:
-                csv_file.write('\"'+re.sub(r'[,\n\r]','',line)+'\",'+wos_id+','+citation+','+'NA'+','+str(s.index(result))+','+score+"\n")
-#print '\n\nGot a correct PMID match with first SOLR result returned:  %.2f percent of the time...' %((float(match)/i)*100)
-#print '\n\nGot a correct PMID in the top 10:  %.2f percent of the time...'%((float(top_10_match)/i)*100)
+        for i, (line, query_string, docs) in enumerate(zip(lines, query_strings, results), start=offset+1):
+            print(i) ; print(line) ; print(query_string)
+            for rank, doc in enumerate(docs, start=1):
+                wos_id=field_text(doc.get('id')); citation='\"'+re.sub(r'[\"]','',field_text(doc.get('citation')))+'\"'; score=field_text(doc.get('score'))
+                pmid=pmids.get(wos_id)
+                print(wos_id+":"+citation+" -- PMID: "+pmid+"\n" if pmid is not None else wos_id+":"+citation+"\n")
+                csv_file.write('\"'+re.sub(r'[,\n\r]','',line)+'\",'+wos_id+','+citation+','+(pmid if pmid is not None else 'NA')+','+str(rank)+','+score+"\n")
+solr.close()
+conn.close()
@@ -0,0 +1,64 @@
+# This is a shared SOLR client for mass_solr_search.py, solr_search.py and solr_indexer.py
+# One persistent HTTP session (keep-alive connection pool) serves all requests, several of them in flight at once.
+# Results are read in SOLR's JSON response format. Scores are kept as the text SOLR returns.
+
+import concurrent.futures as cf
+import json
+import requests
+import requests.adapters
+
+
+class SolrClient:
+    def __init__(self, ip_and_port, core, jobs=8, timeout=60):
+        self.base_url = 'http://%s/solr/%s' % (ip_and_port, core)
+        self.jobs = jobs
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=jobs, max_retries=3)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def fields(self):
+        # The CSV header of an empty result lists all fields of the core
+        response = self.session.get(self.base_url + '/select', params={'q': '*:*', 'wt': 'csv', 'rows': 0},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return response.text.rstrip().split(',')
+
+    def select(self, query_string):
+        # query_string: the already escaped parameters of a select request, without wt
+        response = self.session.get(self.base_url + '/select?' + query_string + '&wt=json', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json(parse_float=str)['response']['docs']
+
+    def select_many(self, query_strings):
+        # Output: the docs of every query, in the order of the queries
+        with cf.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return list(executor.map(self.select, query_strings))
+
+    def update(self, docs):
+        # docs: a list of documents (dicts), sent as one JSON update request without committing
+        response = self.session.post(self.base_url + '/update', data=json.dumps(docs, default=str),
+                                     headers={'Content-Type': 'application/json'}, timeout=self.timeout)
+        response.raise_for_status()
+        return len(docs)
+
+    def commit(self):
+        response = self.session.post(self.base_url + '/update', data='{"commit": {}}',
+                                     headers={'Content-Type': 'application/json'}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def field_text(value):
+    # Multi-valued fields are joined, as in SOLR's CSV output
+    if isinstance(value, list):
+        return ','.join(str(item) for item in value)
+    return '' if value is None else str(value)
+
+
+def batches(items, batch_size):
+    for offset in range(0, len(items), batch_size):
+        yield offset, items[offset:offset + batch_size]
@@ -0,0 +1,117 @@
+# This is a parallel bulk indexer of postgres data into a SOLR core, an alternative to a DataImportHandler import
+# Usage:
+#        python solr_indexer.py -c 'core_name' -ip 'solr ip address and port' -t 'table' -i 'id column' -f 'field' [-f 'field' ...]
+#                               [-sql 'sql override'] [-m 'modification timestamp column' [-w 'watermark file'] [-s 'since timestamp']]
+#                               [-d 'database'] [-p 'port'] [-U 'user'] [-j 'concurrent update requests'] [-b 'documents per batch']
+#                               [-ci 'commit interval in seconds']
+# Example:
+#        python solr_indexer.py -c wos_pub_core -ip 10.0.0.5:8983 -t solr_65m_with_vol -i source_id -f citation -m last_updated_time -w wos_pub_core.watermark
+#
+# Rows are read through a server-side (named) cursor, so the result set is never held in memory, and sent to the
+# core's /update handler as JSON batches by several concurrent workers. A batch is only read once a worker is free.
+# The core is committed every commit interval (300 seconds by default, 0 to only commit at the end) and at the end.
+# With -m, only rows modified after the watermark are indexed. The watermark is the -s timestamp, else the one saved in
+# the watermark file by the last successful run; the start time of this run is saved there once it finished.
+# To test, point -ip at a local SOLR or at any HTTP endpoint accepting POSTs to /solr/{core}/update.
+
+import sys; import time
+import concurrent.futures as cf
+import psycopg2
+from solr_client import SolrClient
+
+core=None; ip_and_port='localhost:8983'; table=''; id_tag=''; fields=[]; sql_override=None; modified=None; watermark_file=None; since=None
+database='ernie'; port='5432'; user='ernie_admin'; jobs=4; batch_size=5000; commit_interval=300
+for i in range(0,len(sys.argv)):
+    if sys.argv[i][0] == '-':
+        option = sys.argv[i]
+        if option[1:] in ['core', 'c']:
+            core = sys.argv[i+1]
+        elif option[1:] in ['ip_and_port', 'ip']:
+            ip_and_port = sys.argv[i+1]
+        elif option[1:] in ['table', 't']:
+            table = sys.argv[i+1]
+        elif option[1:] in ['id', 'i']:
+            id_tag = sys.argv[i+1]
+        elif option[1:] in ['field', 'f']:
+            fields += [sys.argv[i+1]]
+        elif option[1:] in ['sql_override', 'sql']:
+            sql_override = sys.argv[i+1]
+        elif option[1:] in ['modified', 'm']:
+            modified = sys.argv[i+1]
+        elif option[1:] in ['watermark_file', 'w']:
+            watermark_file = sys.argv[i+1]
+        elif option[1:] in ['since', 's']:
+            since = sys.argv[i+1]
+        elif option[1:] in ['database', 'd']:
+            database = sys.argv[i+1]
+        elif option[1:] in ['port', 'p']:
+            port = sys.argv[i+1]
+        elif option[1:] in ['user', 'U']:
+            user = sys.argv[i+1]
+        elif option[1:] in ['jobs', 'j']:
+            jobs = int(sys.argv[i+1])
+        elif option[1:] in ['batch_size', 'b']:
+            batch_size = int(sys.argv[i+1])
+        elif option[1:] in ['commit_interval', 'ci']:
+            commit_interval = float(sys.argv[i+1])
+        else:
+            raise NameError('Unknown option : \'%s\''%(option))
+if (core==None) or (id_tag=='') or (len(fields) < 1): raise NameError('Missing critical information - core, id and fields')
+if (table=='') and (sql_override==None): raise NameError('Missing critical information - table or sql override')
+
+# Same source query as the db-data-config.xml of solr_xml_generator.py
+source=table if sql_override==None else "(%s) solr_source"%(sql_override)
+sql="select %s, "%(id_tag)+', '.join(f for f in fields)+" from %s"%(source)
+if modified!=None:
+    if since==None and watermark_file!=None:
+        try:
+            with open(watermark_file) as f:
+                since = f.read().strip() or None
+        except FileNotFoundError:
+            pass
+    if since!=None:
+        sql+=" where %s > %%(since)s"%(modified)
+
+
+def to_doc(row):
+    # Empty (NULL) fields are left out of the document
+    doc = {'id': str(row[0])}
+    for field, value in zip(fields, row[1:]):
+        if value is not None:
+            doc[field] = value
+    return doc
+
+
+solr = SolrClient(ip_and_port, core, jobs, timeout=600)
+conn = psycopg2.connect(host='localhost', port=port, user=user, dbname=database)
+start_time = time.time(); last_commit = start_time; indexed = 0
+try:
+    with conn.cursor() as curs:
+        # Rows changed while the index runs are picked up by the next run
+        curs.execute('select now()')
+        run_started = curs.fetchone()[0]
+    print('Indexing : '+sql+('' if since==None else ' -- since '+since))
+    with conn.cursor(name='solr_indexer') as curs, cf.ThreadPoolExecutor(max_workers=jobs) as executor:
+        curs.execute(sql, {'since': since} if since!=None else None)
+        in_flight = set()
+        while True:
+            rows = curs.fetchmany(batch_size)
+            if not rows:
+                break
+            if len(in_flight) >= jobs:
+                done, in_flight = cf.wait(in_flight, return_when=cf.FIRST_COMPLETED)
+                indexed += sum(future.result() for future in done)
+            in_flight.add(executor.submit(solr.update, [to_doc(row) for row in rows]))
+            if commit_interval > 0 and time.time() - last_commit >= commit_interval:
+                solr.commit(); last_commit = time.time()
+                print('%d documents indexed, %.0f docs/s'%(indexed, indexed/(last_commit-start_time)))
+        indexed += sum(future.result() for future in in_flight)
+    solr.commit()
+finally:
+    conn.close()
+    solr.close()
+elapsed = time.time() - start_time
+print('%d documents indexed in %.1f s, %.0f docs/s'%(indexed, elapsed, indexed/elapsed if elapsed > 0 else 0))
+if modified!=None and watermark_file!=None:
+    with open(watermark_file, 'w') as f:
+        f.write(run_started.isoformat()+'\n')
@@ -1,19 +1,23 @@
 # This is an updated generalized script to search a core on a SOLR server for matches based on several search criteria
 # Usage:
 #        python mass_solr_search.py -c 'core_name' -qf 'query_field' -q|-f 'query or file' -ip 'solr ip address and port' -n 'number of solr results' -o 'output file name'
+#                                   [-j 'concurrent queries'] [-b 'queries per batch']
 # Example 1:
 #        python mass_solr_search.py -c wos_pub_core -qf citation -q "DNA microarray" -ip 10.0.0.5:8983 -n 10 -o dna_microarray.csv
 # Example 2:
 #        python mass_solr_search.py -c wos_pub_core -qf citation -f pirrung.txt -ip 10.0.0.5:8983 -n 5 -o pirrung.csv
+# Queries run in batches over one persistent SOLR session (see solr_client.py).
 # Author: VJ Davey
 
 
 
 
-import sys; import string; import re ; import subprocess; import pandas as pd
+import sys; import re; import pandas as pd
+from solr_client import SolrClient, field_text, batches
 
 # Collect user input
 query=None; core=None; query_fields=[]; target_fields=[]; search_file=None; num_results=10; ip_and_port='localhost:8983' ; psql_ip='localhost' ; psql_port='5432'; output_file='temp.csv';
+jobs=8; batch_size=500
 for i in range(0,len(sys.argv)):
     if sys.argv[i][0] == '-':
         option = sys.argv[i]
@@ -41,25 +45,28 @@ for i in range(0,len(sys.argv)):
             psql_ip = sys.argv[i+1]
         elif option[1:] in ['psql_port', 'pp']:
             psql_port = sys.argv[i+1]
+        elif option[1:] in ['jobs', 'j']:
+            jobs = int(sys.argv[i+1])
+        elif option[1:] in ['batch_size', 'b']:
+            batch_size = int(sys.argv[i+1])
         else:
             raise NameError('Unknown option : \'%s\''%(option))
 if (core==None): raise NameError('Missing critical information - core')
+solr = SolrClient(ip_and_port, core, jobs)
 
 
 # Set up for the queries. If the user has not specified any fields for the query, check the core for all fields, return a comma seperated list, and use those returned fields for the dismax query
-field_collector_string="curl \'http://%s/solr/%s/select?&q=\"*:*\"&wt=csv&rows=0\'"%(ip_and_port, core)
-fields=subprocess.check_output(field_collector_string, shell=True).rstrip().split(","); fields.remove('id') ; fields=fields if len(query_fields) < 1 else query_fields
+fields=solr.fields(); fields.remove('id') ; fields=fields if len(query_fields) < 1 else query_fields
 fields=[i for i in fields if i not in target_fields]
 #TODO: In future, make sure this is adjustable for weight
 field_list_string1='%20'.join(fields)
 field_list_string2=','.join(['id','score']+target_fields+fields)
-curl_search_string="curl \'http://%s/solr/%s/select?defType=dismax&qf=%s&fl=%s&q=:"%(ip_and_port, core, field_list_string1,field_list_string2)
-curl_search_string_ending='&rows=%s&wt=csv&csv.separator=~\''%(num_results)
+search_string="defType=dismax&qf=%s&fl=%s&q=:"%(field_list_string1,field_list_string2)
+search_string_ending='&rows=%s'%(num_results)
 
 
 # Some manual settings. Removal of useless stem words and such. Edit as needed
 stem_words=['\' et al. \'', '\' the \'', '\' a \'']
-query_no=1; match=0; top_10_match=0
 queries=[]; expected_ids=[]; true_status=[]
 if search_file!=None:
     query_sheet=pd.read_csv(search_file)
@@ -70,17 +77,25 @@ if search_file!=None:
 
 else:
     queries.append(query)
+    # A single query has no expected result
+    expected_ids.append(''); true_status.append('')
 
 # The actual run. Return results on the query. Hardcode any mapping to other DB information as needed if dealing with something like a WOS to PMID mapping
-with open(output_file, 'wb') as csv_file:
+with open(output_file, 'w', newline='') as csv_file:
     csv_file.write(','.join(['query','expected_id','result_id','status','solr_score','rank']+target_fields+fields)+'\n')
-    for index in range(0,len(queries)):
-        line=queries[index]; print '### Query No. %d ###'%(query_no); query_no+=1; line=(line.decode('utf-8','ignore')).encode('ascii','ignore')
-        input_string=re.sub('|'.join(stem_words),'',line); input_string=re.sub(r'[,.{}<>\"\'\n\r]','',input_string) ; input_string=re.sub(r'[^0-9a-zA-Z]+','\\+',input_string) ; input_string=re.sub(r'\u+2260','',input_string)
-        query_string=curl_search_string+input_string+curl_search_string_ending
-        s = subprocess.check_output(query_string, shell=True) ; s=s.replace('\\n','') ;s=s.split("\n")
-        print 'Search : '+line ; print 'Generated Query : '+query_string
+    for offset, batch in batches(queries, batch_size):
+        lines=[line.encode('ascii','ignore').decode('ascii') for line in batch]
+        query_strings=[]
+        for line in lines:
+            input_string=re.sub('|'.join(stem_words),'',line); input_string=re.sub(r'[,.{}<>\"\'\n\r]','',input_string) ; input_string=re.sub(r'[^0-9a-zA-Z]+','\\+',input_string) ; input_string=re.sub(r'u+2260','',input_string)
+            query_strings.append(search_string+input_string+search_string_ending)
+        results = solr.select_many(query_strings)
 
-        for result in s[1:-1]:
-            result_list=result.split('~'); doc_id=result_list[0]; score=result_list[1]; others=['\"'+re.sub(r'[\"]','',i[:32700])+'\"' for i in result_list[2:]]
-            csv_file.write('\"'+re.sub(r'[,\n\r]','',line)+'\",\"'+expected_ids[index]+'\",\"'+doc_id+'\",\"'+true_status[index]+'\",'+score+','+str(s.index(result))+','+','.join(others)+"\n")
+        for index, (line, query_string, docs) in enumerate(zip(lines, query_strings, results), start=offset):
+            print('### Query No. %d ###'%(index+1))
+            print('Search : '+line) ; print('Generated Query : '+query_string)
+            for rank, doc in enumerate(docs, start=1):
+                doc_id=field_text(doc.get('id')); score=field_text(doc.get('score'))
+                others=['\"'+re.sub(r'[\"\n]','',field_text(doc.get(field))[:32700])+'\"' for field in target_fields+fields]
+                csv_file.write('\"'+re.sub(r'[,\n\r]','',line)+'\",\"'+str(expected_ids[index])+'\",\"'+doc_id+'\",\"'+str(true_status[index])+'\",'+score+','+str(rank)+','+','.join(others)+"\n")
+solr.close()
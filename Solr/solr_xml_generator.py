@@ -1,8 +1,16 @@
 ## This script will be used to generate xml data that will allow postgres data to be indexed in solr ##
+# Usage:
+#        python solr_xml_generator.py -t 'table' -i 'id column' -f 'field' [-f 'field' ...] -d 'database' -p 'port' -U 'user' -W 'password'
+#                                     [-sql 'sql override'] [-m 'modification timestamp column']
+# With -m, the DataImportHandler entity also gets delta-import queries: a delta-import (/dataimport?command=delta-import)
+# only reindexes the rows whose modification timestamp is past the last index time DIH keeps in dataimport.properties.
+# With -sql, the override query has to return the id, field and modification timestamp columns.
+# For a parallel bulk (re)index outside of DIH, see solr_indexer.py
 
 import sys; import re; import subprocess
+from xml.sax.saxutils import quoteattr
 
-table='';database='';port='';user='';id_tag='';password='';fields=[]; sql_override=None;
+table='';database='';port='';user='';id_tag='';password='';fields=[]; sql_override=None; modified=None;
 for i in range(0,len(sys.argv)):
     if sys.argv[i][0]=='-':
         option=sys.argv[i]
@@ -22,6 +30,8 @@ for i in range(0,len(sys.argv)):
             password=sys.argv[i+1]
         elif option[1:] in ['sql_override','sql']:
             sql_override=sys.argv[i+1]
+        elif option[1:] in ['modified','m']:
+            modified=sys.argv[i+1]
 
 # create injection code for db-data-config
 db_config_xml_front_end='''
@@ -34,9 +44,19 @@ db_config_xml_front_end='''
   <document>\n
 '''%(port,database,user,password)
 sql="select %s, "%(id_tag)+', '.join(f for f in fields)+" from %s"%(table) if sql_override==None else sql_override
+# The delta query finds the ids changed since the last import, the delta import query then fetches each of those rows
+entity_attributes='query=%s'%(quoteattr(sql))
+if modified!=None:
+    source=table if sql_override==None else "(%s) solr_source"%(sql_override)
+    delta_query="select %s from %s where %s > '${dataimporter.last_index_time}'"%(id_tag,source,modified)
+    delta_import_query="select %s, "%(id_tag)+', '.join(f for f in fields)+" from %s where %s = '${dataimporter.delta.%s}'"%(source,id_tag,id_tag)
+    entity_attributes+='''
+            pk=%s
+            deltaQuery=%s
+            deltaImportQuery=%s'''%(quoteattr(id_tag),quoteattr(delta_query),quoteattr(delta_import_query))
 db_config_xml_fields='''
     <entity name="id"
-            query="'''+sql+'''">\n'''
+            '''+entity_attributes+'''>\n'''
 db_config_xml_fields+='''    <field column="%s" name="id"/>\n'''%(id_tag)
 db_config_xml_fields+='\n'.join(['''    <field column="%s" name="%s"/>'''%(f,f) for f in fields])
 db_config_xml_backend='''
@@ -45,15 +65,15 @@ db_config_xml_backend='''
 </dataConfig>
 '''
 db_config_xml=db_config_xml_front_end+db_config_xml_fields+db_config_xml_backend
-#print db_config_xml
-with open('db-data-config.xml','wb') as db_file:
+#print(db_config_xml)
+with open('db-data-config.xml','w') as db_file:
     db_file.write(db_config_xml)
 
 # create injection code for managed-schema
 managed_schema_xml='''   <field name="id" type="string" indexed="true" stored="true" required="true" multiValued="false" />\n'''
 managed_schema_xml+='\n'.join(['''   <field name="%s" type="text_general" indexed="true" stored="true" />'''%(f) for f in fields])
-#print managed_schema_xml
+#print(managed_schema_xml)
 managed_xml=open('managed-schema-temp').read()
 managed_xml=re.sub(r'#INSERT_FIELDS#',managed_schema_xml,managed_xml)
-with open('managed-schema', 'wb') as ms:
+with open('managed-schema', 'w') as ms:
     ms.write(managed_xml)
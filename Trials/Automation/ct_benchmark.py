@@ -0,0 +1,272 @@
+# coding=utf-8
+
+'''
+Benchmark harness for the Clinical Trials (CT) ETL: parser.py and ct_xml_update_parser.py
+
+Usage: python ct_benchmark.py [-p profile ...] [-m mode ...] [-c corpus_dir] [-o output.json] [-l {insert,copy}] [-f fetch_size] [-s seed]
+
+A synthetic corpus is generated from the content model in Trials/Miscellaneous/public.dtd. Every element the DTD allows is
+emitted; how often optional and repeating elements occur depends on the profile. The study_design_info and results outcome
+blocks of the current public.xsd, which parser.py reads but the retired DTD lacks, are added to every study.
+    small          minimal studies, optional elements mostly absent and repeating ones at most once, with one complete
+                   location and outcome
+    median         typical studies with a handful of conditions, interventions, officials and locations
+    pathological   median studies with a huge location list (tens of thousands of locations with investigators)
+
+Modes, each run in a fresh process so that its peak RSS is its own:
+    parse      consume parser.iter_rows() for every study, opened by ct_xml_update_parser.open_study() as the loader opens it
+    serialize  parse and write the rows into COPY text buffers as ct_xml_update_parser.py does
+    load       parse and load through ct_xml_update_parser.parse_and_load() into a scratch schema that is dropped afterwards.
+               The connection comes from the libpq PG* environment variables, as for the loader; point them at a throwaway database.
+    check      parse every study from its file name, an open file and a zip member, and fail unless the rows are the same
+
+Results (docs/s, rows/s per ct_* table and peak RSS per profile and mode) are written to a JSON file to track regressions.
+'''
+from lxml import etree
+import argparse
+import datetime
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import re
+import resource
+import time
+import zipfile
+import parser
+
+DTD_FILE=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','Miscellaneous','public.dtd')
+DDL_FILE=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','Postgres','DDL','ct_ddl.sql')
+
+# Number of studies per profile, the probability of an optional element and the (min,max) count of repeating elements.
+# 'counts' overrides the count range for specific repeating elements, 'present' lists optional elements always emitted.
+PROFILES={
+    'small':{'docs':500,'optional':0.3,'repeat':(0,1),'counts':{'location':(1,1),'outcome':(1,1)},
+             'present':{'facility','name','address','zip'}},
+    'median':{'docs':500,'optional':0.8,'repeat':(1,4),'counts':{'location':(5,30),'investigator':(0,2),'keyword':(2,8),'mesh_term':(1,6)}},
+    'pathological':{'docs':3,'optional':0.8,'repeat':(1,4),'counts':{'location':(20000,30000),'investigator':(1,3),'keyword':(2,8),'mesh_term':(1,6)}}}
+MODES=['parse','serialize','load','check']
+
+##### Synthetic study generator
+WORDS=['acute','adult','cancer','cell','chronic','clinical','control','disease','dose','drug','effect','efficacy','health',
+    'heart','infection','insulin','patient','phase','placebo','pressure','randomized','safety','study','therapy','treatment',
+    'trial','tumor','vaccine','virus','weight']
+FIRST_NAMES=['Anna','David','Maria','James','Li','Fatima','John','Olga','Raj','Sara']
+LAST_NAMES=['Smith','Garcia','Chen','Kumar','Novak','Okafor','Schmidt','Tanaka','Rossi','Johnson']
+COUNTRIES=['United States','Canada','France','Germany','China','Japan','Brazil','India']
+# Text for elements whose values are typed columns in ct_ddl.sql or drive the parser's name splitting
+BOOLEAN_ELEMENTS={'has_dmc','is_fda_regulated','is_section_801','has_expanded_access','gender_based','healthy_volunteers'}
+INTEGER_ELEMENTS={'number_of_arms','number_of_groups','enrollment','PMID'}
+# public.xsd blocks read by parser.py that the DTD does not declare, and their child elements
+STUDY_DESIGN_INFO_ELEMENTS=['allocation','intervention_model','intervention_model_description','primary_purpose',
+    'observational_model','time_perspective','masking','masking_description']
+OUTCOME_ELEMENTS=['type','title','description','time_frame','population']
+
+def _words(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+def _text(name, rng, nct_id):
+    if name=='nct_id':
+        return nct_id
+    if name in BOOLEAN_ELEMENTS:
+        return rng.choice(['Yes','No'])
+    if name in INTEGER_ELEMENTS:
+        return str(rng.randint(1,100000))
+    if name=='last_name':
+        # full names with degrees, as the parser splits them into first/middle/last name and degrees
+        return ' '.join([rng.choice(FIRST_NAMES)]+[rng.choice('ABCDEFGH')]*rng.randint(0,1)+[rng.choice(LAST_NAMES)])+rng.choice(['',', MD',', PhD'])
+    if name=='country':
+        return rng.choice(COUNTRIES)
+    if name=='type':
+        return rng.choice(['Primary','Secondary','Other Pre-specified'])
+    if name=='textblock':
+        return _words(rng, 20, 200)
+    if name.endswith('_date'):
+        return '{} {}'.format(rng.choice(['January','April','July','October']), rng.randint(1999,2020))
+    return _words(rng, 1, 6)
+
+# Number of times a content particle occurs under the profile, per its DTD occurrence indicator
+def _occurrences(particle, profile, rng):
+    if particle.occur=='once':
+        return 1
+    if particle.occur=='opt':
+        return int(particle.name in profile.get('present',()) or rng.random()<profile['optional'])
+    low, high=profile['counts'].get(particle.name, profile['repeat'])
+    return rng.randint(max(low, 1 if particle.occur=='plus' else 0), max(high, 1 if particle.occur=='plus' else 0))
+
+def _add_content(parent, particle, declarations, profile, rng, nct_id):
+    for _ in range(_occurrences(particle, profile, rng)):
+        if particle.type=='element':
+            _add_element(parent, declarations[particle.name], declarations, profile, rng, nct_id)
+        elif particle.type=='seq':
+            _add_content(parent, particle.left, declarations, profile, rng, nct_id)
+            _add_content(parent, particle.right, declarations, profile, rng, nct_id)
+        elif particle.type=='or':
+            _add_content(parent, rng.choice([particle.left, particle.right]), declarations, profile, rng, nct_id)
+
+def _add_element(parent, declaration, declarations, profile, rng, nct_id):
+    element=etree.SubElement(parent, declaration.name)
+    for attribute in declaration.attributes():
+        if attribute.default!='implied' or rng.random()<profile['optional']:
+            element.set(attribute.name, str(rng.randint(1,1000)) if attribute.name=='rank' else rng.choice(['Actual','Anticipated']))
+    if declaration.type=='mixed':
+        element.text=_text(declaration.name, rng, nct_id)
+    elif declaration.type=='element':
+        _add_content(element, declaration.content, declarations, profile, rng, nct_id)
+    return element
+
+def generate_study(dtd, nct_id, profile, rng):
+    declarations={declaration.name:declaration for declaration in dtd.iterelements()}
+    root=etree.Element('clinical_study')
+    for attribute in declarations['clinical_study'].attributes():
+        root.set(attribute.name, str(rng.randint(1,1000)))
+    _add_content(root, declarations['clinical_study'].content, declarations, profile, rng, nct_id)
+    return etree.ElementTree(root)
+
+# Add the public.xsd blocks of STUDY_DESIGN_INFO_ELEMENTS and OUTCOME_ELEMENTS, once the DTD part of the study validated.
+# The elements of the ct_outcomes key (type, title, time_frame) are always emitted.
+def add_xsd_blocks(study, profile, rng, nct_id):
+    root=study.getroot()
+    study_design_info=etree.Element('study_design_info')
+    for name in STUDY_DESIGN_INFO_ELEMENTS:
+        if rng.random()<profile['optional']:
+            etree.SubElement(study_design_info, name).text=_text(name, rng, nct_id)
+    root.find('study_design').addnext(study_design_info)
+    outcome_list=etree.SubElement(etree.SubElement(root, 'clinical_results'), 'outcome_list')
+    low, high=profile['counts'].get('outcome', profile['repeat'])
+    for _ in range(rng.randint(low, high)):
+        outcome=etree.SubElement(outcome_list, 'outcome')
+        for name in OUTCOME_ELEMENTS:
+            if name in ('type','title','time_frame') or rng.random()<profile['optional']:
+                etree.SubElement(outcome, name).text=_text(name, rng, nct_id)
+    return study
+
+# Write the studies of a profile into corpus_dir/<profile>/NCT*.xml unless they are already there, and return the file names
+def generate_corpus(corpus_dir, profile_name, seed):
+    profile=PROFILES[profile_name]
+    profile_dir=os.path.join(corpus_dir, profile_name)
+    xml_files=[os.path.join(profile_dir,'NCT{:08d}.xml'.format(doc)) for doc in range(profile['docs'])]
+    if all(os.path.exists(xml_file) for xml_file in xml_files):
+        return xml_files
+    os.makedirs(profile_dir, exist_ok=True)
+    dtd=etree.DTD(DTD_FILE); rng=random.Random('{}-{}'.format(seed, profile_name))
+    for doc, xml_file in enumerate(xml_files):
+        study=generate_study(dtd, 'NCT{:08d}'.format(doc), profile, rng)
+        if not dtd.validate(study):
+            raise ValueError("Generated study {} does not validate against {}: {}".format(xml_file, DTD_FILE, dtd.error_log.filter_from_errors()))
+        add_xsd_blocks(study, profile, rng, 'NCT{:08d}'.format(doc))
+        study.write(xml_file, xml_declaration=True, encoding='UTF-8', pretty_print=True)
+    return xml_files
+
+##### Benchmark modes. Each returns the rows per table.
+def bench_parse(xml_files, options):
+    import ct_xml_update_parser
+    rows=dict.fromkeys(parser.CT_TABLES, 0)
+    for xml_file in xml_files:
+        with ct_xml_update_parser.open_study(xml_file) as study:
+            for table, row in parser.iter_rows(study):
+                rows[table]+=1
+    return rows
+
+def bench_serialize(xml_files, options):
+    import ct_xml_update_parser
+    rows=dict.fromkeys(parser.CT_TABLES, 0)
+    for offset in range(0, len(xml_files), options['fetch_size']):
+        job_dict={}
+        for xml_file in xml_files[offset:offset+options['fetch_size']]:
+            with ct_xml_update_parser.open_study(xml_file) as study:
+                for table, row in parser.iter_rows(study):
+                    ct_xml_update_parser.copy_row(None, job_dict, table, row)
+                    rows[table]+=1
+    return rows
+
+# Create the ct_* tables in a scratch schema (tablespaces stripped) that the loader's connections reach through PGOPTIONS
+def bench_load(xml_files, options):
+    import psycopg2
+    import ct_xml_update_parser
+    schema='ct_benchmark_{}'.format(os.getpid())
+    with open(DDL_FILE) as ddl_file:
+        ddl=re.sub(r'\s+(USING INDEX )?TABLESPACE \w+', '', ddl_file.read())
+    conn=psycopg2.connect("")
+    conn.autocommit=True
+    curs=conn.cursor()
+    curs.execute("CREATE SCHEMA {0}; SET search_path TO {0};".format(schema))
+    try:
+        curs.execute(ddl)
+        os.environ['PGOPTIONS']='-c search_path={}'.format(schema)
+        ct_xml_update_parser.parse_and_load(0, xml_files, options['loader'], options['fetch_size'])
+        rows={}
+        for table in parser.CT_TABLES:
+            curs.execute("SELECT count(1) FROM {};".format(table))
+            rows[table]=curs.fetchone()[0]
+        return rows
+    finally:
+        curs.execute("DROP SCHEMA {} CASCADE;".format(schema))
+        conn.close()
+
+# ct_xml_update_parser.py hands iter_rows() open files and zip members rather than file names
+def bench_check(xml_files, options):
+    rows=dict.fromkeys(parser.CT_TABLES, 0)
+    for xml_file in xml_files:
+        expected=list(parser.iter_rows(xml_file))
+        member_name=os.path.basename(xml_file)
+        archive=io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(xml_file, member_name)
+        with open(xml_file, 'rb') as study, zipfile.ZipFile(archive) as zip_file, zip_file.open(member_name) as member:
+            for source, study_input in [('open file', study), ('zip member', member)]:
+                if list(parser.iter_rows(study_input))!=expected:
+                    raise ValueError("Rows of {} read as {} differ from those read by file name".format(xml_file, source))
+        for table, row in expected:
+            rows[table]+=1
+    return rows
+
+BENCHMARKS={'parse':bench_parse, 'serialize':bench_serialize, 'load':bench_load, 'check':bench_check}
+
+# Run one profile and mode in the current (fresh) process. ru_maxrss is in kilobytes on Linux.
+def run_case(profile_name, mode, xml_files, options):
+    start_time=time.time()
+    rows=BENCHMARKS[mode](xml_files, options)
+    seconds=time.time()-start_time
+    return {'profile':profile_name, 'mode':mode, 'docs':len(xml_files), 'bytes':sum(os.path.getsize(xml_file) for xml_file in xml_files),
+            'seconds':seconds, 'docs_per_sec':len(xml_files)/max(seconds,1e-9), 'rows':sum(rows.values()),
+            'rows_per_sec':sum(rows.values())/max(seconds,1e-9),
+            'tables':{table:{'rows':count, 'rows_per_sec':count/max(seconds,1e-9)} for table, count in rows.items()},
+            'peak_rss_kb':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='''
+     This script benchmarks CT parsing and loading on a synthetic corpus generated from public.dtd and writes the results as JSON.
+    ''', formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument('-p','--profiles',help='Study profiles to run (default: all)',nargs='+',choices=sorted(PROFILES.keys()),default=list(PROFILES.keys()))
+    arg_parser.add_argument('-m','--modes',help='parse: parser only\nserialize: parse and write COPY buffers\nload: parse and load into a scratch schema\ncheck: compare rows read from files, open files and zip members\n(default: parse serialize check)',
+                            nargs='+',choices=MODES,default=['parse','serialize','check'])
+    arg_parser.add_argument('-c','--corpus_dir',help='Directory holding the generated corpus, reused across runs',type=str,default='ct_benchmark_corpus')
+    arg_parser.add_argument('-o','--output',help='JSON results file',type=str,default='ct_benchmark.json')
+    arg_parser.add_argument('-l','--loader',help='Loader used by the load mode',choices=['insert','copy'],default='copy')
+    arg_parser.add_argument('-f','--fetch_size',help='Number of XML files per chunk in the serialize and load modes',type=int,default=500)
+    arg_parser.add_argument('-s','--seed',help='Seed of the corpus generator',type=int,default=0)
+    args = arg_parser.parse_args()
+
+    options={'loader':args.loader, 'fetch_size':args.fetch_size}
+    results={'started':datetime.datetime.now().isoformat(), 'python':platform.python_version(),
+             'lxml':'.'.join(str(part) for part in etree.LXML_VERSION), 'options':dict(options, seed=args.seed), 'cases':[]}
+    # A fresh process per case, so that peak RSS is not carried over from the previous case
+    context=mp.get_context('spawn')
+    for profile_name in args.profiles:
+        print("Generating {} corpus in {} ...".format(profile_name, args.corpus_dir))
+        xml_files=generate_corpus(args.corpus_dir, profile_name, args.seed)
+        for mode in args.modes:
+            with context.Pool(1) as pool:
+                case=pool.apply(run_case, (profile_name, mode, xml_files, options))
+            print("{profile:>12} {mode:>9}: {docs} docs in {seconds:.2f} s, {docs_per_sec:.1f} docs/s, {rows_per_sec:.0f} rows/s, peak RSS {peak_rss_kb} kB".format(**case))
+            empty=[table for table, table_case in case['tables'].items() if table_case['rows']==0]
+            if empty:
+                print("{:>23} no rows for {}".format('', ', '.join(empty)))
+            results['cases'].append(case)
+
+    with open(args.output,'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
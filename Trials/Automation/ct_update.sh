@@ -11,7 +11,7 @@ SYNOPSIS
 DESCRIPTION
   1. Download data source from website.
   2. Unzip to get XML files.
-  3. Run in parallel with 4 jobs: parse each XML and directly load into main tables.
+  3. Run in parallel with one worker process per core: parse each XML and directly load into main tables.
   4. Update tables.
   5. Write to log.
 
@@ -48,9 +48,10 @@ ${absolute_script_dir}/download_updates.sh
 # echo "Unzipping CT data ..."
 unzip -q CT_all.zip
 
-# Process the data - multiprocessing library used in python along with shared memory objects to allow for creation of SQL upsert strings based on multiple XML files
+# Process the data - parsed rows of multiple XML files are streamed via COPY into per-connection staging tables and merged into the ct_* tables
+# Studies whose XML is unchanged since the last run (per ct_study_hashes) are skipped
 echo "Loading files in parallel from work dir: ${work_dir}..."
-/anaconda3/bin/python ${absolute_script_dir}/ct_xml_update_parser.py <(find ${work_dir}/nct_files/ | grep "nct_files/NCT.*\.xml")
+/anaconda3/bin/python ${absolute_script_dir}/ct_xml_update_parser.py --loader copy --incremental <(find ${work_dir}/nct_files/ | grep "nct_files/NCT.*\.xml")
 
 # Update the log table
 echo "***UPDATING LOG TABLE"
@@ -3,7 +3,18 @@
 '''
 This parser extracts Clinical Trial (CT) data from provided XML and directly populates SQL tables
 
-Usage: python ct_xml_update_parser.py {files}
+Usage: python ct_xml_update_parser.py [-l {insert,copy,csv}] [-c csv_dir] [-w workers] [-f fetch_size] [-i] {source}
+
+The source is a file listing XML files one per line, a directory of XML files or a zip of XML files. The studies are split
+into one shard per worker process (one per core by default), each with its own connection.
+With -i only studies that are new or whose XML changed since the last load (per ct_study_hashes) are parsed and upserted.
+
+Loader modes:
+    insert  build one INSERT ... VALUES ... ON CONFLICT DO UPDATE statement per table per chunk of files
+    copy    stream the rows of each table through COPY ... FROM STDIN into a session-local stg_ct_* temp table,
+            then merge the chunk into the ct_* table with a single set-based INSERT ... SELECT ... ON CONFLICT DO UPDATE
+    csv     write one consolidated <table>.csv per ct_* table into csv_dir, in the table's column layout with a header row,
+            plus a ct_load.pg psql script that copies them into the tables. No database connection is made.
 
 Author: VJ Davey
 Create Date: 06/14/2018
@@ -11,72 +22,264 @@ Modified:
 '''
 import psycopg2
 import psycopg2.extensions
+import argparse
+import csv
 import datetime
+import glob
+import os
+import shutil
+import zipfile
+import hashlib
+import io
 import re
 import sys
 import parser
 import multiprocessing as mp
-import threading as thr
-
-# Each thread gets its own postgres connection. The file holding the list of XML files is a shared resource. Pop a number of files off the stack and process until no more remain.
-def parse_and_load(xml_file_list,lock,fetch_size=500):
-    # Open and configure a PostgreSQL connection for each thread
-    conn=psycopg2.connect("")
-    conn.set_client_encoding('UTF8')
-    conn.autocommit=True
-    curs=conn.cursor()
-
-    # Acquire thread lock and pop a number of XML files off the stack
-    lock.acquire()
-    file_list_chunk=[xml_file_list.readline().rstrip('\n') for line in range(fetch_size)]#pop a number of files off the stack
-    file_list_chunk=[i for i in file_list_chunk if i!='']
-    lock.release()
-
-    # While there are a number of files left to process, process those files, build PostgreSQL bulk insert queries, and execute those queries
-    while len(file_list_chunk)>0:
-        job_dict = {'counter':0, 'columns':{}, 'pkeys':{}}
+import concurrent.futures as cf
+import time
+import traceback
+
+# Escape a value for the text format of COPY. The 'NULL' placeholders produced by the parser become real NULLs just as they do in the insert mode.
+def copy_text(value):
+    if value is None or value=='NULL':
+        return '\\N'
+    return value.replace('\\','\\\\').replace('\t','\\t').replace('\n','\\n').replace('\r','\\r')
+
+# Add a row of a parsed file to the VALUES list of its table
+def insert_row(curs, job_dict, table, row):
+    job_dict.setdefault(table,[]).append(curs.mogrify("("+("%s,"*(len(row)-1))+"%s" +")", row).decode('utf-8'))
+
+def insert_load(curs, job_dict):
+    for table in job_dict['columns'].keys():
+        curs.execute("INSERT INTO {}({}) VALUES {} ON CONFLICT({}) DO UPDATE SET {};".format(
+                                            table,
+                                            ",".join(job_dict['columns'][table]),
+                                            ",".join(job_dict[table]),
+                                            ",".join(job_dict['pkeys'][table]),
+                                            ",".join(["{} = EXCLUDED.{}".format(column,column) for column in job_dict['columns'][table]])
+                                            ).replace("\'NULL\'","NULL"))
+
+# Write a row of a parsed file into the COPY text buffer of its table
+def copy_row(curs, job_dict, table, row):
+    job_dict.setdefault(table,io.StringIO()).write("\t".join(copy_text(value) for value in row)+"\n")
+
+# Stage each table's buffer in a temp table that lives as long as the connection and is emptied on every commit, then merge it.
+# DISTINCT ON keeps a single row per conflict key when the same study shows up more than once in a chunk.
+def copy_load(curs, job_dict):
+    for table in job_dict['columns'].keys():
+        columns=",".join(job_dict['columns'][table]); pkeys=",".join(job_dict['pkeys'][table])
+        curs.execute("CREATE TEMP TABLE IF NOT EXISTS stg_{0} (LIKE {0}) ON COMMIT DELETE ROWS;".format(table))
+        job_dict[table].seek(0)
+        curs.copy_expert("COPY stg_{}({}) FROM STDIN".format(table,columns), job_dict[table])
+        curs.execute("INSERT INTO {0}({1}) SELECT DISTINCT ON ({2}) {1} FROM stg_{0} ON CONFLICT({2}) DO UPDATE SET {3};".format(
+                                            table,
+                                            columns,
+                                            pkeys,
+                                            ",".join(["{} = EXCLUDED.{}".format(column,column) for column in job_dict['columns'][table]])))
+
+# Write a row of a parsed file into the CSV buffer of its table. Only the 'NULL' placeholders are left unquoted, so that COPY ... CSV reads them as NULLs.
+def csv_row(curs, job_dict, table, row):
+    csv.writer(job_dict.setdefault(table,io.StringIO()),quoting=csv.QUOTE_NONNUMERIC).writerow(None if value=='NULL' else value for value in row)
+
+# Append each table's buffer to the worker's part of the table's CSV file. The parts are consolidated once all workers are done.
+def csv_load(curs, job_dict):
+    for table in job_dict['columns'].keys():
+        with open(os.path.join(job_dict['csv_dir'],'{}.csv.{}'.format(table,job_dict['worker'])),'a',newline='') as part:
+            part.write(job_dict[table].getvalue())
+
+# Concatenate the worker parts into one CSV file per table and write the psql script loading them
+def consolidate_csv(csv_dir):
+    with open(os.path.join(csv_dir,'ct_load.pg'),'w') as load_script:
+        for table in parser.CT_TABLES:
+            parts=sorted(glob.glob(os.path.join(csv_dir,'{}.csv.*'.format(table))))
+            if not parts:
+                continue
+            with open(os.path.join(csv_dir,table+'.csv'),'w',newline='') as table_csv:
+                csv.writer(table_csv).writerow(parser.CT_COLUMNS[table])
+                for part in parts:
+                    with open(part,newline='') as part_csv:
+                        shutil.copyfileobj(part_csv,table_csv)
+                    os.remove(part)
+            load_script.write("\\copy {}({}) FROM '{}' CSV HEADER;\n".format(table,",".join(parser.CT_COLUMNS[table]),os.path.abspath(os.path.join(csv_dir,table+'.csv'))))
+
+LOADERS={'insert':(insert_row,insert_load), 'copy':(copy_row,copy_load), 'csv':(csv_row,csv_load)}
+
+# A study is the path of an XML file or an (archive, member) pair for an XML file inside a zip. Each process opens an archive once.
+ARCHIVES={}
+
+def list_studies(source):
+    if os.path.isdir(source):
+        return sorted(os.path.join(directory,name) for directory,_,names in os.walk(source) for name in names if name.endswith('.xml'))
+    if source.endswith('.zip'):
+        with zipfile.ZipFile(source) as archive:
+            return [(source,name) for name in archive.namelist() if name.endswith('.xml')]
+    with open(source) as to_do_list:
+        return [line.rstrip('\n') for line in to_do_list if line.rstrip('\n')!='']
+
+def open_study(study):
+    if isinstance(study,tuple):
+        archive,member=study
+        if archive not in ARCHIVES:
+            ARCHIVES[archive]=zipfile.ZipFile(archive)
+        return ARCHIVES[archive].open(member)
+    return open(study,'rb')
+
+# Incremental mode: ct_study_hashes holds a content hash per nct_id. The download_date in the required header changes with every
+# download, so it is left out of the hash; everything else has to match for a study to count as unchanged.
+NCT_ID=re.compile(rb'<nct_id>\s*(.*?)\s*</nct_id>',re.S)
+DOWNLOAD_DATE=re.compile(rb'<download_date>.*?</download_date>',re.S)
+CT_STUDY_HASHES_DDL='''CREATE TABLE IF NOT EXISTS ct_study_hashes (
+    nct_id       TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    last_loaded  TIMESTAMP DEFAULT current_timestamp,
+    CONSTRAINT ct_study_hashes_pk PRIMARY KEY (nct_id));'''
+
+def content_hash(xml_file):
+    with open_study(xml_file) as f:
+        content=f.read()
+    nct_id=NCT_ID.search(content)
+    return (nct_id.group(1).decode('utf-8') if nct_id else None, hashlib.md5(DOWNLOAD_DATE.sub(b'',content)).hexdigest())
+
+# Split a chunk of files into those whose study is new or changed since it was last loaded, and count the unchanged ones as skipped
+def filter_unchanged(curs,file_list_chunk,counters):
+    file_hashes={xml_file:content_hash(xml_file) for xml_file in file_list_chunk}
+    curs.execute("SELECT nct_id,content_hash FROM ct_study_hashes WHERE nct_id = ANY(%s);",
+                 ([nct_id for nct_id,_ in file_hashes.values() if nct_id is not None],))
+    loaded_hashes=dict(curs.fetchall())
+    changed_files=[]
+    for xml_file in file_list_chunk:
+        nct_id,file_hash=file_hashes[xml_file]
+        if nct_id is not None and loaded_hashes.get(nct_id)==file_hash:
+            counters['unchanged']+=1
+            continue
+        counters['changed' if nct_id in loaded_hashes else 'new']+=1
+        changed_files.append(xml_file)
+    return changed_files,file_hashes
+
+def record_hashes(curs,study_hashes):
+    if study_hashes:
+        curs.execute("""INSERT INTO ct_study_hashes(nct_id,content_hash) SELECT * FROM unnest(%s::TEXT[],%s::TEXT[])
+                        ON CONFLICT(nct_id) DO UPDATE SET content_hash=EXCLUDED.content_hash, last_loaded=current_timestamp;""",
+                     (list(study_hashes.keys()),list(study_hashes.values())))
+
+# Each worker process gets its own postgres connection and its own shard of the XML files. Process the shard a number of files at a time.
+# Worker entry point. Exceptions such as lxml's XMLSyntaxError can not be pickled back to the parent process, which then only
+# reports the pickling error: they are raised again as a RuntimeError carrying the worker's traceback.
+def parse_and_load(worker,xml_files,loader='insert',fetch_size=500,incremental=False,csv_dir=None):
+    try:
+        return load_files(worker,xml_files,loader,fetch_size,incremental,csv_dir)
+    except Exception:
+        raise RuntimeError(traceback.format_exc()) from None
+
+def load_files(worker,xml_files,loader,fetch_size,incremental,csv_dir):
+    add_row,load=LOADERS[loader]
+    # Open and configure a PostgreSQL connection for each worker. The copy loader needs a transaction per chunk for its staging tables.
+    # The csv loader only writes files.
+    conn=None; curs=None
+    if loader!='csv':
+        conn=psycopg2.connect("")
+        conn.set_client_encoding('UTF8')
+        conn.autocommit=(loader=='insert')
+        curs=conn.cursor()
+    counters={'worker':worker,'files':0,'skipped':0,'rows':0,'seconds':0.0,'new':0,'changed':0,'unchanged':0}
+    start_time=time.time()
+
+    # While there are a number of files left to process, process those files, build PostgreSQL bulk loads, and execute them
+    for offset in range(0,len(xml_files),fetch_size):
+        file_list_chunk=xml_files[offset:offset+fetch_size]
+        job_dict = {'counter':0, 'columns':{}, 'pkeys':parser.CT_CONFLICT_KEYS, 'worker':worker, 'csv_dir':csv_dir}
+        study_hashes={}
+        if incremental:
+            file_list_chunk,file_hashes=filter_unchanged(curs,file_list_chunk,counters)
         for xml_file in file_list_chunk:
             #print("attempting to parse file: {}".format(xml_file)) # uncomment for DEBUG purposes only
-            parsed_info=parser.parse(xml_file)
+            # Rows arrive as tuples already in parser.CT_COLUMNS order, deduplicated and numbered
+            file_rows=0
+            with open_study(xml_file) as study:
+                for table,row in parser.iter_rows(study):
+                    job_dict['columns'].setdefault(table,parser.CT_COLUMNS[table])
+                    add_row(curs, job_dict, table, row)
+                    file_rows+=1
 
-            if parsed_info==None:
-                print("No nct_id found, file %s skipped"%(xml_file))
+            if file_rows==0:
+                print("No nct_id found, file {} skipped".format(xml_file))
+                counters['skipped']+=1
                 continue
-
-            ct_dict=parsed_info[0];job_dict['columns']={table:sorted(ct_dict[table][0].keys()) for table in ct_dict.keys() if ct_dict[table]!=[]}
-            job_dict['pkeys']=parsed_info[1]
-            # For each table in the returned dictionary, mogrify necessary tups and append to dictionary key value following check of key existence
-            for table in job_dict['columns'].keys():
-                tups=[tuple(row[column] for column in job_dict['columns'][table]) for row in ct_dict[table]]
-                if table not in job_dict.keys():
-                    job_dict[table]=",".join([curs.mogrify("("+("%s,"*(len(tup)-1))+"%s" +")", tup).decode('utf-8') for tup in tups])
-                else:
-                    job_dict[table]=",".join([",".join([curs.mogrify("("+("%s,"*(len(tup)-1))+"%s" +")", tup).decode('utf-8') for tup in tups])] + [job_dict[table]] )
+            counters['files']+=1; counters['rows']+=file_rows
+            if incremental and file_hashes[xml_file][0] is not None:
+                study_hashes[file_hashes[xml_file][0]]=file_hashes[xml_file][1]
             #print("parsed file: {}".format(xml_file)) # uncomment for DEBUG purposes only
 
-        for table in job_dict['columns'].keys():
-            curs.execute("INSERT INTO {}({}) VALUES {} ON CONFLICT({}) DO UPDATE SET {};".format(
-                                                table,
-                                                ",".join(job_dict['columns'][table]),
-                                                job_dict[table],
-                                                ",".join(job_dict['pkeys'][table]),
-                                                ",".join(["{} = EXCLUDED.{}".format(column,column) for column in job_dict['columns'][table]])
-                                                ).replace("\'NULL\'","NULL"))
-        conn.commit()
-        lock.acquire()
-        file_list_chunk=[xml_file_list.readline().rstrip('\n') for line in range(fetch_size)]#pop a number of files off the stack
-        file_list_chunk=[i for i in file_list_chunk if i!='']
-        lock.release()
-
-# Set up resources via the multiprocessing Manager dynamically based on the number of machine cores
-lock=thr.Lock()
-with open(sys.argv[1]) as to_do_list:
-    processes=[thr.Thread(target=parse_and_load, args=(to_do_list,lock)) for core in range(4)]
-    print("STARTING CLINICAL TRIAL PARSING WITH {} PARALLEL PROCESSES".format(len(processes)))
-    for p in processes:
-        p.start()
-    for p in processes:
-        p.join()
-
-# Notify process completion
-print("Completed CT parsing at {}...".format(datetime.datetime.now().time()))
+        load(curs, job_dict)
+        if conn is not None:
+            record_hashes(curs, study_hashes)
+            conn.commit()
+        counters['seconds']=time.time()-start_time
+        print("Worker {worker}: {files} files ({rows} rows) loaded in {seconds:.1f} s, {rate:.1f} files/s".format(
+                                            rate=counters['files']/max(counters['seconds'],1e-9), **counters))
+    if conn is not None:
+        conn.close()
+    counters['seconds']=time.time()-start_time
+    return counters
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='''
+     This script parses Clinical Trial XML files and upserts their data into the ct_* tables.
+    ''', formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument('source',help='File holding the list of XML files to load one per line, a directory of XML files or a zip of XML files',type=str)
+    arg_parser.add_argument('-l','--loader',help='insert: VALUES list upserts (default)\ncopy: COPY into temp staging tables and merge set-based\ncsv: write one CSV file per table into csv_dir',
+                            choices=sorted(LOADERS.keys()),default='insert')
+    arg_parser.add_argument('-c','--csv_dir',help='Output directory of the csv loader',type=str)
+    arg_parser.add_argument('-w','--workers',help='Number of parser/loader processes, one per core by default',type=int,default=mp.cpu_count())
+    arg_parser.add_argument('-f','--fetch_size',help='Number of XML files loaded per transaction by a worker',type=int,default=500)
+    arg_parser.add_argument('-i','--incremental',help='Skip studies whose content hash matches the one recorded in ct_study_hashes',action='store_true')
+    args = arg_parser.parse_args()
+    if (args.loader=='csv')!=(args.csv_dir is not None):
+        arg_parser.error('--csv_dir is required by, and only used with, the csv loader')
+    if args.loader=='csv' and args.incremental:
+        arg_parser.error('--incremental needs a database and can not be used with the csv loader')
+
+    xml_files=list_studies(args.source)
+    # Clear parts left over by an earlier run, the workers append to them
+    if args.csv_dir:
+        os.makedirs(args.csv_dir,exist_ok=True)
+        for part in glob.glob(os.path.join(args.csv_dir,'ct_*.csv.*')):
+            os.remove(part)
+
+    if args.incremental:
+        conn=psycopg2.connect("")
+        with conn, conn.cursor() as curs:
+            curs.execute(CT_STUDY_HASHES_DDL)
+        conn.close()
+
+    # Deal the files out round-robin so every worker gets a shard of a similar size and mix
+    workers=max(1,min(args.workers,len(xml_files)))
+    print("STARTING CLINICAL TRIAL PARSING OF {} FILES WITH {} PARALLEL PROCESSES".format(len(xml_files),workers))
+    totals={'files':0,'skipped':0,'rows':0,'new':0,'changed':0,'unchanged':0}; failed=0
+    start_time=time.time()
+    with cf.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures=[executor.submit(parse_and_load, worker, xml_files[worker::workers], args.loader, args.fetch_size, args.incremental, args.csv_dir) for worker in range(workers)]
+        for future in cf.as_completed(futures):
+            try:
+                counters=future.result()
+            except Exception as e:
+                print("Worker failed: {}".format(e)); failed+=1
+                continue
+            print("Worker {worker} finished: {files} files, {skipped} skipped, {rows} rows in {seconds:.1f} s".format(**counters))
+            if args.incremental:
+                print("Worker {worker} studies: {new} new, {changed} changed, {unchanged} unchanged".format(**counters))
+            for key in totals.keys():
+                totals[key]+=counters[key]
+    elapsed=time.time()-start_time
+    print("Loaded {files} files ({rows} rows), skipped {skipped} files in {elapsed:.1f} s, {rate:.1f} files/s".format(
+                                            elapsed=elapsed, rate=totals['files']/max(elapsed,1e-9), **totals))
+    if args.incremental:
+        print("Studies: {new} new, {changed} changed, {unchanged} unchanged and skipped".format(**totals))
+    if args.csv_dir and not failed:
+        consolidate_csv(args.csv_dir)
+        print("CSV files and load script ct_load.pg written to {}".format(args.csv_dir))
+
+    # Notify process completion
+    print("Completed CT parsing at {}...".format(datetime.datetime.now().time()))
+    if failed:
+        sys.exit("{} of {} workers failed".format(failed,workers))
@@ -4,426 +4,387 @@
 This script contains the function parse(), a function uniquely designed for the Clinical Trials ETL for parsing CT XML data.
 This script and those which use it should maintain accordance with the Clinical Trials XML schema here: https://clinicaltrials.gov/ct2/html/images/info/public.xsd
 
+The fields pulled for every table are declared once in the CT_*_FIELDS mappings below (column -> element path) and compiled
+into etree.XPath objects at import time, so a parse() call only evaluates precompiled expressions. Fields of repeating
+blocks (outcomes, interventions, locations, references, ...) are evaluated against the block element itself rather than
+by rescanning a new ElementTree wrapped around each block.
+
+iter_rows() is the streaming counterpart of parse(): it yields the same rows as typed tuples in CT_COLUMNS order.
+
 Author: VJ Davey
 Create Date: 06/14/2018
 Modified:
 '''
 from lxml import etree
+from collections import namedtuple
+import io
 import re
 
 
-# Parse the input file and return a list of lists that contain the data to add to the database
-def parse(input_filename):
-    # Create empty lists to be populated inside a dictionary and also include pkey mappings
-    ct_dict={
-    'ct_clinical_studies':[],'ct_study_design_info':[],'ct_expanded_access_info':[],
-    'ct_secondary_ids':[],'ct_collaborators':[],
-    'ct_outcomes':[],'ct_conditions':[],'ct_arm_groups':[],'ct_interventions':[],
-    'ct_intervention_arm_group_labels':[],'ct_intervention_other_names':[],'ct_overall_officials':[],
-    'ct_overall_contacts':[],'ct_locations':[],'ct_location_investigators':[],'ct_location_countries':[],
-    'ct_links':[],'ct_condition_browses':[],'ct_intervention_browses':[],
-    'ct_references':[],'ct_publications':[],'ct_keywords':[]
-    }
-    ct_pkeys={str(key):[] for key in ct_dict.keys()}
-    # Parse the XML file root and check if the unique ID exists. If not, do not load this file for now.
-    root = etree.parse(input_filename).getroot()
-    nct_id=next(iter(root.xpath("//*[local-name()='id_info']/*[local-name()='nct_id']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    if nct_id is "":
-        return None
-    # Parse XML data of interest to populate variables via xpaths
+# Build a compiled XPath for a slash separated element path, e.g. 'eligibility/criteria/textblock' or 'enrollment/@type'.
+# Document level paths search the whole document ('//'). Block level paths are anchored at the block element with
+# 'descendant-or-self::', which selects exactly what '//' selected when the block was wrapped in its own ElementTree.
+# Steps are plain element name tests; parse() and iter_rows() drop any element namespaces first, so they match what the former
+# "*[local-name()='...']" predicates matched at a fraction of the cost.
+def _xpath(path, scope='//', text=True):
+    steps=path.split('/')
+    attribute=steps.pop() if steps[-1].startswith('@') else None
+    expression=scope+"/".join(steps)
+    if attribute:
+        expression+='/'+attribute
+    elif text:
+        expression+='/text()'
+    return etree.XPath(expression)
+
+def _compile(fields, scope='//'):
+    return [(column, _xpath(path, scope)) for column, path in fields]
+
+# Return the first value selected by a compiled XPath, cleaned for upload, or 'NULL' when nothing matched
+def _first(node, xpath):
+    return _clean(next(iter(xpath(node)),'NULL'))
+
+def _clean(value):
+    return value.strip().replace("'","''").replace("\"","*")
+
+def _extract(node, fields, row):
+    for column, xpath in fields:
+        row[column]=_first(node, xpath)
+    return row
+
+# Split a full name such as 'John Q Public, MD' into first/middle/last name and degrees columns of the given row
+def _split_name(row, full_name, first, middle, last, degrees, separator=None):
+    name_degree_split=full_name.split(',')
+    row[degrees]=_clean(','.join(name_degree_split[1:]))
+    words=name_degree_split[0].split(separator)
+    if len(words) == 1:
+        row[last]=_clean(words[0])
+    elif len(words) == 2:
+        row[first]=_clean(words[0])
+        row[last]=_clean(words[1])
+    elif len(words) > 2:
+        row[first]=_clean(words[0])
+        row[middle]=_clean(words[1])
+        row[last]=_clean(" ".join(words[2:]))
+
+
+##### Declarative table -> column -> path mappings, compiled once per process
+NCT_ID=_xpath('id_info/nct_id')
+CT_CLINICAL_STUDIES_FIELDS=_compile([
+    ('download_date','required_header/download_date'),('link_text','required_header/link_text'),('url','required_header/url'),
+    ('org_study_id','id_info/org_study_id'),('nct_alias','id_info/nct_alias'),
+    ('brief_title','brief_title'),('acronym','acronym'),('official_title','official_title'),
+    ('lead_sponsor_agency','sponsors/lead_sponsor/agency'),('lead_sponsor_agency_class','sponsors/lead_sponsor/agency_class'),
+    ('source','source'),
+    ('has_dmc','oversight_info/has_dmc'),('is_fda_regulated_drug','oversight_info/is_fda_regulated_drug'), #TODO: doublecheck oversight_info blocks
+    ('is_fda_regulated_device','oversight_info/is_fda_regulated_device'),('is_unapproved_device','oversight_info/is_unapproved_device'),
+    ('is_ppsd','oversight_info/is_ppsd'),('is_us_export','oversight_info/is_us_export'),
+    ('brief_summary','brief_summary/textblock'),('detailed_description','detailed_description/textblock'), #TODO: check to see if there are files with multiple textblocks. If so, grab all blocks and join into a single variable. Also maybe introduce SOLR indexing.
+    ('overall_status','overall_status'),('why_stopped','why_stopped'),('start_date','start_date'),
+    ('completion_date','completion_date'),('completion_date_type','completion_date/@type'),
+    ('primary_completion_date','primary_completion_date'),('primary_completion_date_type','primary_completion_date/@type'),
+    ('phase','phase'),('study_type','study_type'),('target_duration','target_duration'),
+    ('number_of_arms','number_of_arms'),('number_of_groups','number_of_groups'),
+    ('enrollment','enrollment'),('enrollment_type','enrollment/@type'),
+    ('biospec_retention','biospec_retention'),('biospec_descr','biospec_descr'),
+    ('study_pop','eligibility/study_pop'),('sampling_method','eligibility/sampling_method'),('criteria','eligibility/criteria/textblock'),
+    ('gender','eligibility/gender'),('gender_based','eligibility/gender_based'),('gender_description','eligibility/gender_description'),
+    ('minimum_age','eligibility/minimum_age'),('maximum_age','eligibility/maximum_age'),('healthy_volunteers','eligibility/healthy_volunteers'),
+    ('verification_date','verification_date'),
+    ('responsible_party_type','responsible_party/responsible_party_type'),
+    ('responsible_investigator_affiliation','responsible_party/investigator_affiliation'),
+    ('responsible_investigator_full_name','responsible_party/investigator_full_name'),
+    ('responsible_investigator_title','responsible_party/investigator_title'),
+    ('has_expanded_access','has_expanded_access'),('disposition_first_submitted','disposition_first_submitted'),
+    ('results_first_submitted','results_first_submitted'),('study_first_submitted','study_first_submitted'),
+    ('last_update_submitted','last_update_submitted')])
+CT_EXPANDED_ACCESS_INFO_FIELDS=_compile([
+    ('expanded_access_type_individual','expanded_access_info/expanded_access_type_individual'),
+    ('expanded_access_type_intermediate','expanded_access_info/expanded_access_type_intermediate'),
+    ('expanded_access_type_treatment','expanded_access_info/expanded_access_type_treatment')])
+RESPONSIBLE_INVESTIGATOR_AFFILIATION=_xpath('responsible_party/investigator_affiliation')
+# Repeating blocks and the fields evaluated inside each block
+STUDY_DESIGN_INFO=_xpath('study_design_info', text=False)
+CT_STUDY_DESIGN_INFO_FIELDS=_compile([
+    ('allocation','allocation'),('intervention_model','intervention_model'),
+    ('intervention_model_description','intervention_model_description'),('primary_purpose','primary_purpose'),
+    ('observational_model','study_design_info/observational_model'),('time_perspective','study_design_info/time_perspective'),
+    ('masking','study_design_info/masking'),('masking_description','study_design_info/masking_description')],'descendant-or-self::')
+COLLABORATOR=_xpath('sponsors/collaborator', text=False)
+CT_COLLABORATORS_FIELDS=_compile([('agency','agency'),('agency_class','agency_class')],'descendant-or-self::')
+OUTCOME=_xpath('outcome_list/outcome', text=False)
+CT_OUTCOMES_FIELDS=_compile([
+    ('outcome_type','type'),('measure','title'),('time_frame','time_frame'),('description','description'),
+    ('population','population')],'descendant-or-self::')
+# Older kind of outcomes, keyed by outcome type. time_frame and description are read from '<type>' and not '<type>_outcome'.
+CT_OUTCOMES_HEADER_FIELDS={outcome_type:_compile([
+    ('measure',outcome_type.lower()+'_outcome/measure'),('time_frame',outcome_type.lower()+'/time_frame'),
+    ('description',outcome_type.lower()+'/description')]) for outcome_type in ['Primary', 'Secondary', 'Other']}
+ARM_GROUP=_xpath('arm_group', text=False)
+CT_ARM_GROUPS_FIELDS=_compile([
+    ('arm_group_label','arm_group_label'),('arm_group_type','arm_group_type'),('description','description')],'descendant-or-self::')
+INTERVENTION=_xpath('intervention', text=False)
+CT_INTERVENTIONS_FIELDS=_compile([
+    ('intervention_type','intervention_type'),('intervention_name','intervention_name'),('description','description')],'descendant-or-self::')
+INTERVENTION_ARM_GROUP_LABELS=_xpath('arm_group_label','descendant-or-self::')
+INTERVENTION_OTHER_NAMES=_xpath('other_name','descendant-or-self::')
+OVERALL_OFFICIAL=_xpath('overall_official', text=False)
+CT_OVERALL_OFFICIALS_FIELDS=_compile([
+    ('first_name','first_name'),('middle_name','middle_name'),('degrees','degrees')],'descendant-or-self::')
+OVERALL_OFFICIAL_LAST_NAME=_xpath('last_name','descendant-or-self::')
+CT_OVERALL_OFFICIALS_ROLE_FIELDS=_compile([('role','role'),('affiliation','affiliation')],'descendant-or-self::')
+CT_OVERALL_CONTACTS_FIELDS={contact_type:(_compile([
+    ('first_name',contact_type+'/first_name'),('middle_name',contact_type+'/middle_name'),
+    ('last_name',contact_type+'/last_name'),('degrees',contact_type+'/degrees')]),_compile([
+    ('phone',contact_type+'/phone'),('phone_ext',contact_type+'/phone_ext'),('email',contact_type+'/email')]))
+    for contact_type in ['overall_contact', 'overall_contact_backup']}
+LOCATION=_xpath('location', text=False)
+CT_LOCATIONS_FIELDS=_compile([
+    ('facility_name','facility/name'),('facility_city','facility/address/city'),('facility_state','facility/address/state'),
+    ('facility_zip','facility/address/zip'),('facility_country','facility/address/country'),('status','status'),
+    ('contact_first_name','contact/first_name'),('contact_middle_name','contact/middle_name'),
+    ('contact_last_name','contact/last_name'),('contact_degrees','contact/degrees')],'descendant-or-self::')
+CT_LOCATIONS_CONTACT_FIELDS=_compile([
+    ('contact_phone','contact/phone'),('contact_phone_ext','contact/phone_ext'),('contact_email','contact/email'),
+    ('contact_backup_full_name','contact_backup/last_name')],'descendant-or-self::')
+CT_LOCATIONS_CONTACT_BACKUP_FIELDS=_compile([
+    ('contact_backup_phone','contact_backup/phone'),('contact_backup_phone_ext','contact_backup/phone_ext'),
+    ('contact_backup_email','contact_backup/email')],'descendant-or-self::')
+INVESTIGATOR=_xpath('investigator','descendant-or-self::',text=False)
+CT_LOCATION_INVESTIGATORS_FIELDS=_compile([
+    ('investigator_first_name','first_name'),('investigator_middle_name','middle_name'),
+    ('investigator_last_name','last_name'),('investigator_degrees','degrees')],'descendant-or-self::')
+INVESTIGATOR_ROLE=_xpath('role','descendant-or-self::')
+LINK=_xpath('link', text=False)
+CT_LINKS_FIELDS=_compile([('url','url'),('description','description')],'descendant-or-self::')
+REFERENCE=_xpath('reference', text=False)
+RESULTS_REFERENCE=_xpath('results_reference', text=False)
+CT_REFERENCES_FIELDS=_compile([('citation','citation'),('pmid','PMID')],'descendant-or-self::')
+# Single text column tables
+SECONDARY_IDS=_xpath('id_info/secondary_id')
+CONDITIONS=_xpath('condition')
+LOCATION_COUNTRIES=_xpath('location_countries/country')
+CONDITION_BROWSE_MESH_TERMS=_xpath('condition_browse/mesh_term')
+INTERVENTION_BROWSE_MESH_TERMS=_xpath('intervention_browse/mesh_term')
+KEYWORDS=_xpath('keyword')
+
+
+##### Tables in load order, their column layouts and their keys
+CT_TABLES=['ct_clinical_studies','ct_study_design_info','ct_expanded_access_info',
+    'ct_secondary_ids','ct_collaborators',
+    'ct_outcomes','ct_conditions','ct_arm_groups','ct_interventions',
+    'ct_intervention_arm_group_labels','ct_intervention_other_names','ct_overall_officials',
+    'ct_overall_contacts','ct_locations','ct_location_investigators','ct_location_countries',
+    'ct_links','ct_condition_browses','ct_intervention_browses',
+    'ct_references','ct_publications','ct_keywords']
+# Columns of each table, sorted
+CT_COLUMNS={
+    'ct_clinical_studies':sorted(['id','nct_id','rank']+[column for column, _ in CT_CLINICAL_STUDIES_FIELDS]),
+    'ct_study_design_info':sorted(['id','nct_id']+[column for column, _ in CT_STUDY_DESIGN_INFO_FIELDS]),
+    'ct_expanded_access_info':sorted(['id','nct_id']+[column for column, _ in CT_EXPANDED_ACCESS_INFO_FIELDS]),
+    'ct_secondary_ids':['id','nct_id','secondary_id'],
+    'ct_collaborators':['agency','agency_class','id','nct_id'],
+    'ct_outcomes':['description','id','measure','nct_id','outcome_type','population','time_frame'],
+    'ct_conditions':['condition','id','nct_id'],
+    'ct_arm_groups':['arm_group_label','arm_group_type','description','id','nct_id'],
+    'ct_interventions':['description','id','intervention_name','intervention_type','nct_id'],
+    'ct_intervention_arm_group_labels':['arm_group_label','id','intervention_name','nct_id'],
+    'ct_intervention_other_names':['id','intervention_name','nct_id','other_name'],
+    'ct_overall_officials':['affiliation','degrees','first_name','id','last_name','middle_name','nct_id','role'],
+    'ct_overall_contacts':['contact_type','degrees','email','first_name','id','last_name','middle_name','nct_id','phone','phone_ext'],
+    'ct_locations':sorted(['id','nct_id','contact_backup_degrees','contact_backup_first_name','contact_backup_middle_name','contact_backup_last_name']
+        +[column for column, _ in CT_LOCATIONS_FIELDS+CT_LOCATIONS_CONTACT_FIELDS+CT_LOCATIONS_CONTACT_BACKUP_FIELDS]),
+    'ct_location_investigators':['id','investigator_affiliation','investigator_degrees','investigator_first_name',
+        'investigator_last_name','investigator_middle_name','investigator_role','nct_id'],
+    'ct_location_countries':['country','id','nct_id'],
+    'ct_links':['description','id','nct_id','url'],
+    'ct_condition_browses':['id','mesh_term','nct_id'],
+    'ct_intervention_browses':['id','mesh_term','nct_id'],
+    'ct_references':['citation','id','nct_id','pmid'],
+    'ct_publications':['citation','id','nct_id','pmid'],
+    'ct_keywords':['id','keyword','nct_id']}
+# Typed rows in column order, e.g. CT_ROWS['ct_keywords'](id='1', keyword='Fluvoxamine', nct_id='NCT00000389')
+CT_ROWS={table:namedtuple(''.join(word.capitalize() for word in table.split('_')), columns) for table, columns in CT_COLUMNS.items()}
+# Primary keys. Rows with a 'NULL' key column are dropped and only the first row per key is kept.
+CT_PKEYS={
+    'ct_clinical_studies':['nct_id'],'ct_study_design_info':['nct_id'],'ct_expanded_access_info':['nct_id'],
+    'ct_secondary_ids':['nct_id','secondary_id'],'ct_collaborators':['nct_id', 'agency'],
+    'ct_outcomes':['nct_id', 'outcome_type', 'measure', 'time_frame'],'ct_conditions':['nct_id', 'condition'],
+    'ct_arm_groups':['nct_id', 'arm_group_label', 'arm_group_type', 'description'],
+    'ct_interventions':['nct_id', 'intervention_type', 'intervention_name', 'description'],
+    'ct_intervention_arm_group_labels':['nct_id', 'intervention_name', 'arm_group_label'],
+    'ct_intervention_other_names':['nct_id', 'intervention_name', 'other_name'],
+    'ct_overall_officials':['nct_id', 'role', 'last_name'],'ct_overall_contacts':['nct_id', 'contact_type', 'last_name'],
+    'ct_locations':['nct_id', 'facility_country', 'facility_city', 'facility_zip', 'facility_name'],
+    'ct_location_investigators':['nct_id', 'investigator_last_name'],'ct_location_countries':['nct_id', 'country'],
+    'ct_links':['nct_id', 'url', 'description'],'ct_condition_browses':['nct_id', 'mesh_term'],
+    'ct_intervention_browses':['nct_id', 'mesh_term'],'ct_references':['nct_id', 'citation'],
+    'ct_publications':['nct_id', 'citation'],'ct_keywords':['nct_id', 'keyword']}
+# Conflict targets for upserts. ct_references is unique on the md5 of the citation.
+CT_CONFLICT_KEYS=dict(CT_PKEYS, ct_references=['nct_id', 'md5(citation)'])
+
+
+def _strip_namespace(element):
+    if '}' in element.tag:
+        element.tag=etree.QName(element).localname
+
+# Yield (table, row) for every row of the study, table by table in the order parse() has always built them
+def _study_rows(root, nct_id):
     row=dict(); row['nct_id']=nct_id
     row['rank']=root.get('rank')
-    row['download_date']=next(iter(root.xpath("//*[local-name()='required_header']/*[local-name()='download_date']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['link_text']=next(iter(root.xpath("//*[local-name()='required_header']/*[local-name()='link_text']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['url']=next(iter(root.xpath("//*[local-name()='required_header']/*[local-name()='url']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['org_study_id']=next(iter(root.xpath("//*[local-name()='id_info']/*[local-name()='org_study_id']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['nct_alias']=next(iter(root.xpath("//*[local-name()='id_info']/*[local-name()='nct_alias']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['brief_title']=next(iter(root.xpath("//*[local-name()='brief_title']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['acronym']=next(iter(root.xpath("//*[local-name()='acronym']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['official_title']=next(iter(root.xpath("//*[local-name()='official_title']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['lead_sponsor_agency']=next(iter(root.xpath("//*[local-name()='sponsors']/*[local-name()='lead_sponsor']/*[local-name()='agency']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['lead_sponsor_agency_class']=next(iter(root.xpath("//*[local-name()='sponsors']/*[local-name()='lead_sponsor']/*[local-name()='agency_class']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['source']=next(iter(root.xpath("//*[local-name()='source']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['has_dmc']=next(iter(root.xpath("//*[local-name()='oversight_info']/*[local-name()='has_dmc']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: doublecheck oversight_info blocks
-    row['is_fda_regulated_drug']=next(iter(root.xpath("//*[local-name()='oversight_info']/*[local-name()='is_fda_regulated_drug']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: doublecheck oversight_info blocks
-    row['is_fda_regulated_device']=next(iter(root.xpath("//*[local-name()='oversight_info']/*[local-name()='is_fda_regulated_device']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: doublecheck oversight_info blocks
-    row['is_unapproved_device']=next(iter(root.xpath("//*[local-name()='oversight_info']/*[local-name()='is_unapproved_device']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: doublecheck oversight_info blocks
-    row['is_ppsd']=next(iter(root.xpath("//*[local-name()='oversight_info']/*[local-name()='is_ppsd']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: doublecheck oversight_info blocks
-    row['is_us_export']=next(iter(root.xpath("//*[local-name()='oversight_info']/*[local-name()='is_us_export']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: doublecheck oversight_info blocks
-    row['brief_summary']=next(iter(root.xpath("//*[local-name()='brief_summary']/*[local-name()='textblock']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: check to see if there are files with multiple textblocks. If so, grab all blocks and join into a single variable. Also maybe introduce SOLR indexing.
-    row['detailed_description']=next(iter(root.xpath("//*[local-name()='detailed_description']/*[local-name()='textblock']/text()")),'NULL').strip().replace("'","''").replace("\"","*") #TODO: check to see if there are files with multiple textblocks. If so, grab all blocks and join into a single variable. Also maybe introduce SOLR indexing.
-    row['overall_status']=next(iter(root.xpath("//*[local-name()='overall_status']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['why_stopped']=next(iter(root.xpath("//*[local-name()='why_stopped']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['start_date']=next(iter(root.xpath("//*[local-name()='start_date']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['completion_date']=next(iter(root.xpath("//*[local-name()='completion_date']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['completion_date_type']=next(iter(root.xpath("//*[local-name()='completion_date']/@type")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['primary_completion_date']=next(iter(root.xpath("//*[local-name()='primary_completion_date']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['primary_completion_date_type']=next(iter(root.xpath("//*[local-name()='primary_completion_date']/@type")),'NULL').strip().replace("'","''").replace("\"","*")#TODO: introduce xpath query to pull type field text
-    row['phase']=next(iter(root.xpath("//*[local-name()='phase']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['study_type']=next(iter(root.xpath("//*[local-name()='study_type']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['target_duration']=next(iter(root.xpath("//*[local-name()='target_duration']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['number_of_arms']=next(iter(root.xpath("//*[local-name()='number_of_arms']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['number_of_groups']=next(iter(root.xpath("//*[local-name()='number_of_groups']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['enrollment']=next(iter(root.xpath("//*[local-name()='enrollment']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['enrollment_type']=next(iter(root.xpath("//*[local-name()='enrollment']/@type")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['biospec_retention']=next(iter(root.xpath("//*[local-name()='biospec_retention']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['biospec_descr']=next(iter(root.xpath("//*[local-name()='biospec_descr']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['study_pop']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='study_pop']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['sampling_method']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='sampling_method']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['criteria']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='criteria']/*[local-name()='textblock']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['gender']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='gender']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['gender_based']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='gender_based']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['gender_description']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='gender_description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['minimum_age']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='minimum_age']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['maximum_age']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='maximum_age']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['healthy_volunteers']=next(iter(root.xpath("//*[local-name()='eligibility']/*[local-name()='healthy_volunteers']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['verification_date']=next(iter(root.xpath("//*[local-name()='verification_date']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['responsible_party_type']=next(iter(root.xpath("//*[local-name()='responsible_party']/*[local-name()='responsible_party_type']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['responsible_investigator_affiliation']=next(iter(root.xpath("//*[local-name()='responsible_party']/*[local-name()='investigator_affiliation']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['responsible_investigator_full_name']=next(iter(root.xpath("//*[local-name()='responsible_party']/*[local-name()='investigator_full_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['responsible_investigator_title']=next(iter(root.xpath("//*[local-name()='responsible_party']/*[local-name()='investigator_title']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['has_expanded_access']=next(iter(root.xpath("//*[local-name()='has_expanded_access']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['disposition_first_submitted']=next(iter(root.xpath("//*[local-name()='disposition_first_submitted']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['results_first_submitted']=next(iter(root.xpath("//*[local-name()='results_first_submitted']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['study_first_submitted']=next(iter(root.xpath("//*[local-name()='study_first_submitted']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['last_update_submitted']=next(iter(root.xpath("//*[local-name()='last_update_submitted']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    ct_dict['ct_clinical_studies']+=[row]
-    ct_pkeys['ct_clinical_studies']=['nct_id']
+    yield 'ct_clinical_studies', _extract(root, CT_CLINICAL_STUDIES_FIELDS, row)
 
     ##### ct_study_design_info
-    for study_design_info in root.xpath("//*[local-name()='study_design_info']"):
+    for study_design_info in STUDY_DESIGN_INFO(root):
         row=dict(); row['nct_id']=nct_id
-        row['allocation']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='allocation']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['intervention_model']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='intervention_model']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['intervention_model_description']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='intervention_model_description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['primary_purpose']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='primary_purpose']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['observational_model']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='study_design_info']/*[local-name()='observational_model']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['time_perspective']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='study_design_info']/*[local-name()='time_perspective']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['masking']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='study_design_info']/*[local-name()='masking']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['masking_description']=next(iter(etree.ElementTree(study_design_info).xpath("//*[local-name()='study_design_info']/*[local-name()='masking_description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_study_design_info']+=[row]
-    ct_pkeys['ct_study_design_info']=['nct_id']
+        yield 'ct_study_design_info', _extract(study_design_info, CT_STUDY_DESIGN_INFO_FIELDS, row)
     ##### ct_expanded_access_info
     row=dict(); row['nct_id']=nct_id
-    row['expanded_access_type_individual']=next(iter(root.xpath("//*[local-name()='expanded_access_info']/*[local-name()='expanded_access_type_individual']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['expanded_access_type_intermediate']=next(iter(root.xpath("//*[local-name()='expanded_access_info']/*[local-name()='expanded_access_type_intermediate']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    row['expanded_access_type_treatment']=next(iter(root.xpath("//*[local-name()='expanded_access_info']/*[local-name()='expanded_access_type_treatment']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-    ct_dict['ct_expanded_access_info']+=[row]
-    ct_pkeys['ct_expanded_access_info']=['nct_id']
+    yield 'ct_expanded_access_info', _extract(root, CT_EXPANDED_ACCESS_INFO_FIELDS, row)
     ##### ct_secondary_ids
-    secondary_ids=[secondary_id.strip().replace("'","''").replace("\"","*") for secondary_id in root.xpath("//*[local-name()='id_info']/*[local-name()='secondary_id']/text()")]
-    for secondary_id in secondary_ids:
-        row=dict(); row['nct_id']=nct_id; row['secondary_id']=secondary_id
-        ct_dict['ct_secondary_ids']+=[row]
-    ct_pkeys['ct_secondary_ids']=['nct_id','secondary_id']
+    for secondary_id in SECONDARY_IDS(root):
+        row=dict(); row['nct_id']=nct_id; row['secondary_id']=_clean(secondary_id)
+        yield 'ct_secondary_ids', row
     ##### ct_collaborators
-    for collaborator_count in root.xpath("//*[local-name()='sponsors']/*[local-name()='collaborator']"):
+    for collaborator in COLLABORATOR(root):
         row=dict(); row['nct_id']=nct_id
-        row['agency']=next(iter(etree.ElementTree(collaborator_count).xpath("//*[local-name()='agency']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['agency_class']=next(iter(etree.ElementTree(collaborator_count).xpath("//*[local-name()='agency_class']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_collaborators']+=[row]
-    ct_pkeys['ct_collaborators']=['nct_id', 'agency']
+        yield 'ct_collaborators', _extract(collaborator, CT_COLLABORATORS_FIELDS, row)
     ##### ct_outcomes newer kind
-    for outcome in root.xpath("//*[local-name()='outcome_list']/*[local-name()='outcome']"):
+    for outcome in OUTCOME(root):
         row=dict(); row['nct_id']=nct_id
-        row['outcome_type']=next(iter(etree.ElementTree(outcome).xpath("//*[local-name()='type']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['measure']=next(iter(etree.ElementTree(outcome).xpath("//*[local-name()='title']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['time_frame']=next(iter(etree.ElementTree(outcome).xpath("//*[local-name()='time_frame']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['description']=next(iter(etree.ElementTree(outcome).xpath("//*[local-name()='description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['population']=next(iter(etree.ElementTree(outcome).xpath("//*[local-name()='population']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_outcomes']+=[row]
+        yield 'ct_outcomes', _extract(outcome, CT_OUTCOMES_FIELDS, row)
     ##### ct_outcomes older kind
-    outcome_header = ['Primary', 'Secondary', 'Other']
-    for outcome_type in outcome_header:
+    for outcome_type, fields in CT_OUTCOMES_HEADER_FIELDS.items():
         row=dict(); row['nct_id']=nct_id ; row['outcome_type']=outcome_type
-        row['measure']=next(iter(root.xpath("//*[local-name()='"+outcome_type.lower()+"_outcome']/*[local-name()='measure']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['time_frame']=next(iter(root.xpath("//*[local-name()='"+outcome_type.lower()+"']/*[local-name()='time_frame']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['description']=next(iter(root.xpath("//*[local-name()='"+outcome_type.lower()+"']/*[local-name()='description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
+        _extract(root, fields, row)
         row['population']='NULL'
-        ct_dict['ct_outcomes']+=[row]
-    ct_pkeys['ct_outcomes']=['nct_id', 'outcome_type', 'measure', 'time_frame']
+        yield 'ct_outcomes', row
     ##### ct_conditions
-    conditions=[condition.strip().replace("'","''").replace("\"","*") for condition in root.xpath("//*[local-name()='condition']/text()")]
-    for condition in conditions:
-        row=dict(); row['nct_id']=nct_id; row['condition']=condition
-        ct_dict['ct_conditions']+=[row]
-    ct_pkeys['ct_conditions']=['nct_id', 'condition']
+    for condition in CONDITIONS(root):
+        row=dict(); row['nct_id']=nct_id; row['condition']=_clean(condition)
+        yield 'ct_conditions', row
     ##### ct_arm_groups
-    for arm_group in root.xpath("//*[local-name()='arm_group']"):
+    for arm_group in ARM_GROUP(root):
         row=dict(); row['nct_id']=nct_id
-        row['arm_group_label']=next(iter(etree.ElementTree(arm_group).xpath("//*[local-name()='arm_group_label']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['arm_group_type']=next(iter(etree.ElementTree(arm_group).xpath("//*[local-name()='arm_group_type']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['description']=next(iter(etree.ElementTree(arm_group).xpath("//*[local-name()='description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_arm_groups']+=[row]
-    ct_pkeys['ct_arm_groups']=['nct_id', 'arm_group_label', 'arm_group_type', 'description']
+        yield 'ct_arm_groups', _extract(arm_group, CT_ARM_GROUPS_FIELDS, row)
     ##### ct_interventions, ct_intervention_arm_group_labels, and ct_intervention_other_names
-    for intervention_count in root.xpath("//*[local-name()='intervention']"):
+    for intervention in INTERVENTION(root):
         row=dict(); row['nct_id']=nct_id
-        row['intervention_type']=next(iter(etree.ElementTree(intervention_count).xpath("//*[local-name()='intervention_type']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['intervention_name']=next(iter(etree.ElementTree(intervention_count).xpath("//*[local-name()='intervention_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['description']=next(iter(etree.ElementTree(intervention_count).xpath("//*[local-name()='description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_interventions']+=[row]
+        yield 'ct_interventions', _extract(intervention, CT_INTERVENTIONS_FIELDS, row)
         ###
-        arm_group_labels=[arm_group_label.strip().replace("'","''").replace("\"","*") for arm_group_label in etree.ElementTree(intervention_count).xpath("//*[local-name()='arm_group_label']/text()")]
-        for arm_group_label in arm_group_labels:
-            child_row=dict(); child_row['nct_id']=nct_id; child_row['intervention_name']=row['intervention_name']; child_row['arm_group_label']=arm_group_label
-            ct_dict['ct_intervention_arm_group_labels']+=[child_row]
+        for arm_group_label in INTERVENTION_ARM_GROUP_LABELS(intervention):
+            child_row=dict(); child_row['nct_id']=nct_id; child_row['intervention_name']=row['intervention_name']; child_row['arm_group_label']=_clean(arm_group_label)
+            yield 'ct_intervention_arm_group_labels', child_row
         ###
-        other_names=[other_name.strip().replace("'","''").replace("\"","*") for other_name in etree.ElementTree(intervention_count).xpath("//*[local-name()='other_name']/text()")]
-        for other_name in other_names:
-            child_row=dict(); child_row['nct_id']=nct_id; child_row['intervention_name']=row['intervention_name']; child_row['other_name']=other_name
-            ct_dict['ct_intervention_other_names']+=[child_row]
-    ct_pkeys['ct_interventions']=['nct_id', 'intervention_type', 'intervention_name', 'description']
-    ct_pkeys['ct_intervention_arm_group_labels']=['nct_id', 'intervention_name', 'arm_group_label']
-    ct_pkeys['ct_intervention_other_names']=['nct_id', 'intervention_name', 'other_name']
+        for other_name in INTERVENTION_OTHER_NAMES(intervention):
+            child_row=dict(); child_row['nct_id']=nct_id; child_row['intervention_name']=row['intervention_name']; child_row['other_name']=_clean(other_name)
+            yield 'ct_intervention_other_names', child_row
     #### ct_overall_officials
-    for official_count in root.xpath("//*[local-name()='overall_official']"):
+    for official in OVERALL_OFFICIAL(root):
         row=dict(); row['nct_id']=nct_id
-        row['first_name']=next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='first_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['middle_name']=next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='middle_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['degrees'] = next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='degrees']/text()")),'NULL').strip().replace("'", "''").replace("\"", "*")
+        _extract(official, CT_OVERALL_OFFICIALS_FIELDS, row)
         if(row['first_name']=='NULL'):
-            temp_last_name=next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='last_name']/text()")),'NULL')
-            name_degree_split = temp_last_name.split(',')
-            if (name_degree_split is None ):
-
-                words = temp_last_name.split(' ')
-                if len(words) == 1:
-                    row['last_name'] = words[0].strip().replace("'","''").replace("\"","*")
-                elif len(words) == 2:
-                    row['first_name'] = words[0].strip().replace("'","''").replace("\"","*")
-                    row['last_name'] = words[1].strip().replace("'","''").replace("\"","*")
-                elif len(words) > 2:
-                    row['first_name']=words[0].strip().replace("'","''").replace("\"","*")
-                    row['middle_name']=words[1].strip().replace("'","''").replace("\"","*")
-                    row['last_name']=" ".join(words[2:]).strip().replace("'","''").replace("\"","*")
-            else:
-                #print("no degree split found")
-                row['degrees']=','.join(name_degree_split[1:]).strip().replace("'","''").replace(
-                    "\"","*")
-                words = name_degree_split[0].split()
-                if len(words) == 1:
-                    row['last_name'] = words[0].strip().replace("'","''").replace("\"","*")
-                elif len(words) == 2:
-                    row['first_name'] = words[0].strip().replace("'","''").replace("\"","*")
-                    row['last_name'] = words[1].strip().replace("'","''").replace("\"","*")
-                elif len(words) > 2:
-                    row['first_name'] = words[0].strip().replace("'","''").replace("\"","*")
-                    row['middle_name'] = words[1].strip().replace("'","''").replace("\"","*")
-                    row['last_name'] = " ".join(words[2:]).strip().replace("'","''").replace("\"","*")
+            # the full name is held in last_name, split it before cleaning
+            _split_name(row, next(iter(OVERALL_OFFICIAL_LAST_NAME(official)),'NULL'), 'first_name', 'middle_name', 'last_name', 'degrees')
         else:
-            row['last_name']=next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='last_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-
-        row['role']=next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='role']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['affiliation']=next(iter(etree.ElementTree(official_count).xpath("//*[local-name()='affiliation']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_overall_officials']+=[row]
-    ct_pkeys['ct_overall_officials']=['nct_id', 'role', 'last_name']
+            row['last_name']=_first(official, OVERALL_OFFICIAL_LAST_NAME)
+        yield 'ct_overall_officials', _extract(official, CT_OVERALL_OFFICIALS_ROLE_FIELDS, row)
     #### ct_overall_contacts
-    contact_header = ['overall_contact', 'overall_contact_backup']
-    for contact_type in contact_header:
+    for contact_type, (name_fields, contact_fields) in CT_OVERALL_CONTACTS_FIELDS.items():
         row=dict(); row['nct_id']=nct_id ; row['contact_type']=contact_type
-        row['first_name']=next(iter(root.xpath("//*[local-name()='"+contact_type+"']/*[local-name()='first_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['middle_name']=next(iter(root.xpath("//*[local-name()='"+contact_type+"']/*[local-name()='middle_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['last_name']=next(iter(root.xpath("//*[local-name()='"+contact_type+"']/*[local-name()='last_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['degrees'] = next(iter(root.xpath("//*[local-name()='" + contact_type + "']/*[local-name()='degrees']/text()")),'NULL').strip().replace("'", "''").replace("\"", "*")
+        _extract(root, name_fields, row)
         if (row['first_name'] == 'NULL'):
-
-            name_degree_split = row['last_name'].split(',')
-            if (name_degree_split is None):
-
-                words = row['last_name'].split(' ')
-                if len(words) == 1:
-                    row['last_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) == 2:
-                    row['first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['last_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) > 2:
-                    row['first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['middle_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                    row['last_name'] = " ".join(words[2:]).strip().replace("'", "''").replace("\"", "*")
-            else:
-                # print("no degree split found")
-                row['degrees'] = ','.join(name_degree_split[1:]).strip().replace("'", "''").replace(
-                    "\"", "*")
-                words = name_degree_split[0].split()
-                if len(words) == 1:
-                    row['last_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) == 2:
-                    row['first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['last_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) > 2:
-                    row['first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['middle_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                    row['last_name'] = " ".join(words[2:]).strip().replace("'", "''").replace("\"", "*")
-
-        row['phone']=next(iter(root.xpath("//*[local-name()='"+contact_type+"']/*[local-name()='phone']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['phone_ext']=next(iter(root.xpath("//*[local-name()='"+contact_type+"']/*[local-name()='phone_ext']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['email']=next(iter(root.xpath("//*[local-name()='"+contact_type+"']/*[local-name()='email']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_overall_contacts']+=[row]
-    ct_pkeys['ct_overall_contacts']=['nct_id', 'contact_type', 'last_name']
+            _split_name(row, row['last_name'], 'first_name', 'middle_name', 'last_name', 'degrees')
+        yield 'ct_overall_contacts', _extract(root, contact_fields, row)
     #### ct_locations, ct_location_investigators
-    for location_count in root.xpath("//*[local-name()='location']"):
-        row=dict(); row['nct_id']=nct_id
-        row['facility_name']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='facility']/*[local-name()='name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['facility_city']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='facility']/*[local-name()='address']/*[local-name()='city']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['facility_state']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='facility']/*[local-name()='address']/*[local-name()='state']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['facility_zip']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='facility']/*[local-name()='address']/*[local-name()='zip']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['facility_country']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='facility']/*[local-name()='address']/*[local-name()='country']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['status']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='status']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_first_name']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='first_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_middle_name']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='middle_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_last_name']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='last_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_degrees']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='degrees']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        if (row['contact_first_name'] == 'NULL'):
-
-            name_degree_split = row['contact_last_name'].split(',')
-            if (name_degree_split is None):
-
-                words = row['contact_last_name'].split(' ')
-                if len(words) == 1:
-                    row['contact_last_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) == 2:
-                    row['contact_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['contact_last_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) > 2:
-                    row['contact_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['contact_middle_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                    row['contact_last_name'] = " ".join(words[2:]).strip().replace("'", "''").replace("\"", "*")
-            else:
-                # print("no degree split found")
-                row['contact_degrees'] = ','.join(name_degree_split[1:]).strip().replace("'", "''").replace(
-                    "\"", "*")
-                words = name_degree_split[0].split()
-                if len(words) == 1:
-                    row['contact_last_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) == 2:
-                    row['contact_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['contact_last_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                elif len(words) > 2:
-                    row['contact_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    row['contact_middle_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                    row['contact_last_name'] = " ".join(words[2:]).strip().replace("'", "''").replace("\"", "*")
-
-        row['contact_phone']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='phone']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_phone_ext']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='phone_ext']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_email']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact']/*[local-name()='email']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_backup_full_name'] = next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact_backup']/*[local-name()='last_name']/text()")), 'NULL').strip().replace("'","''").replace("\"", "*")
-        row['contact_backup_degrees'] = ','.join(row['contact_backup_full_name'].split(",")[1:])
-        contact_backup_backup_degrees = row['contact_backup_degrees'] ; contact_backup_full_name = row['contact_backup_full_name'].split(",")[0]
-
-        ## since we posses the full-name only split based on canonical case 1. First (Optional Middle) Last
-
-        if contact_backup_backup_degrees is "":
-            row['contact_backup_degrees'] = 'NULL'
-
-        if len(contact_backup_full_name.split(" ")) == 2:
-            row['contact_backup_first_name'] = contact_backup_full_name.split(" ")[0]
-            row['contact_backup_last_name'] = contact_backup_full_name.split(" ")[1]
-            row['contact_backup_middle_name'] = 'NULL'
-        elif len(contact_backup_full_name.split(" ")) > 2:
-            row['contact_backup_first_name'] = contact_backup_full_name.split(" ")[0]
-            row['contact_backup_middle_name'] = contact_backup_full_name.split(" ")[1]
-            row['contact_backup_last_name'] = " ".join(contact_backup_full_name.split(" ")[2:])
-        else:
-            row['contact_backup_first_name'] = 'NULL'
-            row['contact_backup_middle_name'] = 'NULL'
-            row['contact_backup_last_name'] = 'NULL'
-
-
-        row['contact_backup_phone']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact_backup']/*[local-name()='phone']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_backup_phone_ext']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact_backup']/*[local-name()='phone_ext']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['contact_backup_email']=next(iter(etree.ElementTree(location_count).xpath("//*[local-name()='contact_backup']/*[local-name()='email']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_locations']+=[row]
-        ###
-        for investigator_count in etree.ElementTree(location_count).xpath("//*[local-name()='investigator']"):
-            child_row=dict(); child_row['nct_id']=nct_id
-            child_row['investigator_first_name']=next(iter(etree.ElementTree(investigator_count).xpath("//*[local-name()='first_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-            child_row['investigator_middle_name']=next(iter(etree.ElementTree(investigator_count).xpath("//*[local-name()='middle_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-            child_row['investigator_last_name']=next(iter(etree.ElementTree(investigator_count).xpath("//*[local-name()='last_name']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-            child_row['investigator_degrees']=next(iter(etree.ElementTree(investigator_count).xpath("//*[local-name()='degrees']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-            if (child_row['investigator_first_name'] == 'NULL'):
-
-                name_degree_split = child_row['investigator_last_name'].split(',')
-                if (name_degree_split is None):
-
-                    words = child_row['investigator_last_name'].split(' ')
-                    if len(words) == 1:
-                        child_row['investigator_last_name'] = words[0].strip().replace("'", "''").replace(
-                            "\"", "*")
-                    elif len(words) == 2:
-                        child_row['investigator_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                        child_row['investigator_last_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                    elif len(words) > 2:
-                        child_row['investigator_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                        row['investigator_middle_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                        row['investigator_last_name'] = " ".join(words[2:]).strip().replace("'", "''").replace("\"", "*")
-                else:
-                    # print("no degree split found")
-                    child_row['investigator_degrees'] = ','.join(name_degree_split[1:]).strip().replace("'", "''").replace(
-                        "\"", "*")
-                    words = name_degree_split[0].split(' ')
-                    if len(words) == 1:
-                        child_row['investigator_last_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                    elif len(words) == 2:
-                        child_row['investigator_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                        child_row['investigator_last_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                    elif len(words) > 2:
-                        child_row['investigator_first_name'] = words[0].strip().replace("'", "''").replace("\"", "*")
-                        child_row['investigator_middle_name'] = words[1].strip().replace("'", "''").replace("\"", "*")
-                        child_row['investigator_last_name'] = " ".join(words[2:]).strip().replace("'", "''").replace("\"", "*")
-
-            child_row['investigator_role']=next(iter(etree.ElementTree(investigator_count).xpath("//*[local-name()='role']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-            child_row['investigator_affiliation']=next(iter(root.xpath("//*[local-name()='responsible_party']/*[local-name()='investigator_affiliation']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-            ct_dict['ct_location_investigators']+=[child_row]
-    ct_pkeys['ct_locations']=['nct_id', 'facility_country', 'facility_city', 'facility_zip', 'facility_name']
-    ct_pkeys['ct_location_investigators']=['nct_id', 'investigator_last_name']
+    investigator_affiliation=_first(root, RESPONSIBLE_INVESTIGATOR_AFFILIATION)
+    for location in LOCATION(root):
+        yield from _location_rows(location, nct_id, investigator_affiliation)
 
     ## ct_location_countries
-    for country in root.xpath("//*[local-name()='location_countries']/*[local-name()='country']/text()"):
+    for country in LOCATION_COUNTRIES(root):
         child_row = dict(); child_row['nct_id'] = nct_id
         child_row['country']=country
-        ct_dict['ct_location_countries'] += [child_row]
-    ct_pkeys['ct_location_countries']=['nct_id', 'country']
+        yield 'ct_location_countries', child_row
 
     #### ct_links
-    for link_count in root.xpath("//*[local-name()='link']"):
+    for link in LINK(root):
         row=dict(); row['nct_id']=nct_id
-        row['url']=next(iter(etree.ElementTree(link_count).xpath("//*[local-name()='url']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['description']=next(iter(etree.ElementTree(link_count).xpath("//*[local-name()='description']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_links']+=[row]
-    ct_pkeys['ct_links']=['nct_id', 'url', 'description']
+        yield 'ct_links', _extract(link, CT_LINKS_FIELDS, row)
     #### ct_condition_browses
-    mesh_terms=[mesh_term.strip().replace("'","''").replace("\"","*") for mesh_term in root.xpath("//*[local-name()='condition_browse']/*[local-name()='mesh_term']/text()")]
-    for mesh_term in mesh_terms:
-        row=dict(); row['nct_id']=nct_id; row['mesh_term']=mesh_term
-        ct_dict['ct_condition_browses']+=[row]
-    ct_pkeys['ct_condition_browses']=['nct_id', 'mesh_term']
+    for mesh_term in CONDITION_BROWSE_MESH_TERMS(root):
+        row=dict(); row['nct_id']=nct_id; row['mesh_term']=_clean(mesh_term)
+        yield 'ct_condition_browses', row
     #### ct_intervention_browses
-    mesh_terms=[mesh_term.strip().replace("'","''").replace("\"","*") for mesh_term in root.xpath("//*[local-name()='intervention_browse']/*[local-name()='mesh_term']/text()")]
-    for mesh_term in mesh_terms:
-        row=dict(); row['nct_id']=nct_id; row['mesh_term']=mesh_term
-        ct_dict['ct_intervention_browses']+=[row]
-    ct_pkeys['ct_intervention_browses']=['nct_id', 'mesh_term']
+    for mesh_term in INTERVENTION_BROWSE_MESH_TERMS(root):
+        row=dict(); row['nct_id']=nct_id; row['mesh_term']=_clean(mesh_term)
+        yield 'ct_intervention_browses', row
     #### ct_references
-    for reference in root.xpath("//*[local-name()='reference']"):
+    for reference in REFERENCE(root):
         row=dict(); row['nct_id']=nct_id
-        row['citation']=next(iter(etree.ElementTree(reference).xpath("//*[local-name()='citation']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['pmid']=next(iter(etree.ElementTree(reference).xpath("//*[local-name()='PMID']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_references']+=[row]
-    ct_pkeys['ct_references']=['nct_id', 'citation']
+        yield 'ct_references', _extract(reference, CT_REFERENCES_FIELDS, row)
     #### ct_publications
-    for reference in root.xpath("//*[local-name()='results_reference']"):
+    for reference in RESULTS_REFERENCE(root):
         row=dict(); row['nct_id']=nct_id
-        row['citation']=next(iter(etree.ElementTree(reference).xpath("//*[local-name()='citation']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        row['pmid']=next(iter(etree.ElementTree(reference).xpath("//*[local-name()='PMID']/text()")),'NULL').strip().replace("'","''").replace("\"","*")
-        ct_dict['ct_publications']+=[row]
-    ct_pkeys['ct_publications']=['nct_id', 'citation']
+        yield 'ct_publications', _extract(reference, CT_REFERENCES_FIELDS, row)
     #### ct_keywords
-    keywords=[keyword.strip().replace("'","''").replace("\"","*") for keyword in root.xpath("//*[local-name()='keyword']/text()")]
-    for keyword in keywords:
-        row=dict(); row['nct_id']=nct_id; row['keyword']=keyword
-        ct_dict['ct_keywords']+=[row]
-    ct_pkeys['ct_keywords']=['nct_id', 'keyword']
+    for keyword in KEYWORDS(root):
+        row=dict(); row['nct_id']=nct_id; row['keyword']=_clean(keyword)
+        yield 'ct_keywords', row
+
+# Yield the ct_locations row of a location block followed by its ct_location_investigators rows
+def _location_rows(location, nct_id, investigator_affiliation):
+    row=dict(); row['nct_id']=nct_id
+    _extract(location, CT_LOCATIONS_FIELDS, row)
+    if (row['contact_first_name'] == 'NULL'):
+        _split_name(row, row['contact_last_name'], 'contact_first_name', 'contact_middle_name', 'contact_last_name', 'contact_degrees')
+    _extract(location, CT_LOCATIONS_CONTACT_FIELDS, row)
+    row['contact_backup_degrees'] = ','.join(row['contact_backup_full_name'].split(",")[1:])
+    contact_backup_backup_degrees = row['contact_backup_degrees'] ; contact_backup_full_name = row['contact_backup_full_name'].split(",")[0]
+
+    ## since we posses the full-name only split based on canonical case 1. First (Optional Middle) Last
+
+    if contact_backup_backup_degrees == "":
+        row['contact_backup_degrees'] = 'NULL'
+
+    if len(contact_backup_full_name.split(" ")) == 2:
+        row['contact_backup_first_name'] = contact_backup_full_name.split(" ")[0]
+        row['contact_backup_last_name'] = contact_backup_full_name.split(" ")[1]
+        row['contact_backup_middle_name'] = 'NULL'
+    elif len(contact_backup_full_name.split(" ")) > 2:
+        row['contact_backup_first_name'] = contact_backup_full_name.split(" ")[0]
+        row['contact_backup_middle_name'] = contact_backup_full_name.split(" ")[1]
+        row['contact_backup_last_name'] = " ".join(contact_backup_full_name.split(" ")[2:])
+    else:
+        row['contact_backup_first_name'] = 'NULL'
+        row['contact_backup_middle_name'] = 'NULL'
+        row['contact_backup_last_name'] = 'NULL'
+
+    yield 'ct_locations', _extract(location, CT_LOCATIONS_CONTACT_BACKUP_FIELDS, row)
+    ###
+    for investigator in INVESTIGATOR(location):
+        child_row=dict(); child_row['nct_id']=nct_id
+        _extract(investigator, CT_LOCATION_INVESTIGATORS_FIELDS, child_row)
+        if (child_row['investigator_first_name'] == 'NULL'):
+            _split_name(child_row, child_row['investigator_last_name'], 'investigator_first_name', 'investigator_middle_name', 'investigator_last_name', 'investigator_degrees', ' ')
+        child_row['investigator_role']=_first(investigator, INVESTIGATOR_ROLE)
+        child_row['investigator_affiliation']=investigator_affiliation
+        yield 'ct_location_investigators', child_row
+
+
+# Parse the input file and return a list of lists that contain the data to add to the database
+def parse(input_filename):
+    # Create empty lists to be populated inside a dictionary and also include pkey mappings
+    ct_dict={table:[] for table in CT_TABLES}
+    ct_pkeys=dict(CT_PKEYS)
+    # Parse the XML file root and check if the unique ID exists. If not, do not load this file for now.
+    root = etree.parse(input_filename).getroot()
+    for element in root.iter(etree.Element):
+        _strip_namespace(element)
+    nct_id=_first(root, NCT_ID)
+    if nct_id == "":
+        return None
+    for table, row in _study_rows(root, nct_id):
+        ct_dict[table]+=[row]
     ##### clean data dictionary locally in ct_dict to avoid upload issues
     #first clean out all tables with no information populated
     ct_dict={ key:value for key, value in ct_dict.items() if value!=[] }
@@ -438,6 +399,80 @@ def parse(input_filename):
         for idx,row in enumerate(ct_dict[key]):
             ct_dict[key][idx]['id']=str(idx+1)
     ### Miscellaneous last minute changes for dictionary values before passing values on to update script
-    ct_pkeys['ct_references']=['nct_id', 'md5(citation)']
+    ct_pkeys['ct_references']=CT_CONFLICT_KEYS['ct_references']
     ##### Return a tuple of dictionaries. The ct_dict which holds the data, and a ct_pkeys dict which holds the pkey information
     return (ct_dict,ct_pkeys)
+
+
+# The responsible party affiliation carried by the ct_location_investigators rows: the first text of a
+# responsible_party/investigator_affiliation element, or 'NULL'. The responsible party follows the locations in a study,
+# so iter_rows() reads it beforehand in a pass which drops every element once it ended and so holds no tree.
+def _responsible_investigator_affiliation(input_filename):
+    for event, element in etree.iterparse(input_filename, events=('end',)):
+        parent=element.getparent()
+        if etree.QName(element).localname=='investigator_affiliation' and parent is not None \
+                and etree.QName(parent).localname=='responsible_party':
+            affiliation=next(iter(element.xpath('text()')),None)
+            if affiliation is not None:
+                return _clean(affiliation)
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+    return 'NULL'
+
+# Streaming variant of parse(): yield (table, CT_ROWS[table] tuple) pairs holding the same rows and ids parse() returns.
+# The key checks, deduplication and numbering are applied as rows are produced. Each location block is turned into rows,
+# its investigators included, and dropped from the tree as soon as it has been read, so a study with tens of thousands of
+# locations is held neither as row lists nor as a full tree. Nothing is yielded for a study without an nct_id.
+# The input is a file name or a binary file object, such as an open zip member.
+def iter_rows(input_filename):
+    seen={table:set() for table in CT_TABLES}; ids=dict.fromkeys(CT_TABLES,0)
+    def typed(table, row):
+        key=tuple(row[column] for column in CT_PKEYS[table])
+        if 'NULL' in key or key in seen[table]:
+            return None
+        seen[table].add(key); ids[table]+=1
+        row['id']=str(ids[table])
+        return CT_ROWS[table](**row)
+
+    if hasattr(input_filename,'read'):
+        # the pre-scan consumes a file object: read it again from where it started, from memory if it can not seek
+        if not input_filename.seekable():
+            input_filename=io.BytesIO(input_filename.read())
+        start=input_filename.tell()
+        investigator_affiliation=_responsible_investigator_affiliation(input_filename)
+        input_filename.seek(start)
+    else:
+        investigator_affiliation=_responsible_investigator_affiliation(input_filename)
+    root=None; nct_id=None; locations=[]
+    for event, element in etree.iterparse(input_filename, events=('end',)):
+        _strip_namespace(element)
+        if root is None:
+            root=element.getroottree().getroot()
+        if element.tag=='id_info' and nct_id is None and _first(root, NCT_ID)!='NULL':
+            nct_id=_first(root, NCT_ID)
+            if nct_id == "":
+                return
+        elif element.tag=='location':
+            locations.append(element)
+        if nct_id is None:
+            continue
+        # the locations read so far, normally just the one that ended
+        for location in locations:
+            for table, row in _location_rows(location, nct_id, investigator_affiliation):
+                row=typed(table, row)
+                if row:
+                    yield table, row
+            location.getparent().remove(location)
+        locations=[]
+    if root is None:
+        return
+    if nct_id is None:
+        nct_id=_first(root, NCT_ID)
+    if nct_id == "":
+        return
+    # everything but the streamed locations is still in the tree
+    for table, row in _study_rows(root, nct_id):
+        row=typed(table, row)
+        if row:
+            yield table, row
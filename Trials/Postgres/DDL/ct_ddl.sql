@@ -582,6 +582,20 @@ COMMENT ON COLUMN ct_keywords.id IS $$Internal(PARDI) number.Example: 1$$;
 COMMENT ON COLUMN ct_keywords.nct_id IS $$Example: NCT00000389$$;
 COMMENT ON COLUMN ct_keywords.keyword IS $$Example: Fluvoxamine$$;
 
+DROP TABLE IF EXISTS ct_study_hashes;
+CREATE TABLE ct_study_hashes
+(
+    nct_id       TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    last_loaded  TIMESTAMP DEFAULT current_timestamp,
+    CONSTRAINT ct_study_hashes_pk PRIMARY KEY (nct_id) USING INDEX TABLESPACE index_tbs
+) TABLESPACE ct_tbs;
+
+COMMENT ON TABLE ct_study_hashes IS $$Content hash of the XML last loaded for each study, used by incremental CT updates$$;
+COMMENT ON COLUMN ct_study_hashes.nct_id IS $$Example: NCT00000389$$;
+COMMENT ON COLUMN ct_study_hashes.content_hash IS $$MD5 of the study XML without its download_date$$;
+COMMENT ON COLUMN ct_study_hashes.last_loaded IS $$When the study was last parsed and upserted$$;
+
 DROP TABLE IF EXISTS update_log_ct;
 CREATE TABLE update_log_ct
 (